@@ -165,52 +165,60 @@ export default function HomePage() {
 
     const data = await response.json();
 
-    // Fetch market data for each asset
-    const portfolioWithMarketValues = await Promise.all(
-      data.portfolio.map(async (entry: PortfolioEntry, index: number) => {
-        try {
-          const marketData = await fetchMarketPrice(entry.ticker);
-          const marketPrice = marketData.market_price !== "N/A" ? Number(marketData.market_price) : null;
-          const shares = Number(entry.shares) || 0;
-          const marketValue = marketPrice !== null ? marketPrice * shares : null;
-
-          return {
-            ...entry,
-            market_price: marketPrice,
-            market_value: marketValue,
-            color: grayShades[index % grayShades.length] // Assign a color from the gray shades
-          };
-        } catch (err) {
-          console.error(`Error processing ${entry.ticker}:`, err);
-          return { ...entry, market_price: null, market_value: null, color: grayShades[index % grayShades.length] };
-        }
-      })
-    );
+    // Fetch market data for all assets in one batch
+    const quotes = await fetchMarketPrices(data.portfolio.map((entry: PortfolioEntry) => entry.ticker));
+    const portfolioWithMarketValues = data.portfolio.map((entry: PortfolioEntry, index: number) => {
+      const marketData = quotes[entry.ticker.toUpperCase()];
+      const marketPrice = marketData && marketData.market_price !== "N/A" && marketData.market_price != null
+        ? Number(marketData.market_price)
+        : null;
+      const shares = Number(entry.shares) || 0;
+      const marketValue = marketPrice !== null ? marketPrice * shares : null;
+
+      return {
+        ...entry,
+        market_price: marketPrice,
+        market_value: marketValue,
+        color: grayShades[index % grayShades.length] // Assign a color from the gray shades
+      };
+    });
 
     // Calculate portfolio percentages
     return calculatePortfolioPercentage(portfolioWithMarketValues);
   };
 
-  // Fetch market price for a ticker
-  const fetchMarketPrice = async (ticker: string) => {
+  // Fetch market prices for a list of tickers, keyed by ticker
+  const fetchMarketPrices = async (tickers: string[]) => {
+    const quotes: Record<string, { market_price: number | string | null }> = {};
+    if (tickers.length === 0) return quotes;
+
     const token = await getFirebaseIdToken();
     if (!token) throw new Error("Authentication required");
 
-    const response = await fetch(
-      `${process.env.NEXT_PUBLIC_API_URL}/api/stock/current/${ticker}`,
-      {
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
+    try {
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_API_URL}/api/quotes?tickers=${encodeURIComponent(tickers.join(","))}`,
+        {
+          headers: {
+            "Content-Type": "application/json",
+            Authorization: `Bearer ${token}`,
+          },
+        }
+      );
+
+      if (!response.ok) {
+        throw new Error("Failed to fetch market prices");
       }
-    );
 
-    if (!response.ok) {
-      throw new Error(`Failed to fetch market price for ${ticker}`);
+      const data = await response.json();
+      for (const quote of data.quotes || []) {
+        quotes[quote.ticker] = quote;
+      }
+    } catch (err) {
+      console.error("Error fetching market prices:", err);
     }
 
-    return await response.json();
+    return quotes;
   };
 
   // Fetch portfolio history
@@ -304,23 +312,21 @@ export default function HomePage() {
 
     try {
       setLoading(true);
-      const updatedPortfolio = await Promise.all(
-        portfolioData.map(async (entry) => {
-          try {
-            const marketData = await fetchMarketPrice(entry.ticker);
-            const marketPrice = marketData.market_price !== "N/A" ? Number(marketData.market_price) : null;
-            const marketValue = marketPrice !== null ? marketPrice * entry.shares : null;
-
-            return {
-              ...entry,
-              market_price: marketPrice,
-              market_value: marketValue
-            };
-          } catch (err) {
-            return entry; // Keep the old data if fetching fails
-          }
-        })
-      );
+      const quotes = await fetchMarketPrices(portfolioData.map((entry) => entry.ticker));
+      const updatedPortfolio = portfolioData.map((entry) => {
+        const marketData = quotes[entry.ticker.toUpperCase()];
+        if (!marketData) return entry; // Keep the old data if fetching fails
+        const marketPrice = marketData.market_price !== "N/A" && marketData.market_price != null
+          ? Number(marketData.market_price)
+          : null;
+        const marketValue = marketPrice !== null ? marketPrice * entry.shares : null;
+
+        return {
+          ...entry,
+          market_price: marketPrice,
+          market_value: marketValue
+        };
+      });
 
       // Recalculate portfolio percentages and update state
       setPortfolioData(calculatePortfolioPercentage(updatedPortfolio));
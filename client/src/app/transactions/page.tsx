@@ -12,6 +12,8 @@ interface Transaction {
   price: number;
   transaction_type: string;
   created_at: string;
+  // Realized gain/loss of a sell (average cost); null for buys
+  realized_pnl: number | null;
 }
 
 async function getFirebaseIdToken(): Promise<string | null> {
@@ -35,16 +37,20 @@ export default function TransactionsPage() {
   const [user, setUser] = useState<any>(null);
   // Adding search functionality to match watchlist
   const [searchTerm, setSearchTerm] = useState("");
+  // Cursor for the next (older) page, null when everything is loaded
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-  // Fetch transactions from backend
-  const fetchTransactions = async () => {
-    setLoading(true);
+  // Fetch transactions from backend; with a cursor the page is appended
+  const fetchTransactions = async (cursor: string | null = null) => {
+    setLoading(cursor === null);
     setError("");
     try {
       const token = await getFirebaseIdToken();
       if (!token) throw new Error("User not authenticated");
+      const params = new URLSearchParams({ limit: "50" });
+      if (cursor) params.set("cursor", cursor);
       const res = await fetch(
-        `${process.env.NEXT_PUBLIC_API_URL}/api/transactions`,
+        `${process.env.NEXT_PUBLIC_API_URL}/api/transactions?${params}`,
         {
           headers: {
             "Content-Type": "application/json",
@@ -54,7 +60,9 @@ export default function TransactionsPage() {
       );
       if (!res.ok) throw new Error("Failed to fetch transactions");
       const data = await res.json();
-      setTransactions(data.transactions || []);
+      const page: Transaction[] = data.transactions || [];
+      setTransactions((prev) => (cursor ? [...prev, ...page] : page));
+      setNextCursor(data.next_cursor || null);
     } catch (err: any) {
       setError(err.message || "An error occurred while fetching transactions.");
     } finally {
@@ -112,7 +120,7 @@ export default function TransactionsPage() {
             <h1 className="text-[10rem] tracking-[-0.1em] -ml-4">Transactions.</h1>
             <div className="flex justify-between items-center">
               <p className="text-2xl tracking-[-0.08em] flex-1 max-w-2xl">
-                Transaction History (Last 15 Days)
+                Transaction History
               </p>
               <div className="flex items-center gap-1">
                 {/* Search Input */}
@@ -156,6 +164,9 @@ export default function TransactionsPage() {
                       <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">
                         Date
                       </th>
+                      <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">
+                        Realized P&amp;L
+                      </th>
                       {/*
                       <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">
                         Action
@@ -182,6 +193,21 @@ export default function TransactionsPage() {
                           <td className="py-4 px-6">
                             {new Date(txn.created_at).toLocaleDateString()}
                           </td>
+                          <td
+                            className={`py-4 px-6 ${
+                              txn.realized_pnl == null
+                                ? "text-gray-400"
+                                : txn.realized_pnl >= 0
+                                ? "text-green-600"
+                                : "text-red-600"
+                            }`}
+                          >
+                            {txn.realized_pnl == null
+                              ? "—"
+                              : `${txn.realized_pnl < 0 ? "-" : ""}$${Math.abs(
+                                  txn.realized_pnl
+                                ).toFixed(2)}`}
+                          </td>
                           {/*
                           <td className="py-4 px-6">
                             <button
@@ -197,7 +223,7 @@ export default function TransactionsPage() {
                     ) : (
                       <tr>
                         <td
-                          colSpan={5}
+                          colSpan={6}
                           className={`px-6 py-4 tracking-[-0.08em] text-center`}
                         >
                           No transactions found.
@@ -207,6 +233,14 @@ export default function TransactionsPage() {
                   </tbody>
                 </table>
               )}
+              {!loading && nextCursor && (
+                <button
+                  onClick={() => fetchTransactions(nextCursor)}
+                  className="w-full py-3 text-gray-500 hover:text-black"
+                >
+                  Load more
+                </button>
+              )}
             </div>
           </div>
         </div>
@@ -10,6 +10,10 @@ interface InsertCsvModalProps {
   portfolioId: string; // New prop for the specific portfolio ID
 }
 
+// Background imports are polled every 2s for at most 30 minutes
+const IMPORT_POLL_INTERVAL_MS = 2000;
+const MAX_IMPORT_POLLS = 900;
+
 async function getFirebaseIdToken(): Promise<string> {
   const auth = getAuth();
   return new Promise((resolve, reject) => {
@@ -67,6 +71,28 @@ const InsertCsvModal: FC<InsertCsvModalProps> = ({ onClose, onUploadSuccess, por
         const errData = await response.json();
         throw new Error(errData.error || "Failed to upload file");
       }
+      if (response.status === 202) {
+        // Large file: imported in the background, poll the job until it finishes
+        const { status_url } = await response.json();
+        let job: any = { status: "queued" };
+        let polls = 0;
+        while (job.status === "queued" || job.status === "running") {
+          if (polls++ >= MAX_IMPORT_POLLS) {
+            throw new Error(
+              "The import is taking longer than expected. It will keep running; check your transactions again later."
+            );
+          }
+          await new Promise((resolve) => setTimeout(resolve, IMPORT_POLL_INTERVAL_MS));
+          const jobRes = await fetch(`${process.env.NEXT_PUBLIC_API_URL}${status_url}`, {
+            headers: { Authorization: `Bearer ${await getFirebaseIdToken()}` },
+          });
+          if (!jobRes.ok) throw new Error("Failed to fetch import progress");
+          job = await jobRes.json();
+          const eta = job.eta_seconds ? `, about ${Math.ceil(job.eta_seconds)}s left` : "";
+          setSuccessMessage(`Importing: ${job.rows_processed} rows processed${eta}`);
+        }
+        if (job.status === "failed") throw new Error(job.message || "Import failed");
+      }
       setSuccessMessage("File uploaded successfully.");
       if (onUploadSuccess) onUploadSuccess();
       // Optionally, close the modal automatically:
@@ -59,7 +59,7 @@ export default function CryptoHistoricalChart({ symbol }: CryptoHistoricalChartP
       try {
         const token = await getFirebaseIdToken();
         const res = await fetch(
-          `${process.env.NEXT_PUBLIC_API_URL}/api/crypto/historical/${symbol}`,
+          `${process.env.NEXT_PUBLIC_API_URL}/api/crypto/historical/${symbol}?points=500`,
           {
             headers: {
               "Content-Type": "application/json",
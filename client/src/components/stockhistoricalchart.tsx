@@ -117,7 +117,7 @@ export default function StockHistoricalChart({
       try {
         const token = await getFirebaseIdToken();
         const res = await fetch(
-            `${process.env.NEXT_PUBLIC_API_URL}/api/stock/historical/${symbol}`,
+            `${process.env.NEXT_PUBLIC_API_URL}/api/stock/historical/${symbol}?points=500`,
             {
               headers: {
                 "Content-Type": "application/json",
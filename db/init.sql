@@ -11,7 +11,8 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE TABLE IF NOT EXISTS portfolios (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id UUID UNIQUE REFERENCES users(id) ON DELETE CASCADE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    ledger_version INTEGER NOT NULL DEFAULT 0
 );
 
 -- Portfolio Holdings (stores assets in a portfolio)
@@ -35,7 +36,66 @@ CREATE TABLE IF NOT EXISTS transactions (
     shares NUMERIC(12,2) NOT NULL CHECK (shares > 0),
     price NUMERIC(12,2) NOT NULL CHECK (price >= 0),
     transaction_type TEXT NOT NULL CHECK (transaction_type IN ('buy', 'sell')),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fingerprint VARCHAR(40)
+);
+
+-- Daily closing prices per ticker (persistent history store)
+CREATE TABLE IF NOT EXISTS daily_prices (
+    ticker VARCHAR(10) NOT NULL,
+    date DATE NOT NULL,
+    close NUMERIC(14,4) NOT NULL,
+    PRIMARY KEY (ticker, date)
+);
+
+-- Date range already fetched into daily_prices for each ticker
+CREATE TABLE IF NOT EXISTS price_coverage (
+    ticker VARCHAR(10) PRIMARY KEY,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Materialized end-of-day portfolio valuations
+CREATE TABLE IF NOT EXISTS portfolio_valuations (
+    portfolio_id UUID REFERENCES portfolios(id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    market_value NUMERIC(16,2) NOT NULL DEFAULT 0,
+    book_value NUMERIC(16,2) NOT NULL DEFAULT 0,
+    breakdown JSONB NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (portfolio_id, date)
+);
+
+-- Cached upstream API responses (zlib-compressed JSON)
+CREATE TABLE IF NOT EXISTS api_cache (
+    key VARCHAR(255) PRIMARY KEY,
+    payload BYTEA NOT NULL,
+    etag VARCHAR(64) NOT NULL,
+    fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Background CSV imports (zlib-compressed upload plus progress)
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    portfolio_id UUID REFERENCES portfolios(id) ON DELETE CASCADE,
+    filename VARCHAR(255),
+    payload BYTEA NOT NULL,
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    rows_processed INTEGER NOT NULL DEFAULT 0,
+    rows_added INTEGER NOT NULL DEFAULT 0,
+    bytes_processed INTEGER NOT NULL DEFAULT 0,
+    error_count INTEGER NOT NULL DEFAULT 0,
+    errors JSONB NOT NULL DEFAULT '[]',
+    tickers JSONB NOT NULL DEFAULT '[]',
+    earliest_date TIMESTAMP,
+    message TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    finished_at TIMESTAMP
 );
 
 -- Watchlist table
@@ -56,4 +116,10 @@ CREATE TABLE IF NOT EXISTS user_threads (
 );
 
 CREATE INDEX idx_portfolio_holdings_ticker ON portfolio_holdings(ticker);
-CREATE INDEX idx_transactions_ticker ON transactions(ticker);
\ No newline at end of file
+CREATE INDEX idx_transactions_ticker ON transactions(ticker);
+CREATE UNIQUE INDEX idx_transactions_portfolio_fingerprint ON transactions(portfolio_id, fingerprint);
+CREATE INDEX idx_transactions_portfolio_created_at ON transactions(portfolio_id, created_at, id);
+CREATE INDEX idx_transactions_portfolio_ticker_created_at ON transactions(portfolio_id, ticker, created_at, id);
+CREATE INDEX idx_api_cache_expires_at ON api_cache(expires_at);
+CREATE INDEX idx_import_jobs_portfolio_id ON import_jobs(portfolio_id);
+CREATE INDEX idx_import_jobs_status ON import_jobs(status);
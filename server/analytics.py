@@ -0,0 +1,348 @@
+# analytics.py
+from datetime import datetime, timedelta
+
+from cache import TTLCache
+from config import Config
+from models import db, PriceCoverage, PortfolioHolding
+from helpers import load_ledger, fetch_price_matrix, ensure_price_history
+from ledger_index import get_ledger_index
+from valuation import ledger_frame, value_history
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Lookback of each supported window in days (None: from the first transaction / Jan 1)
+WINDOWS = {
+    "1m": 30,
+    "3m": 91,
+    "6m": 182,
+    "1y": 365,
+    "3y": 3 * 365,
+    "ytd": None,
+    "max": None
+}
+
+# Trading days per year, for annualizing daily statistics
+TRADING_DAYS = 252
+
+# Windows accepted by the risk endpoint (it needs a fixed lookback for current holdings)
+RISK_WINDOWS = ("3m", "6m", "1y", "3y")
+
+# (portfolio_id, ledger_version, window, last closed day, price stamp) -> analytics
+analytics_cache = TTLCache(maxsize=Config.ANALYTICS_CACHE_MAXSIZE, ttl=Config.ANALYTICS_CACHE_TTL)
+
+# (holdings, window, last closed day, price stamp) -> risk report; portfolios
+# holding the same positions share an entry
+risk_cache = TTLCache(maxsize=Config.ANALYTICS_CACHE_MAXSIZE, ttl=Config.ANALYTICS_CACHE_TTL)
+
+
+def daily_returns(ledger, closes, dates):
+    """
+    Time-weighted daily returns: each day's change in market value net of that
+    day's purchases and sales, over the previous day's value. Trades on dates
+    that are not sampled (weekends) count on the next sampled date.
+
+    Returns:
+        tuple: (returns Series - NaN where the previous value is 0, values Series)
+    """
+    values, _, _ = value_history(ledger, closes, dates)
+    flows = np.zeros(len(dates))
+    position = dates.searchsorted(ledger["date"].to_numpy(), side="left")
+    inside = position < len(dates)
+    amounts = (ledger["signed_shares"] * ledger["price"]).to_numpy()
+    np.add.at(flows, position[inside], amounts[inside])
+
+    current = values.to_numpy()
+    previous = np.concatenate(([0.0], current[:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.where(previous > 0, (current - flows) / previous - 1, np.nan)
+    return pd.Series(returns, index=dates), values
+
+
+def return_metrics(returns, benchmark_returns=None, risk_free_rate=0.0):
+    """
+    Risk/return statistics of a daily return series, computed on whole arrays.
+
+    Args:
+        returns (Series): Daily returns indexed by date (NaN days are skipped)
+        benchmark_returns (Series, optional): Benchmark daily returns on the same index, for beta
+        risk_free_rate (float): Annual risk-free rate used by the Sharpe ratio
+
+    Returns:
+        dict: twr, annualized_return (None for less than a year of returns), volatility,
+              sharpe, max_drawdown, drawdown_peak, drawdown_trough, beta, benchmark_return,
+              observations
+    """
+    r = returns.to_numpy(dtype=float)
+    valid = np.flatnonzero(np.isfinite(r))
+    metrics = dict.fromkeys(["twr", "annualized_return", "volatility", "sharpe", "max_drawdown",
+                             "drawdown_peak", "drawdown_trough", "beta", "benchmark_return"])
+    metrics["observations"] = int(len(valid))
+    if len(valid) < 2:
+        return metrics
+    daily = r[valid]
+    dates = returns.index
+
+    # Wealth index starting at 1 on the day before the first return
+    wealth = np.concatenate(([1.0], np.cumprod(1 + daily)))
+    metrics["twr"] = float(wealth[-1] - 1)
+    # Compounding a window shorter than a year up to 12 months just extrapolates noise
+    years = len(daily) / TRADING_DAYS
+    if years >= 1:
+        metrics["annualized_return"] = float(wealth[-1] ** (1 / years) - 1) if wealth[-1] > 0 else -1.0
+    volatility = float(daily.std(ddof=1) * np.sqrt(TRADING_DAYS))
+    metrics["volatility"] = volatility
+    if volatility > 0:
+        metrics["sharpe"] = float((daily.mean() * TRADING_DAYS - risk_free_rate) / volatility)
+
+    running_peak = np.maximum.accumulate(wealth)
+    drawdown = wealth / running_peak - 1
+    trough = int(np.argmin(drawdown))
+    peak = int(np.argmax(wealth[:trough + 1]))
+    # wealth[k] is the value after the k-th valid return; wealth[0] is the day before the first
+    wealth_dates = np.concatenate(([valid[0] - 1], valid))
+    metrics["max_drawdown"] = float(drawdown[trough])
+    metrics["drawdown_peak"] = dates[wealth_dates[peak]].date().isoformat()
+    metrics["drawdown_trough"] = dates[wealth_dates[trough]].date().isoformat()
+
+    if benchmark_returns is not None:
+        b = benchmark_returns.reindex(dates).to_numpy(dtype=float)[valid]
+        both = np.isfinite(b)
+        if both.sum() >= 2:
+            x, y = b[both], daily[both]
+            variance = x.var(ddof=1)
+            if variance > 0:
+                metrics["beta"] = float(np.cov(y, x, ddof=1)[0, 1] / variance)
+            metrics["benchmark_return"] = float(np.prod(1 + x) - 1)
+    return metrics
+
+
+def pairwise_covariance(returns):
+    """
+    Sample covariance and correlation of every pair of columns over the days
+    both have a return (pairwise-complete), from a handful of matrix products
+    instead of one pass per pair.
+
+    Args:
+        returns (ndarray): days x tickers, NaN where a ticker has no return
+
+    Returns:
+        tuple: (covariance, correlation) tickers x tickers arrays, NaN where undefined
+    """
+    valid = np.isfinite(returns).astype(float)
+    x = np.nan_to_num(returns)
+    n = valid.T @ valid                  # days both columns are valid
+    sum_i = x.T @ valid                  # sum of column i over those days
+    sum_j = sum_i.T
+    sum_ij = x.T @ x
+    sq_i = (x * x).T @ valid
+    sq_j = sq_i.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cross = sum_ij - sum_i * sum_j / n
+        var_i = sq_i - sum_i ** 2 / n
+        var_j = sq_j - sum_j ** 2 / n
+        covariance = np.where(n > 1, cross / (n - 1), np.nan)
+        correlation = cross / np.sqrt(var_i * var_j)
+    correlation[~np.isfinite(correlation)] = np.nan
+    return covariance, np.clip(correlation, -1.0, 1.0)
+
+
+def historical_var(portfolio_returns, levels=(0.95, 0.99)):
+    """1-day historical VaR per confidence level, as a positive fraction of portfolio value."""
+    r = portfolio_returns[np.isfinite(portfolio_returns)]
+    if len(r) == 0:
+        return dict.fromkeys(levels)
+    losses = np.percentile(r, [100 * (1 - level) for level in levels])
+    return {level: float(max(0.0, -loss)) for level, loss in zip(levels, losses)}
+
+
+def window_start(window, first_trade, today):
+    """First day of the analytics window, never before the first transaction."""
+    if window == "max":
+        return first_trade
+    if window == "ytd":
+        start = today.replace(month=1, day=1)
+    else:
+        start = today - timedelta(days=WINDOWS[window])
+    return max(start, first_trade)
+
+
+def price_stamp(tickers):
+    """Last time closes were stored for any of the tickers; moves whenever prices are updated."""
+    return db.session.query(db.func.max(PriceCoverage.updated_at)) \
+        .filter(PriceCoverage.ticker.in_(tickers)).scalar()
+
+
+def ensure_window_closes(tickers, start):
+    """
+    Download any closes missing for a window before a cache key is built, so the
+    key's price_stamp already reflects them and the entry is not keyed under a
+    stamp the computation itself moves.
+    """
+    try:
+        ensure_price_history(tickers, start - timedelta(days=7), datetime.now().date() - timedelta(days=1))
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error downloading historical prices for {', '.join(tickers)}: {e}")
+
+
+def compute_analytics(portfolio_id, window):
+    """
+    Risk/return metrics of a portfolio over a window of closed trading days,
+    from its daily market values against the benchmark (see return_metrics).
+
+    Returns:
+        dict: {"window", "start", "end", "benchmark", "metrics"}, or None for an empty ledger
+    """
+    ledger = ledger_frame(load_ledger(portfolio_id))
+    if ledger.empty:
+        return None
+    today = datetime.now().date()
+    last_closed = today - timedelta(days=1)
+    start = window_start(window, ledger["date"].iloc[0].date(), today)
+    dates = pd.bdate_range(start, last_closed)
+
+    tickers = sorted(ledger["ticker"].unique())
+    closes = fetch_price_matrix(tickers + [Config.ANALYTICS_BENCHMARK], start - timedelta(days=7), last_closed)
+    closes.index = pd.to_datetime(closes.index)
+    benchmark = closes.pop(Config.ANALYTICS_BENCHMARK) if Config.ANALYTICS_BENCHMARK in closes.columns else None
+
+    # Value the trading day before the window too, so the window's first day has a return
+    valued = dates.insert(0, dates[0] - pd.offsets.BDay(1)) if len(dates) else dates
+    returns, _ = daily_returns(ledger, closes.reindex(columns=tickers), valued)
+    returns = returns.iloc[1:]
+    benchmark_returns = None
+    if benchmark is not None and benchmark.notna().any():
+        benchmark_returns = benchmark.sort_index().ffill().reindex(valued, method="ffill").pct_change().iloc[1:]
+    return {
+        "window": window,
+        "start": start.isoformat(),
+        "end": last_closed.isoformat(),
+        "benchmark": Config.ANALYTICS_BENCHMARK,
+        "metrics": return_metrics(returns, benchmark_returns, Config.RISK_FREE_RATE)
+    }
+
+
+def get_portfolio_analytics(portfolio_id, window="1y"):
+    """
+    Cached compute_analytics(). Entries are keyed by the ledger version and the
+    newest stored closes, so they are reused until a trade or a price update.
+
+    Returns:
+        tuple: (analytics or None, ledger_version) - (None, None) if the portfolio does not exist
+    """
+    if window not in WINDOWS:
+        raise ValueError(f"Invalid window '{window}'. Use one of: {', '.join(WINDOWS)}")
+    index, version = get_ledger_index(portfolio_id)
+    if index is None:
+        return None, None
+    tickers = sorted(index.times) + [Config.ANALYTICS_BENCHMARK]
+    first_trade = min((times[0] for times in index.times.values() if times[0] > datetime.min), default=None)
+    if first_trade is not None:
+        ensure_window_closes(tickers, window_start(window, first_trade.date(), datetime.now().date()))
+    key = (portfolio_id, version, window, datetime.now().date(), price_stamp(tickers))
+    return analytics_cache.get_or_load(key, lambda: compute_analytics(portfolio_id, window)), version
+
+
+def _finite(value, digits=6):
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+def compute_risk(holdings, window):
+    """
+    Correlation, variance contributions and historical VaR of a set of holdings
+    over a window of daily closes, with the holdings' current weights. Both
+    halves use one sample: the stored trading days on which every priced ticker
+    has a close, so the covariance matrix is a proper (positive semidefinite)
+    sample covariance and VaR sees exactly the same days.
+
+    Args:
+        holdings (tuple): ((ticker, shares), ...) sorted by ticker
+        window (str): One of RISK_WINDOWS
+
+    Returns:
+        dict: Risk report for /api/portfolio/<id>/risk
+    """
+    today = datetime.now().date()
+    last_closed = today - timedelta(days=1)
+    start = today - timedelta(days=WINDOWS[window])
+    tickers = [ticker for ticker, _ in holdings]
+    shares = np.array([qty for _, qty in holdings], dtype=float)
+
+    closes = fetch_price_matrix(tickers, start - timedelta(days=7), last_closed)
+    closes.index = pd.to_datetime(closes.index)
+    closes = closes.reindex(columns=tickers).sort_index()
+    # Keep the last stored day before the window so its first day has a return
+    before = closes.index[closes.index < pd.Timestamp(start)]
+    if len(before):
+        closes = closes[closes.index >= before[-1]]
+
+    last_price = closes.ffill().iloc[-1].to_numpy(dtype=float) if len(closes) else np.full(len(tickers), np.nan)
+    priced = np.isfinite(last_price) & (closes.notna().sum().to_numpy() >= 3)
+    excluded = [t for t, ok in zip(tickers, priced) if not ok]
+    tickers = [t for t, ok in zip(tickers, priced) if ok]
+    # Returns between consecutive days on which every priced ticker closed
+    complete = closes.loc[:, priced].dropna(how="any").to_numpy(dtype=float)
+    returns = complete[1:] / complete[:-1] - 1
+    values = shares[priced] * last_price[priced]
+    total = values.sum()
+    report = {
+        "window": window,
+        "start": start.isoformat(),
+        "end": last_closed.isoformat(),
+        "tickers": tickers,
+        "excluded": excluded,
+        "market_value": round(float(total), 2),
+        "observations": int(len(returns)),
+        "weights": {},
+        "correlation": [],
+        "variance_contributions": {},
+        "volatility": None,
+        "var": {"95": None, "99": None}
+    }
+    if not tickers or total <= 0 or len(returns) < 2:
+        return report
+
+    weights = values / total
+    covariance, correlation = pairwise_covariance(returns)
+    marginal = covariance @ weights
+    variance = float(weights @ marginal)
+    contributions = weights * marginal / variance if variance > 0 else np.full(len(tickers), np.nan)
+
+    # Historical simulation: today's weights applied to every day in the sample
+    var = historical_var(returns @ weights, (0.95, 0.99))
+
+    report["weights"] = {t: _finite(w) for t, w in zip(tickers, weights)}
+    report["correlation"] = [[_finite(c, 4) for c in row] for row in correlation]
+    report["variance_contributions"] = {t: _finite(c) for t, c in zip(tickers, contributions)}
+    report["volatility"] = _finite(np.sqrt(max(variance, 0.0) * TRADING_DAYS))
+    report["var"] = {
+        str(int(level * 100)): None if loss is None else {
+            "return": round(loss, 6),
+            "amount": round(loss * float(total), 2)
+        } for level, loss in var.items()
+    }
+    return report
+
+
+def get_portfolio_risk(portfolio_id, window="1y"):
+    """
+    Cached compute_risk() for the portfolio's current holdings, memoized per
+    (holdings, window) and refreshed on a new trading day or price update.
+
+    Returns:
+        dict: Risk report (empty lists when nothing is held)
+    """
+    if window not in RISK_WINDOWS:
+        raise ValueError(f"Invalid window '{window}'. Use one of: {', '.join(RISK_WINDOWS)}")
+    rows = db.session.query(PortfolioHolding.ticker, PortfolioHolding.shares) \
+        .filter(PortfolioHolding.portfolio_id == portfolio_id, PortfolioHolding.shares > 0) \
+        .order_by(PortfolioHolding.ticker).all()
+    holdings = tuple((ticker, float(shares)) for ticker, shares in rows)
+    if not holdings:
+        return compute_risk(holdings, window)
+    tickers = [ticker for ticker, _ in holdings]
+    ensure_window_closes(tickers, datetime.now().date() - timedelta(days=WINDOWS[window]))
+    key = (holdings, window, datetime.now().date(), price_stamp(tickers))
+    return risk_cache.get_or_load(key, lambda: compute_risk(holdings, window))
@@ -1,5 +1,7 @@
+import startup  # first: starts the boot timer
 import os
 import json
+import time
 from flask import Flask
 from flask_cors import CORS
 from config import Config
@@ -7,7 +9,27 @@ from models import db
 import firebase_admin
 from firebase_admin import credentials, initialize_app
 from routes import register_routes
-from sqlalchemy import inspect
+from commands import register_commands
+from symbols import get_symbol_index
+
+_imports_done_at = time.perf_counter()
+
+
+def init_firebase(app):
+    """Initialize the default Firebase app from FIREBASE_CREDENTIALS (JSON or a file path)."""
+    cred = app.extensions.get('firebase_credential')
+    if cred is None:
+        # It first attempts to parse the value as JSON.
+        firebase_creds_raw = app.config.get('FIREBASE_CREDENTIALS')
+        try:
+            # Attempt to parse the environment variable as JSON.
+            firebase_creds_dict = json.loads(firebase_creds_raw)
+            cred = credentials.Certificate(firebase_creds_dict)
+        except json.JSONDecodeError:
+            # If parsing fails, treat it as a file path.
+            cred = credentials.Certificate(firebase_creds_raw)
+        app.extensions['firebase_credential'] = cred
+    firebase_admin.initialize_app(cred)
 
 
 def create_app():
@@ -29,38 +51,39 @@ def create_app():
         supports_credentials=True
     )
 
-    # Initialize the database
+    # Initialize the database. Tables are created by `flask migrate-db`, not on import.
     db.init_app(app)
 
     # Initialize Firebase using credentials from the environment variable.
-    # It first attempts to parse the value as JSON.
-    firebase_creds_raw = app.config.get('FIREBASE_CREDENTIALS')
-    try:
-        # Attempt to parse the environment variable as JSON.
-        firebase_creds_dict = json.loads(firebase_creds_raw)
-        cred = credentials.Certificate(firebase_creds_dict)
-    except json.JSONDecodeError:
-        # If parsing fails, treat it as a file path.
-        cred = credentials.Certificate(firebase_creds_raw)
+    init_firebase(app)
 
-    firebase_admin.initialize_app(cred)
-
-    # Register routes
+    # Register routes and CLI commands
     register_routes(app)
+    register_commands(app)
+
+    # Build the ticker search index now (in the gunicorn master when preloading)
+    # instead of on the first search
+    get_symbol_index()
     return app
 
 
+def reset_after_fork(app):
+    """
+    Called in each gunicorn worker forked from a preloaded master: drop the pooled
+    DB connections and the Firebase app inherited from the parent so the worker
+    opens its own sockets.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+    firebase_admin.delete_app(firebase_admin.get_app())
+    init_firebase(app)
+
+
 # Create the app at the module level so that gunicorn can find it
 app = create_app()
 
-with app.app_context():
-    inspector = inspect(db.engine)
-    existing_tables = inspector.get_table_names()
-    for table in db.metadata.tables.values():
-        if table.name not in existing_tables:
-            table.create(db.engine, checkfirst=True)
-        else:
-            print(f"Table {table.name} already exists")
+app.extensions['startup'] = startup.startup_report(_imports_done_at, time.perf_counter())
+print(f"Startup: {app.extensions['startup']}")
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
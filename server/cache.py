@@ -0,0 +1,109 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after a TTL.
+
+    Each entry may carry its own expiry (e.g. a token's `exp` claim); otherwise
+    the cache-wide default TTL applies. Hit/miss/eviction counters are kept so
+    the effectiveness of each cache can be inspected through `stats()`.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._loading = {}  # key -> lock held while a loader fills that key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """
+        Store a value. `expires_at` (epoch seconds) takes precedence over `ttl`,
+        which in turn overrides the cache-wide default.
+        """
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Return the cached value for key, calling loader() to fill it on a miss.
+        Concurrent callers for the same key wait for a single load instead of
+        each hitting the upstream. Exceptions from loader are not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                with self._lock:
+                    entry = self._data.get(key)
+                if entry is not None and entry[0] > time.time():
+                    return entry[1]
+                value = loader()
+                self.set(key, value, ttl=ttl)
+                return value
+        finally:
+            with self._lock:
+                if self._loading.get(key) is key_lock:
+                    del self._loading[key]
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
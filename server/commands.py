@@ -0,0 +1,204 @@
+# commands.py
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import inspect, text, UniqueConstraint
+
+import http_client
+from config import Config
+
+from models import db, Portfolio, Transaction
+from helpers import ensure_price_history, snapshot_portfolio_valuations, check_holdings, rebuild_holdings
+from jobs import claim_import_job, run_import_job, requeue_failed_jobs
+from symbols import NASDAQ_TRADED_URL, parse_nasdaq_traded, write_symbol_listing
+from ratelimit import request_priority, BACKGROUND
+
+# Flask app inherited by forked snapshot workers (set by _init_snapshot_worker)
+_worker_app = None
+
+
+def _init_snapshot_worker(app):
+    global _worker_app
+    _worker_app = app
+
+
+def _snapshot_worker(portfolio_id, rebuild):
+    with _worker_app.app_context(), request_priority(BACKGROUND):
+        try:
+            return portfolio_id, snapshot_portfolio_valuations(portfolio_id, rebuild=rebuild), None
+        except Exception as e:
+            db.session.rollback()
+            return portfolio_id, 0, str(e)
+
+
+def register_commands(app):
+
+    @app.cli.command("snapshot-valuations")
+    @click.option("--workers", default=4, show_default=True, help="Number of worker processes.")
+    @click.option("--portfolio", "portfolio_ids", multiple=True, help="Only snapshot these portfolio ids.")
+    @click.option("--rebuild", is_flag=True, help="Discard stored snapshots and recompute from the first transaction.")
+    def snapshot_valuations(workers, portfolio_ids, rebuild):
+        """Materialize daily portfolio valuations for all closed days not stored yet."""
+        with request_priority(BACKGROUND):
+            if not portfolio_ids:
+                portfolio_ids = [pid for (pid,) in db.session.query(Portfolio.id).all()]
+            if not portfolio_ids:
+                click.echo("No portfolios to snapshot.")
+                return
+
+            # Backfill prices for every ticker once up front, so workers only read the
+            # price store instead of racing each other for the same downloads.
+            first_trade, tickers = db.session.query(
+                db.func.min(Transaction.created_at), db.func.array_agg(db.distinct(Transaction.ticker))
+            ).filter(Transaction.portfolio_id.in_(portfolio_ids)).one()
+            if first_trade and tickers:
+                ensure_price_history(tickers, first_trade.date() - timedelta(days=7), datetime.now().date())
+
+            # Forked workers must not share the parent's pooled connections
+            db.engine.dispose()
+
+            written = 0
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=context,
+                                     initializer=_init_snapshot_worker, initargs=(app,)) as executor:
+                futures = [executor.submit(_snapshot_worker, pid, rebuild) for pid in portfolio_ids]
+                for future in as_completed(futures):
+                    portfolio_id, days, error = future.result()
+                    if error:
+                        click.echo(f"Error snapshotting portfolio {portfolio_id}: {error}", err=True)
+                    else:
+                        written += days
+            click.echo(f"Wrote {written} daily valuations for {len(portfolio_ids)} portfolios.")
+
+    @app.cli.command("check-holdings")
+    @click.option("--portfolio", "portfolio_id", default=None, help="Only check this portfolio id.")
+    @click.option("--fix", is_flag=True, help="Rewrite mismatched holdings from a full ledger replay.")
+    def check_holdings_command(portfolio_id, fix):
+        """Compare incrementally maintained holdings against a full replay of the transaction ledger."""
+        mismatches = check_holdings(portfolio_id, fix=fix)
+        for m in mismatches:
+            click.echo(f"{m['portfolio_id']} {m['ticker']}: stored={m['stored']} replayed={m['replayed']}")
+        if not mismatches:
+            click.echo("All holdings match the transaction ledger.")
+        elif fix:
+            click.echo(f"Fixed {len(mismatches)} holdings.")
+        else:
+            raise SystemExit(1)
+
+    @app.cli.command("import-worker")
+    @click.option("--once", is_flag=True, help="Exit when the queue is empty instead of polling.")
+    @click.option("--poll", default=2.0, show_default=True, help="Seconds between queue polls.")
+    @click.option("--retry-failed", is_flag=True, help="Re-queue jobs that failed on an error before starting.")
+    def import_worker(once, poll, retry_failed):
+        """Process queued CSV import jobs."""
+        if retry_failed:
+            click.echo(f"Re-queued {requeue_failed_jobs()} failed jobs")
+        with request_priority(BACKGROUND):
+            while True:
+                job = claim_import_job()
+                if job is None:
+                    if once:
+                        break
+                    time.sleep(poll)
+                    continue
+                click.echo(f"Importing job {job.id} ({job.filename}, {job.total_bytes} bytes)")
+                job = run_import_job(job)
+                click.echo(f"Job {job.id} {job.status}: {job.message}")
+
+    @app.cli.command("refresh-symbols")
+    @click.option("--source", default=NASDAQ_TRADED_URL, show_default=True, help="nasdaqtraded.txt listing URL.")
+    @click.option("--if-older-than", "max_age", type=float, default=None,
+                  help="Only download when the listing file is older than this many hours.")
+    def refresh_symbols(source, max_age):
+        """Rebuild the local symbol listing used by ticker search from the Nasdaq symbol directory."""
+        if max_age is not None and os.path.exists(Config.SYMBOL_LISTING_PATH):
+            age = (time.time() - os.path.getmtime(Config.SYMBOL_LISTING_PATH)) / 3600
+            if age < max_age:
+                click.echo(f"Symbol listing is {age:.1f}h old; not refreshing.")
+                return
+        with request_priority(BACKGROUND):
+            response = http_client.get(source)
+        response.raise_for_status()
+        rows = parse_nasdaq_traded(response.text)
+        if not rows:
+            raise click.ClickException("Listing was empty; keeping the existing symbol file.")
+        write_symbol_listing(rows, Config.SYMBOL_LISTING_PATH)
+        click.echo(f"Wrote {len(rows)} symbols to {Config.SYMBOL_LISTING_PATH}.")
+
+    @app.cli.command("migrate-db")
+    def migrate_db():
+        """
+        Bring the database up to the models: create missing tables, add missing
+        columns and create missing indexes and unique constraints. Additive only -
+        nothing is dropped or altered - so it is safe to run before every deploy.
+        Duplicate holdings blocking portfolio_holdings' unique key are collapsed
+        and recomputed from the ledger; duplicates in other tables are reported
+        and their constraint is skipped.
+        """
+        rebuilt = []
+        with db.engine.begin() as conn:
+            inspector = inspect(conn)
+            existing_tables = set(inspector.get_table_names())
+            changes = 0
+            for table in db.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    table.create(conn)
+                    click.echo(f"Created table {table.name}")
+                    changes += 1
+                    continue
+                existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in existing_columns:
+                        ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}'
+                        # Existing rows get the server default; without one the column is added as nullable
+                        if column.server_default is not None:
+                            default = column.server_default.arg
+                            default = f"'{default}'" if isinstance(default, str) else default.compile(dialect=conn.dialect)
+                            ddl += f" DEFAULT {default}" + ("" if column.nullable else " NOT NULL")
+                        conn.execute(text(ddl))
+                        click.echo(f"Added column {table.name}.{column.name}")
+                        changes += 1
+                existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing_indexes:
+                        index.create(conn)
+                        click.echo(f"Created index {index.name}")
+                        changes += 1
+                # Upserts (ON CONFLICT) need these; unique indexes on the same columns also count
+                existing_unique = {tuple(u["column_names"]) for u in inspector.get_unique_constraints(table.name)}
+                existing_unique |= {tuple(i["column_names"]) for i in inspector.get_indexes(table.name) if i["unique"]}
+                for constraint in table.constraints:
+                    columns = tuple(c.name for c in constraint.columns)
+                    if not isinstance(constraint, UniqueConstraint) or columns in existing_unique:
+                        continue
+                    column_list = ", ".join(columns)
+                    duplicates = conn.execute(text(
+                        f"SELECT {column_list} FROM {table.name} GROUP BY {column_list} HAVING COUNT(*) > 1"
+                    )).all()
+                    if duplicates and table.name == "portfolio_holdings":
+                        # Holdings are derived from the ledger: keep one row per key and recompute it below
+                        conn.execute(text(
+                            "DELETE FROM portfolio_holdings h USING portfolio_holdings d "
+                            "WHERE h.portfolio_id = d.portfolio_id AND h.ticker = d.ticker AND h.id < d.id"
+                        ))
+                        rebuilt.extend(duplicates)
+                    elif duplicates:
+                        click.echo(f"Skipped unique ({column_list}) on {table.name}: {len(duplicates)} duplicate keys")
+                        continue
+                    name = constraint.name or f"{table.name}_{'_'.join(columns)}_key"
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD CONSTRAINT {name} UNIQUE ({column_list})"))
+                    click.echo(f"Created unique constraint {name}")
+                    changes += 1
+        by_portfolio = {}
+        for portfolio_id, ticker in rebuilt:
+            by_portfolio.setdefault(portfolio_id, []).append(ticker)
+        for portfolio_id, tickers in by_portfolio.items():
+            rebuild_holdings(portfolio_id, tickers)
+        db.session.commit()
+        if rebuilt:
+            click.echo(f"Recomputed {len(rebuilt)} duplicated holdings")
+        click.echo(f"Schema up to date ({changes} changes).")
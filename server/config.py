@@ -1,8 +1,75 @@
 # config.py
 import os
+import tempfile
 
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     FIREBASE_CREDENTIALS = os.getenv('FIREBASE_CREDENTIALS', 'path/to/default.json')
     ALPHAVANTAGE_API_KEY = os.environ['STOCKR_ALPHA_ID']
+
+    # Verified Firebase tokens -> resolved user/portfolio ids (entries expire with the token)
+    AUTH_CACHE_MAXSIZE = int(os.getenv('AUTH_CACHE_MAXSIZE', 2048))
+
+    # Bearer token for /api/metrics; when unset the endpoint only answers localhost
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+    # Shared finviz fundamentals cache used for prices, sectors and quote data
+    QUOTE_CACHE_TTL = int(os.getenv('QUOTE_CACHE_TTL', 300))
+    QUOTE_CACHE_MAXSIZE = int(os.getenv('QUOTE_CACHE_MAXSIZE', 1024))
+    # Batched screener quotes: tickers per screener query and delay between result pages
+    SCREENER_BATCH_SIZE = int(os.getenv('SCREENER_BATCH_SIZE', 100))
+    SCREENER_PAGE_DELAY = float(os.getenv('SCREENER_PAGE_DELAY', 0.5))
+    QUOTES_MAX_TICKERS = int(os.getenv('QUOTES_MAX_TICKERS', 500))
+
+    # Watchlist fan-out: pool size, per-ticker deadline and total request budget (seconds)
+    WATCHLIST_FETCH_WORKERS = int(os.getenv('WATCHLIST_FETCH_WORKERS', 8))
+    WATCHLIST_TICKER_TIMEOUT = float(os.getenv('WATCHLIST_TICKER_TIMEOUT', 20))
+    WATCHLIST_REQUEST_BUDGET = float(os.getenv('WATCHLIST_REQUEST_BUDGET', 60))
+
+    # Batched yfinance history downloads: tickers per yf.download call and its thread count
+    PRICE_DOWNLOAD_CHUNK_SIZE = int(os.getenv('PRICE_DOWNLOAD_CHUNK_SIZE', 50))
+    PRICE_DOWNLOAD_THREADS = int(os.getenv('PRICE_DOWNLOAD_THREADS', 8))
+    # Valuation snapshots wait for a held ticker's missing closes unless it has been silent this long (delisted)
+    SNAPSHOT_PRICE_GRACE_DAYS = int(os.getenv('SNAPSHOT_PRICE_GRACE_DAYS', 7))
+
+    # Upstream token buckets shared by all workers on the host: (requests, per seconds)
+    UPSTREAM_RATE_LIMITS = {
+        'alphavantage': (int(os.getenv('ALPHAVANTAGE_RATE_LIMIT', 5)), 60),
+        'finviz': (int(os.getenv('FINVIZ_RATE_LIMIT', 10)), 10)
+    }
+    RATE_LIMIT_STATE_DIR = os.getenv('RATE_LIMIT_STATE_DIR', tempfile.gettempdir())
+    RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', 30))
+
+    # Pooled outbound HTTP client: pools, default (connect, read) timeouts and GET retries
+    HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', 10))
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 20))
+    HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+    HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 0.5))
+
+    # Local symbol/company listing used by ticker search (refresh with `flask refresh-symbols`)
+    SYMBOL_LISTING_PATH = os.getenv('SYMBOL_LISTING_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'symbols.csv'))
+    SYMBOL_INDEX_RECHECK = float(os.getenv('SYMBOL_INDEX_RECHECK', 60))
+
+    # Uploads larger than this are imported by a background job (see `flask import-worker`)
+    IMPORT_ASYNC_BYTES = int(os.getenv('IMPORT_ASYNC_BYTES', 512 * 1024))
+    IMPORT_CHUNK_ROWS = int(os.getenv('IMPORT_CHUNK_ROWS', 1000))
+    # Process queued jobs in a thread of the web worker that accepted them
+    IMPORT_INLINE_WORKER = os.getenv('IMPORT_INLINE_WORKER', 'true').lower() == 'true'
+    # A running job with no heartbeat for this long is considered abandoned and re-queued
+    IMPORT_STALE_SECONDS = int(os.getenv('IMPORT_STALE_SECONDS', 300))
+
+    # Point-in-time holdings indexes, one per (portfolio, ledger_version)
+    LEDGER_INDEX_CACHE_MAXSIZE = int(os.getenv('LEDGER_INDEX_CACHE_MAXSIZE', 256))
+    LEDGER_INDEX_CACHE_TTL = int(os.getenv('LEDGER_INDEX_CACHE_TTL', 3600))
+    # Lot-matching reports, one per (portfolio, ledger_version, method)
+    LOT_CACHE_MAXSIZE = int(os.getenv('LOT_CACHE_MAXSIZE', 256))
+    LOT_CACHE_TTL = int(os.getenv('LOT_CACHE_TTL', 3600))
+
+    # Portfolio analytics: benchmark for beta, annual risk-free rate for Sharpe and result cache
+    ANALYTICS_BENCHMARK = os.getenv('ANALYTICS_BENCHMARK', '^GSPC')
+    RISK_FREE_RATE = float(os.getenv('RISK_FREE_RATE', 0.0))
+    ANALYTICS_CACHE_MAXSIZE = int(os.getenv('ANALYTICS_CACHE_MAXSIZE', 256))
+    ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', 6 * 3600))
@@ -0,0 +1,250 @@
+# csv_import.py
+import codecs
+import csv
+import hashlib
+import re
+from collections import Counter
+from datetime import datetime
+from itertools import chain, islice
+
+# Standardized field -> header names accepted for it (case-insensitive)
+HEADER_MAPPING = {
+    "ticker": ["ticker", "symbol", "security", "stock"],
+    "shares": ["shares", "quantity", "units", "amount"],
+    "price": ["price", "cost", "unit price", "price per share"],
+    "transaction_type": ["transaction type", "type", "action", "activity"],
+    "date": ["date", "trade date", "transaction date"]
+}
+
+# Candidate date formats, in order of preference when a sample is ambiguous
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%d-%m-%Y", "%m-%d-%Y", "%d-%m-%y"]
+
+# Headers searched for a ticker when the file has no ticker column (e.g. "Symbol / Description")
+TICKER_FALLBACK_KEYWORDS = ["symbol", "description", "security"]
+TICKER_PATTERN = re.compile(r'\b[A-Z]{1,5}\b')
+
+SAMPLE_ROWS = 200
+
+
+def decode_lines(binary_stream, encoding="utf-8-sig"):
+    """Decode an uploaded file line by line instead of reading it into memory (a BOM is dropped)."""
+    return codecs.iterdecode(binary_stream, encoding)
+
+
+def detect_profile(headers):
+    """Identify the brokerage export format from its header row."""
+    header_line = ",".join(headers)
+    if "CurrencyCode_Group_Account" in header_line and "Symbol" in headers:
+        return "questrade"
+    if "Activity Type" in header_line and any("Symbol" in h for h in headers):
+        return "wealthsimple"
+    return "generic"
+
+
+def build_column_plan(headers, profile):
+    """
+    Resolve, once per file, which column feeds each standardized field.
+
+    Returns:
+        dict: {"fields": [(target_field, column_index)], "ticker_fallback": [column_index]}
+    """
+    field_map = {}
+    for target_field, possible_names in HEADER_MAPPING.items():
+        for header in headers:
+            if header.lower() in possible_names:
+                field_map[header] = target_field
+                break
+
+    if profile == "questrade":
+        field_map["Action"] = "transaction_type"
+        field_map["Trade Date"] = "date"
+
+    positions = {header: i for i, header in enumerate(headers)}
+    fields = [(target, positions[header]) for header, target in field_map.items() if header in positions]
+    fallback = []
+    if not any(target == "ticker" for target, _ in fields):
+        fallback = [i for i, header in enumerate(headers)
+                    if any(keyword in header.lower() for keyword in TICKER_FALLBACK_KEYWORDS)]
+    return {"fields": fields, "ticker_fallback": fallback}
+
+
+def infer_date_format(values):
+    """
+    Pick the format that parses the most sampled dates (earlier formats win ties),
+    so a file is parsed with one strptime call per row. Ambiguous dates such as
+    03/04/2024 are resolved by the rest of the sample (a 25/04/2024 rules out %m/%d/%Y).
+    """
+    values = [v.strip() for v in values if v and v.strip()]
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = 0
+        for value in values:
+            try:
+                datetime.strptime(value, fmt)
+                count += 1
+            except ValueError:
+                pass
+        if count > best_count:
+            best, best_count = fmt, count
+    return best
+
+
+def _parse_date(value, date_format):
+    if date_format:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    # Row does not match the file's format: try every format, as before inference
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return value
+
+
+def _positive_number(value):
+    try:
+        return abs(float(value))
+    except (ValueError, TypeError):
+        return 0
+
+
+def iter_csv_transactions(lines, sample_size=SAMPLE_ROWS):
+    """
+    Stream transactions out of a CSV export.
+
+    The brokerage profile, column plan and date format are worked out once from
+    the header and the first `sample_size` rows; every row is then mapped with
+    the precompiled plan. Rows without a ticker or with non-positive shares or
+    price are skipped.
+
+    Args:
+        lines (iterable): Text lines (e.g. decode_lines(file.stream))
+        sample_size (int): Rows buffered for date-format inference
+
+    Yields:
+        dict: ticker, transaction_type ("buy"/"sell") and, when present, shares, price and date
+    """
+    reader = csv.reader(lines)
+    headers = next(reader, None)
+    if not headers:
+        return
+    profile = detect_profile(headers)
+    plan = build_column_plan(headers, profile)
+    fields = plan["fields"]
+    fallback = plan["ticker_fallback"]
+
+    sample = list(islice(reader, sample_size))
+    date_columns = [i for target, i in fields if target == "date"]
+    date_format = infer_date_format(row[date_columns[0]] for row in sample if len(row) > date_columns[0]) \
+        if date_columns else None
+
+    for row in chain(sample, reader):
+        width = len(row)
+        transaction_data = {target: row[i] for target, i in fields if i < width}
+
+        if "ticker" not in transaction_data:
+            for i in fallback:
+                if i < width:
+                    ticker_match = TICKER_PATTERN.search(row[i])
+                    if ticker_match:
+                        transaction_data["ticker"] = ticker_match.group(0)
+                        break
+
+        if "transaction_type" in transaction_data:
+            tx_type = transaction_data["transaction_type"].lower()
+            transaction_data["transaction_type"] = "buy" if ("buy" in tx_type or "purchase" in tx_type) else "sell"
+        else:
+            transaction_data["transaction_type"] = "buy"
+
+        if "date" in transaction_data:
+            transaction_data["date"] = _parse_date(transaction_data["date"], date_format)
+        if "shares" in transaction_data:
+            transaction_data["shares"] = _positive_number(transaction_data["shares"])
+        if "price" in transaction_data:
+            transaction_data["price"] = _positive_number(transaction_data["price"])
+
+        if (transaction_data.get("ticker") and
+                transaction_data.get("shares", 0) > 0 and
+                transaction_data.get("price", 0) > 0):
+            yield transaction_data
+
+
+def to_transaction_row(transaction):
+    """
+    Validate a parsed transaction and shape it for bulk_insert_transactions.
+
+    Returns:
+        tuple: (row, error) - row is None and error describes the problem when invalid
+    """
+    # Normalize ticker.
+    ticker = transaction.get("ticker", "").strip().upper()
+
+    try:
+        shares = float(transaction.get("shares", 0))
+        price = float(transaction.get("price", 0))
+    except ValueError as e:
+        return None, f"Invalid numeric values in transaction: {transaction}. Error: {str(e)}"
+
+    transaction_type = transaction.get("transaction_type", "buy").strip().lower()
+
+    # Process the date if provided. We'll use it to override created_at.
+    transaction_date = transaction.get("date")
+    created_at_val = None
+    if transaction_date:
+        # If the date is already a date/datetime object, combine with midnight if needed.
+        if isinstance(transaction_date, datetime):
+            created_at_val = transaction_date
+        elif hasattr(transaction_date, "year"):
+            created_at_val = datetime.combine(transaction_date, datetime.min.time())
+        else:
+            # Otherwise, try parsing from string (assumes formats like YYYY-MM-DD).
+            try:
+                created_at_val = datetime.strptime(transaction_date, "%Y-%m-%d")
+            except Exception:
+                # If parsing fails, leave created_at_val as None (default will be used).
+                pass
+
+    if not ticker or shares <= 0 or price <= 0:
+        return None, f"Invalid data in transaction: {transaction}"
+
+    return {
+        "ticker": ticker,
+        "shares": shares,
+        "price": price,
+        "transaction_type": transaction_type,
+        "created_at": created_at_val
+    }, None
+
+
+class RowFingerprinter:
+    """
+    Adds a content fingerprint (ticker, date, shares, price, type) to upload rows.
+    The nth identical row in a file gets its own fingerprint, so repeated fills
+    within one export are kept while re-uploads of the same rows are recognised.
+
+    A row without a date is stamped with the insert time, so uploading it again
+    later is a new trade. It is only fingerprinted within `scope` (an import
+    job, so a resumed job skips the rows it already inserted); without a scope
+    its fingerprint is None and it is always inserted.
+    """
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.seen = Counter()
+
+    def __call__(self, row):
+        if row["created_at"]:
+            day = row["created_at"].date().isoformat()
+        elif self.scope is not None:
+            day = f"undated:{self.scope}"
+        else:
+            row["fingerprint"] = None
+            return row
+        content = f'{row["ticker"]}|{day}|{row["shares"]:.6f}|{row["price"]:.6f}|{row["transaction_type"]}'
+        occurrence = self.seen[content]
+        self.seen[content] += 1
+        row["fingerprint"] = hashlib.sha1(f"{content}|{occurrence}".encode()).hexdigest()
+        return row
@@ -0,0 +1,40 @@
+# gunicorn.conf.py
+import os
+import time
+
+bind = "0.0.0.0:5000"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+timeout = 120
+
+# Import the app once in the master and fork the workers from it, so boot cost
+# is paid once and unchanged pages are shared copy-on-write between workers.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Also import the lazily loaded provider libraries in the master before forking
+# (more shared memory, slower master boot). Off by default.
+warm_providers = os.getenv("GUNICORN_WARM_PROVIDERS", "false").lower() == "true"
+
+
+def when_ready(server):
+    if preload_app and warm_providers:
+        import helpers
+        import routes
+        from lazy import warm
+        start = time.perf_counter()
+        warm(helpers.pd, helpers.yf, helpers.finviz_quote, helpers.finviz_screener, routes.openai, routes.finviz_news)
+        server.log.info(f"Warmed provider libraries in {time.perf_counter() - start:.2f}s")
+
+
+def post_fork(server, worker):
+    # Sockets opened in the master (DB pool, Firebase HTTP session) must not be
+    # shared across processes.
+    if server.cfg.preload_app:
+        from app import app, reset_after_fork
+        reset_after_fork(app)
+    worker.booted_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    from startup import rss_mb
+    boot_ms = (time.perf_counter() - worker.booted_at) * 1000
+    worker.log.info(f"Worker {worker.pid} ready in {boot_ms:.0f}ms after fork, rss={rss_mb()}MB")
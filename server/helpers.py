@@ -1,20 +1,41 @@
 # helpers.py
-import pandas as pd
 import json
-import csv
-import re
-import openai
 import time
 import os
 import requests
-import yfinance as yf
+import zlib
+import base64
+import binascii
+import hashlib
+import uuid
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
-from finvizfinance.quote import finvizfinance
-from finvizfinance.screener.ticker import Ticker
-from finvizfinance.calendar import Calendar
-from models import db, User, Watchlist, Portfolio, Transaction, PortfolioHolding, UserThread
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import db, User, Watchlist, Portfolio, Transaction, PortfolioHolding, UserThread, DailyPrice, PriceCoverage, PortfolioValuation, ApiCacheEntry
 from datetime import datetime, timedelta
+from cache import TTLCache
+from config import Config
+from valuation import ledger_frame, daily_snapshots, holdings_matrix
+from ratelimit import acquire
+from lazy import lazy_import
+import http_client
+
+# Provider libraries are imported on first use (see lazy.py)
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
+openai = lazy_import("openai")
+finviz_quote = lazy_import("finvizfinance.quote", on_load=http_client.route_finviz)
+finviz_screener = lazy_import("finvizfinance.screener.overview", on_load=http_client.route_finviz)
+
+# One finviz quote-page scrape per ticker per TTL window, shared by the price,
+# sector and fundamentals helpers below.
+fundamentals_cache = TTLCache(maxsize=Config.QUOTE_CACHE_MAXSIZE, ttl=Config.QUOTE_CACHE_TTL)
+
+# Per-ticker screener rows (price, change, sector, market cap) from batched screener queries.
+quotes_cache = TTLCache(maxsize=Config.QUOTE_CACHE_MAXSIZE, ttl=Config.QUOTE_CACHE_TTL)
 
 def convert_data(data):
     """Convert a pandas DataFrame to a dictionary if needed."""
@@ -31,113 +52,30 @@ def safe_convert(value):
         return str(value)
 
 
-def parse_csv_with_mapping(stream):
-    """Parse CSV data using flexible header mapping"""
-    header_mapping = {
-        "ticker": ["ticker", "symbol", "security", "stock"],
-        "shares": ["shares", "quantity", "units", "amount"],
-        "price": ["price", "cost", "unit price", "price per share"],
-        "transaction_type": ["transaction type", "type", "action", "activity"],
-        "date": ["date", "trade date", "transaction date"]
+def _scrape_fundamentals(ticker):
+    acquire("finviz")
+    stock = finviz_quote.finvizfinance(ticker)
+    fundamentals_data = convert_data(stock.ticker_fundament())
+    if isinstance(fundamentals_data, list) and len(fundamentals_data) > 0:
+        fundamentals_data = fundamentals_data[0]
+    return {
+        "fundamentals": fundamentals_data or {},
+        "description": convert_data(stock.ticker_description())
     }
 
-    stream.seek(0)
-
-    # Read the first line to get headers
-    header_line = stream.readline().strip()
-    stream.seek(0)
-    csv_reader = csv.DictReader(stream)
-
-    # Create a mapping from actual CSV headers to our standardized field names
-    field_map = {}
-    for target_field, possible_names in header_mapping.items():
-        for header in csv_reader.fieldnames:
-            if any(possible_name.lower() == header.lower() for possible_name in possible_names):
-                field_map[header] = target_field
-                break
-
-    # Special case handling for brokerages with unique formats
-    if "CurrencyCode_Group_Account" in header_line and "Symbol" in field_map:
-        # Questrade format detected
-        field_map["Action"] = "transaction_type"
-        field_map["Trade Date"] = "date"
-
-    elif "Activity Type" in header_line and any("Symbol" in h for h in csv_reader.fieldnames):
-        # Wealthsimple format detected
-        # May need special handling for symbol extraction
-        pass
-
-    # Process rows with the field mapping
-    transactions = []
-    for row in csv_reader:
-        transaction_data = {}
-
-        # Map fields using our field_map
-        for csv_field, target_field in field_map.items():
-            if csv_field in row:
-                transaction_data[target_field] = row[csv_field]
-
-        # Special case: Extract ticker from "Symbol / Description" type fields
-        if "ticker" not in transaction_data:
-            for field in row.keys():
-                if any(keyword in field.lower() for keyword in ["symbol", "description", "security"]):
-                    # Try to extract ticker pattern (usually 1-5 uppercase letters)
-                    symbol_desc = row[field]
-                    ticker_match = re.search(r'\b[A-Z]{1,5}\b', symbol_desc)
-                    if ticker_match:
-                        transaction_data["ticker"] = ticker_match.group(0)
-                        break
-
-        # Process transaction type
-        if "transaction_type" in transaction_data:
-            tx_type = transaction_data["transaction_type"].lower()
-            transaction_data["transaction_type"] = "buy" if any(
-                word in tx_type for word in ["buy", "purchase"]) else "sell"
-        else:
-            # Default to buy if not specified
-            transaction_data["transaction_type"] = "buy"
-
-        # Process date
-        if "date" in transaction_data:
-            date_str = transaction_data["date"]
-            # Try different date formats
-            date_formats = ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%d-%m-%Y", "%m-%d-%Y", "%d-%m-%y"]
-            for fmt in date_formats:
-                try:
-                    transaction_data["date"] = datetime.strptime(date_str, fmt).date()
-                    break
-                except ValueError:
-                    continue
-
-        # Process shares and price (ensure they're positive numbers)
-        if "shares" in transaction_data:
-            try:
-                transaction_data["shares"] = abs(float(transaction_data["shares"]))
-            except (ValueError, TypeError):
-                transaction_data["shares"] = 0
-
-        if "price" in transaction_data:
-            try:
-                transaction_data["price"] = abs(float(transaction_data["price"]))
-            except (ValueError, TypeError):
-                transaction_data["price"] = 0
-
-        # Validate and add the transaction
-        if (transaction_data.get("ticker") and
-                transaction_data.get("shares", 0) > 0 and
-                transaction_data.get("price", 0) > 0):
-            transactions.append(transaction_data)
-
-    return transactions
+def fetch_fundamentals(ticker):
+    """
+    Return the raw finviz fundamentals and description for a ticker, scraping
+    the quote page only when the cached copy is missing or stale.
+    """
+    ticker = ticker.upper()
+    return fundamentals_cache.get_or_load(ticker, lambda: _scrape_fundamentals(ticker))
 
 def fetch_stock_data(ticker):
     ticker = ticker.upper()
-    stock = finvizfinance(ticker)
-    stock_fundament = convert_data(stock.ticker_fundament())
-    stock_description = convert_data(stock.ticker_description())
-    fundamentals_data = convert_data(stock.ticker_fundament())
-    if isinstance(fundamentals_data, list) and len(fundamentals_data) > 0:
-        fundamentals_data = fundamentals_data[0]
+    quote = fetch_fundamentals(ticker)
+    stock_description = quote["description"]
+    fundamentals_data = quote["fundamentals"]
     filtered_fundamentals = {
         "current_price": fundamentals_data.get("Price"),
         "pe_ratio": fundamentals_data.get("P/E"),
@@ -173,8 +111,10 @@ def fetch_stock_data(ticker):
 def fetch_market_price(ticker):
     try:
         ticker = ticker.upper()
-        stock = finvizfinance(ticker)
-        fundamentals_data = stock.ticker_fundament()
+        quote = quotes_cache.get(ticker)
+        if quote is not None and quote.get("market_price") is not None:
+            return {"ticker": ticker, "market_price": quote["market_price"]}
+        fundamentals_data = fetch_fundamentals(ticker)["fundamentals"]
         if not fundamentals_data:
             return {"ticker": ticker, "market_price": "N/A", "error": "No data found"}
         market_price = fundamentals_data.get("Price", "N/A")
@@ -183,22 +123,217 @@ def fetch_market_price(ticker):
         print(f"Error fetching market price for {ticker}: {e}")
         return {"ticker": ticker, "market_price": "N/A", "error": str(e)}
 
-def recalc_portfolio(portfolio_id, ticker):
-    transactions = Transaction.query.filter_by(portfolio_id=portfolio_id, ticker=ticker).all()
+def _clean_number(value):
+    """Screener cells come back as floats, None or NaN; make them JSON-safe."""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+def _screen_quotes(tickers):
+    """Fetch one screener query for a list of tickers and key the rows by ticker."""
+    # One screener page holds 20 rows
+    acquire("finviz", tokens=(len(tickers) - 1) // 20 + 1)
+    screener = finviz_screener.Overview()
+    screener.set_filter(ticker=",".join(tickers))
+    df = screener.screener_view(verbose=0, sleep_sec=Config.SCREENER_PAGE_DELAY)
+    if df is None or df.empty:
+        return {}
+    quotes = {}
+    for row in df.to_dict(orient='records'):
+        ticker = str(row.get("Ticker", "")).upper()
+        quotes[ticker] = {
+            "ticker": ticker,
+            "company": row.get("Company"),
+            "sector": row.get("Sector"),
+            "market_price": _clean_number(row.get("Price")),
+            "change": _clean_number(row.get("Change")),
+            "market_cap": _clean_number(row.get("Market Cap"))
+        }
+    return quotes
+
+def fetch_market_prices(tickers):
+    """
+    Price many tickers at once from the finviz screener instead of scraping one
+    quote page per symbol.
+
+    Args:
+        tickers (iterable): Ticker symbols (case-insensitive, duplicates ignored)
+
+    Returns:
+        dict: Map of ticker to {"ticker", "company", "sector", "market_price",
+              "change", "market_cap"}, or {"ticker", "market_price": "N/A", "error"}
+              for symbols the screener could not price
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+    quotes = {}
+    missing = []
+    for ticker in tickers:
+        quote = quotes_cache.get(ticker)
+        if quote is None:
+            missing.append(ticker)
+        else:
+            quotes[ticker] = quote
+
+    batch_size = Config.SCREENER_BATCH_SIZE
+    for i in range(0, len(missing), batch_size):
+        chunk = missing[i:i + batch_size]
+        try:
+            screened = _screen_quotes(chunk)
+        except Exception as e:
+            print(f"Error fetching screener quotes for {', '.join(chunk)}: {e}")
+            for ticker in chunk:
+                quotes[ticker] = {"ticker": ticker, "market_price": "N/A", "error": str(e)}
+            continue
+        for ticker in chunk:
+            quote = screened.get(ticker)
+            if quote is None:
+                quotes[ticker] = {"ticker": ticker, "market_price": "N/A", "error": "No data found"}
+            else:
+                quotes_cache.set(ticker, quote)
+                quotes[ticker] = quote
+
+    return quotes
+
+def parallel_map(func, items, max_workers=8, item_timeout=None, total_timeout=None):
+    """
+    Run func over items on a bounded thread pool and return one (result, error)
+    pair per item, in input order.
+
+    Each item gets item_timeout seconds from the moment it starts running, and
+    the whole call gives up after total_timeout seconds. Items that miss their
+    deadline are reported with a TimeoutError and left to finish in the
+    background; their results are discarded.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    started = {}
+
+    def run(index, item):
+        started[index] = time.monotonic()
+        return func(item)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    futures = {executor.submit(run, i, item): i for i, item in enumerate(items)}
+    outcomes = [None] * len(items)
+    pending = set(futures)
+    total_deadline = time.monotonic() + total_timeout if total_timeout else None
+
+    try:
+        while pending:
+            now = time.monotonic()
+            deadlines = [total_deadline] if total_deadline else []
+            if item_timeout:
+                deadlines += [started[futures[f]] + item_timeout for f in pending if futures[f] in started]
+            timeout = max(0, min(deadlines) - now) if deadlines else None
+
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    outcomes[futures[future]] = (future.result(), None)
+                except Exception as e:
+                    outcomes[futures[future]] = (None, e)
+
+            now = time.monotonic()
+            expired = set()
+            for future in pending:
+                index = futures[future]
+                if total_deadline and now >= total_deadline:
+                    expired.add(future)
+                elif item_timeout and index in started and now >= started[index] + item_timeout:
+                    expired.add(future)
+            for future in expired:
+                future.cancel()
+                outcomes[futures[future]] = (None, TimeoutError("Timed out"))
+            pending -= expired
+    finally:
+        executor.shutdown(wait=False)
+
+    return outcomes
+
+def encode_transaction_cursor(created_at, transaction_id):
+    """Opaque pagination cursor for the (created_at, id) keyset of a transaction."""
+    raw = f"{created_at.isoformat()}|{transaction_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_transaction_cursor(cursor):
+    """Inverse of encode_transaction_cursor; raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, transaction_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), transaction_id
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def ledger_version(portfolio_id):
+    """Current ledger_version of a portfolio (None if it does not exist)."""
+    return db.session.query(Portfolio.ledger_version).filter(Portfolio.id == portfolio_id).scalar()
+
+def load_ledger(portfolio_id):
+    """
+    Return a portfolio's transactions as plain
+    (ticker, created_at, shares, price, transaction_type) tuples sorted by date,
+    without loading full ORM objects.
+    """
+    return db.session.query(
+        Transaction.ticker,
+        Transaction.created_at,
+        Transaction.shares,
+        Transaction.price,
+        Transaction.transaction_type
+    ).filter(Transaction.portfolio_id == portfolio_id).order_by(Transaction.created_at).all()
+
+def iter_replay(transactions):
+    """
+    Replay (shares, price, transaction_type) rows in date order with the
+    average-cost rules: sells reduce cost at the running average and sells of
+    more shares than are held are ignored.
+
+    Yields:
+        tuple: (shares, total_cost) held after each transaction
+    """
     total_shares = 0
     total_cost = 0.0
-    for txn in transactions:
-        txn_shares = float(txn.shares)
-        txn_price = float(txn.price)
-        if txn.transaction_type.lower() == 'buy':
+    for shares, price, transaction_type in transactions:
+        txn_shares = float(shares)
+        txn_price = float(price)
+        if transaction_type.lower() == 'buy':
             total_shares += txn_shares
             total_cost += txn_shares * txn_price
-        elif txn.transaction_type.lower() == 'sell' and total_shares >= txn_shares:
+        elif transaction_type.lower() == 'sell' and total_shares >= txn_shares:
             avg_cost_per_share = total_cost / total_shares if total_shares > 0 else 0
             total_shares -= txn_shares
             total_cost -= txn_shares * avg_cost_per_share
+        yield total_shares, total_cost
+
+def holding_values(total_shares, total_cost):
+    """(shares, average_cost, book_value) of a replayed position."""
     new_book_value = max(0, total_cost)
     new_avg_cost = (new_book_value / total_shares) if total_shares > 0 else 0
+    return total_shares, new_avg_cost, new_book_value
+
+def replay_holding(transactions):
+    """
+    Replay a ticker's ledger (see iter_replay) to its current position.
+
+    Returns:
+        tuple: (shares, average_cost, book_value)
+    """
+    state = (0, 0.0)
+    for state in iter_replay(transactions):
+        pass
+    return holding_values(*state)
+
+def recalc_portfolio(portfolio_id, ticker, commit=True):
+    """
+    Rebuild one holding by replaying the ticker's full ledger. Only needed when
+    history changes (deletes, back-dated inserts); new trades go through apply_transaction.
+    """
+    transactions = db.session.query(Transaction.shares, Transaction.price, Transaction.transaction_type) \
+        .filter_by(portfolio_id=portfolio_id, ticker=ticker) \
+        .order_by(Transaction.created_at).all()
+    total_shares, new_avg_cost, new_book_value = replay_holding(transactions)
     portfolio_entry = PortfolioHolding.query.filter_by(portfolio_id=portfolio_id, ticker=ticker).first()
     if portfolio_entry:
         if total_shares > 0:
@@ -217,13 +352,204 @@ def recalc_portfolio(portfolio_id, ticker):
                 book_value=new_book_value
             )
             db.session.add(new_portfolio_entry)
-    db.session.commit()
+    if commit:
+        db.session.commit()
+
+def _stored_amount(value):
+    """Round a share count or price the way a Numeric(12,2) column stores it."""
+    return float(Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+def apply_transaction(txn):
+    """
+    Apply a newly added transaction to its holding with a single atomic statement
+    instead of replaying the ledger. Runs in the caller's database transaction;
+    the caller commits once for both the insert and the holding update.
+
+    Average cost depends on trade order, so a back-dated transaction (one with
+    later trades already recorded for the ticker) falls back to a full replay.
+
+    Args:
+        txn (Transaction): Transaction already added to the session
+
+    Returns:
+        bool: True if applied incrementally, False if the holding was replayed
+    """
+    when = txn.created_at or db.func.current_timestamp()
+    later = db.session.query(Transaction.id).filter(
+        Transaction.portfolio_id == txn.portfolio_id,
+        Transaction.ticker == txn.ticker,
+        Transaction.created_at > when
+    ).first()
+    if later is not None:
+        recalc_portfolio(txn.portfolio_id, txn.ticker, commit=False)
+        return False
+
+    holdings = PortfolioHolding.__table__
+    # Use the values as stored (Numeric(12,2)), which is what the replay sees
+    shares = _stored_amount(txn.shares)
+    price = _stored_amount(txn.price)
+    now = datetime.utcnow()
+    kind = txn.transaction_type.lower()
+    if kind == 'buy':
+        stmt = pg_insert(holdings).values(
+            id=str(uuid.uuid4()), portfolio_id=txn.portfolio_id, ticker=txn.ticker,
+            shares=shares, average_cost=price, book_value=shares * price,
+            created_at=now, updated_at=now
+        )
+        new_shares = holdings.c.shares + stmt.excluded.shares
+        new_book = holdings.c.book_value + stmt.excluded.book_value
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['portfolio_id', 'ticker'],
+            set_={
+                "shares": new_shares,
+                "book_value": new_book,
+                "average_cost": new_book / db.func.nullif(new_shares, 0),
+                "updated_at": now
+            }
+        )
+        db.session.execute(stmt)
+    elif kind == 'sell':
+        # Oversells are ignored by the replay rules, hence the shares >= guard
+        match = (holdings.c.portfolio_id == txn.portfolio_id) & (holdings.c.ticker == txn.ticker)
+        remaining = holdings.c.shares - shares
+        db.session.execute(
+            holdings.update()
+            .where(match & (holdings.c.shares >= shares))
+            .values(shares=remaining,
+                    book_value=db.func.greatest(holdings.c.book_value * remaining / db.func.nullif(holdings.c.shares, 0), 0),
+                    updated_at=now)
+        )
+        db.session.execute(holdings.delete().where(match & (holdings.c.shares <= 0)))
+    return True
+
+def check_holdings(portfolio_id=None, fix=False, tolerance=0.01):
+    """
+    Compare stored holdings against a full ledger replay.
+
+    Args:
+        portfolio_id (str): Only check this portfolio (default: all)
+        fix (bool): Rewrite mismatched holdings from the replay
+        tolerance (float): Allowed difference (holdings are stored to 2 decimals)
+
+    Returns:
+        list: One dict per mismatch with portfolio_id, ticker, stored and replayed (shares, book_value)
+    """
+    txn_query = db.session.query(Transaction.portfolio_id, Transaction.ticker, Transaction.shares,
+                                 Transaction.price, Transaction.transaction_type)
+    holding_query = db.session.query(PortfolioHolding.portfolio_id, PortfolioHolding.ticker,
+                                     PortfolioHolding.shares, PortfolioHolding.book_value)
+    if portfolio_id:
+        txn_query = txn_query.filter(Transaction.portfolio_id == portfolio_id)
+        holding_query = holding_query.filter(PortfolioHolding.portfolio_id == portfolio_id)
+
+    ledgers = defaultdict(list)
+    for pid, ticker, shares, price, transaction_type in txn_query.order_by(Transaction.created_at):
+        ledgers[(pid, ticker)].append((shares, price, transaction_type))
+    stored = {(pid, ticker): (float(shares), float(book)) for pid, ticker, shares, book in holding_query}
+
+    mismatches = []
+    for key in sorted(set(ledgers) | set(stored)):
+        shares, _, book = replay_holding(ledgers.get(key, []))
+        replayed = (round(shares, 2), round(book, 2)) if shares > 0 else None
+        current = stored.get(key)
+        if replayed is None and current is None:
+            continue
+        if replayed is None or current is None or \
+                abs(current[0] - replayed[0]) > tolerance or abs(current[1] - replayed[1]) > tolerance:
+            mismatches.append({"portfolio_id": key[0], "ticker": key[1], "stored": current, "replayed": replayed})
+
+    if fix and mismatches:
+        for m in mismatches:
+            recalc_portfolio(m["portfolio_id"], m["ticker"], commit=False)
+        db.session.commit()
+    return mismatches
+
+def bulk_insert_transactions(portfolio_id, rows, chunk_size=1000):
+    """
+    Insert many transactions with multi-row INSERTs (no commit). Rows whose
+    fingerprint is already stored for the portfolio are skipped by the unique
+    index (ON CONFLICT DO NOTHING), so re-importing overlapping files is cheap.
+
+    Args:
+        portfolio_id (str): Portfolio the rows belong to
+        rows (list): Dicts with ticker, shares, price, transaction_type,
+                     created_at (None uses the database clock, like the column
+                     default) and optionally fingerprint
+        chunk_size (int): Rows per INSERT statement
+
+    Returns:
+        list: (ticker, created_at) of the rows actually inserted
+    """
+    values = [{
+        "id": str(uuid.uuid4()),
+        "portfolio_id": portfolio_id,
+        "ticker": row["ticker"],
+        "shares": row["shares"],
+        "price": row["price"],
+        "transaction_type": row["transaction_type"],
+        "created_at": row["created_at"] or db.func.current_timestamp(),
+        "fingerprint": row.get("fingerprint")
+    } for row in rows]
+    transactions = Transaction.__table__
+    inserted = []
+    for i in range(0, len(values), chunk_size):
+        stmt = pg_insert(transactions).values(values[i:i + chunk_size])
+        stmt = stmt.on_conflict_do_nothing(index_elements=['portfolio_id', 'fingerprint'])
+        inserted.extend(db.session.execute(stmt.returning(transactions.c.ticker, transactions.c.created_at)).all())
+    return inserted
+
+def rebuild_holdings(portfolio_id, tickers, chunk_size=1000):
+    """
+    Recompute the holdings for several tickers in one grouped pass (no commit):
+    one ledger query, an in-memory replay per ticker, one upsert for open
+    positions and one delete for closed ones.
+    """
+    tickers = sorted(set(tickers))
+    if not tickers:
+        return
+    ledgers = defaultdict(list)
+    rows = db.session.query(Transaction.ticker, Transaction.shares, Transaction.price, Transaction.transaction_type) \
+        .filter(Transaction.portfolio_id == portfolio_id, Transaction.ticker.in_(tickers)) \
+        .order_by(Transaction.created_at)
+    for ticker, shares, price, transaction_type in rows:
+        ledgers[ticker].append((shares, price, transaction_type))
+
+    now = datetime.utcnow()
+    open_positions = []
+    closed = []
+    for ticker in tickers:
+        shares, avg_cost, book_value = replay_holding(ledgers.get(ticker, []))
+        if shares > 0:
+            open_positions.append({
+                "id": str(uuid.uuid4()), "portfolio_id": portfolio_id, "ticker": ticker,
+                "shares": shares, "average_cost": avg_cost, "book_value": book_value,
+                "created_at": now, "updated_at": now
+            })
+        else:
+            closed.append(ticker)
+
+    holdings = PortfolioHolding.__table__
+    for i in range(0, len(open_positions), chunk_size):
+        stmt = pg_insert(holdings).values(open_positions[i:i + chunk_size])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['portfolio_id', 'ticker'],
+            set_={
+                "shares": stmt.excluded.shares,
+                "average_cost": stmt.excluded.average_cost,
+                "book_value": stmt.excluded.book_value,
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        db.session.execute(stmt)
+    if closed:
+        db.session.execute(holdings.delete().where(
+            (holdings.c.portfolio_id == portfolio_id) & holdings.c.ticker.in_(closed)
+        ))
 
 def fetch_stock_sector(ticker):
     ticker = ticker.upper()
     try:
-        stock = finvizfinance(ticker)
-        fundamentals_data = stock.ticker_fundament()
+        fundamentals_data = fetch_fundamentals(ticker)["fundamentals"]
 
         # Check if data exists and sector is present
         sector = fundamentals_data.get("Sector")
@@ -301,7 +627,7 @@ def fetch_historical_price(ticker, date_str):
         end_date = (date + timedelta(days=1)).strftime("%Y-%m-%d")  # Add one day to include the target date
 
         # Fetch data from Yahoo Finance
-        data = yf.download(ticker, start=start_date, end=end_date, progress=False)
+        data = yf.download(ticker, start=start_date, end=end_date, progress=False, session=http_client.library_session())
 
         if data.empty:
             print(f"No data returned from yfinance for {ticker} around {date_str}")
@@ -325,9 +651,166 @@ def fetch_historical_price(ticker, date_str):
         return None
 
 
+def _download_close_matrix(tickers, start_date, end_date):
+    """
+    Download daily closes for many tickers over [start_date, end_date] in one
+    yf.download call. Returns a DataFrame indexed by date with one column per ticker.
+    """
+    data = yf.download(
+        tickers,
+        start=start_date.isoformat(),
+        end=(end_date + timedelta(days=1)).isoformat(),
+        group_by='column',
+        threads=min(len(tickers), Config.PRICE_DOWNLOAD_THREADS),
+        progress=False,
+        session=http_client.library_session()
+    )
+    if data.empty:
+        return pd.DataFrame()
+    closes = data['Close']
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(tickers[0])
+    elif len(tickers) == 1 and tickers[0] not in closes.columns:
+        closes = closes.iloc[:, :1]
+        closes.columns = [tickers[0]]
+    closes.index = pd.to_datetime(closes.index).date
+    return closes[(closes.index >= start_date) & (closes.index <= end_date)]
+
+def store_daily_closes(ticker, closes, chunk_size=1000):
+    """Bulk upsert {date: close} rows for a ticker into daily_prices (no commit)."""
+    rows = [{"ticker": ticker, "date": day, "close": close} for day, close in closes.items()]
+    for i in range(0, len(rows), chunk_size):
+        stmt = pg_insert(DailyPrice.__table__).values(rows[i:i + chunk_size])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['ticker', 'date'],
+            set_={"close": stmt.excluded.close}
+        )
+        db.session.execute(stmt)
+
+def record_price_coverage(ticker, start_date, end_date):
+    """Widen the stored coverage window for a ticker to include [start_date, end_date] (no commit)."""
+    coverage = PriceCoverage.__table__
+    stmt = pg_insert(coverage).values(
+        ticker=ticker, start_date=start_date, end_date=end_date, updated_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['ticker'],
+        set_={
+            "start_date": db.func.least(coverage.c.start_date, stmt.excluded.start_date),
+            "end_date": db.func.greatest(coverage.c.end_date, stmt.excluded.end_date),
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    db.session.execute(stmt)
+
+def _uncovered_ranges(coverage, start_date, end_date):
+    """
+    Return the (start, end) ranges to download so that a PriceCoverage row,
+    widened to include [start_date, end_date], is fully fetched. Coverage is one
+    contiguous window, so a request that starts after it (or ends before it)
+    also fills the days between the window and the request.
+    """
+    if coverage is None:
+        return [(start_date, end_date)]
+    gaps = []
+    if start_date < coverage.start_date:
+        gaps.append((start_date, coverage.start_date - timedelta(days=1)))
+    if end_date > coverage.end_date:
+        gaps.append((coverage.end_date + timedelta(days=1), end_date))
+    return gaps
+
+def _chunk_coverage(closes, chunk, gap_start, gap_end, end_date):
+    """
+    Range of a downloaded gap that each ticker of the chunk can be marked as covered for.
+
+    A ticker without bars gets None, so the gap is downloaded again next time.
+    When the gap runs up to the requested end, coverage stops at the ticker's
+    newest bar: the days after it may simply not have been published yet.
+    An empty `closes` means the market was closed for the whole gap.
+
+    Returns:
+        dict: ticker -> (start, end) or None
+    """
+    if closes.empty:
+        return {ticker: (gap_start, gap_end) for ticker in chunk}
+    coverage = {}
+    for ticker in chunk:
+        series = closes[ticker].dropna() if ticker in closes.columns else pd.Series(dtype=float)
+        if series.empty:
+            coverage[ticker] = None
+        elif gap_end == end_date:
+            coverage[ticker] = (gap_start, max(series.index))
+        else:
+            coverage[ticker] = (gap_start, gap_end)
+    return coverage
+
+def ensure_price_history(tickers, start_date, end_date):
+    """
+    Make sure daily_prices holds every closed trading day in [start_date, end_date]
+    for each ticker, downloading only the ranges not fetched before.
+
+    Tickers missing the same range are downloaded together with one yf.download
+    call per chunk of PRICE_DOWNLOAD_CHUNK_SIZE tickers. Today's bar is never
+    stored because it is not final until the close. Coverage is only recorded
+    for ranges that actually returned bars (see _chunk_coverage), so a failed
+    download is retried instead of leaving a hole.
+    """
+    end_date = min(end_date, datetime.now().date() - timedelta(days=1))
+    tickers = list(dict.fromkeys(tickers))
+    if start_date > end_date or not tickers:
+        return
+
+    coverage = {c.ticker: c for c in PriceCoverage.query.filter(PriceCoverage.ticker.in_(tickers)).all()}
+    plan = defaultdict(list)  # (gap_start, gap_end) -> tickers missing that range
+    for ticker in tickers:
+        for gap in _uncovered_ranges(coverage.get(ticker), start_date, end_date):
+            plan[gap].append(ticker)
+    if not plan:
+        return
+
+    downloaded = defaultdict(list)  # ticker -> [(start, end)] actually fetched
+    chunk_size = Config.PRICE_DOWNLOAD_CHUNK_SIZE
+    for (gap_start, gap_end), gap_tickers in plan.items():
+        if not len(pd.bdate_range(gap_start, gap_end)):
+            # Weekend only: there is nothing to download
+            for ticker in gap_tickers:
+                downloaded[ticker].append((gap_start, gap_end))
+            continue
+        market_closed = None
+        for i in range(0, len(gap_tickers), chunk_size):
+            chunk = gap_tickers[i:i + chunk_size]
+            closes = _download_close_matrix(chunk, gap_start, gap_end)
+            if closes.empty:
+                # yfinance reports upstream errors as empty data, so a chunk without a
+                # single bar is a failed download unless the benchmark did not trade either
+                if market_closed is None:
+                    market_closed = _download_close_matrix([Config.ANALYTICS_BENCHMARK], gap_start, gap_end).empty
+                if not market_closed:
+                    print(f"No daily closes returned for {len(chunk)} tickers from {gap_start} to {gap_end}; will retry")
+                    continue
+            for ticker, covered in _chunk_coverage(closes, chunk, gap_start, gap_end, end_date).items():
+                series = closes[ticker].dropna() if ticker in closes.columns else pd.Series(dtype=float)
+                store_daily_closes(ticker, {day: float(close) for day, close in series.items()})
+                if covered is not None:
+                    downloaded[ticker].append(covered)
+            print(f"Stored daily closes for {len(chunk)} tickers from {gap_start} to {gap_end}")
+
+    for ticker, ranges in downloaded.items():
+        record_price_coverage(ticker, min(start for start, _ in ranges), max(end for _, end in ranges))
+    db.session.commit()
+
+def read_daily_closes(ticker, start_date, end_date):
+    """Return {YYYY-MM-DD: close} for a ticker from daily_prices."""
+    rows = db.session.query(DailyPrice.date, DailyPrice.close) \
+        .filter(DailyPrice.ticker == ticker, DailyPrice.date >= start_date, DailyPrice.date <= end_date) \
+        .order_by(DailyPrice.date).all()
+    return {day.isoformat(): float(close) for day, close in rows}
+
 def fetch_batch_historical_prices(ticker, start_date, end_date=None):
     """
-    Fetch historical prices for a ticker within a date range using Yahoo Finance.
+    Fetch historical prices for a ticker within a date range. Prices are served
+    from the daily_prices table; only the range not stored yet is downloaded
+    from Yahoo Finance.
 
     Args:
         ticker (str): The stock ticker symbol
@@ -341,45 +824,218 @@ def fetch_batch_historical_prices(ticker, start_date, end_date=None):
         end_date = datetime.now().date().isoformat()
 
     try:
-        # Add a buffer day at the beginning and end to ensure we get the exact dates
         start_date_obj = datetime.strptime(start_date, "%Y-%m-%d").date()
         end_date_obj = datetime.strptime(end_date, "%Y-%m-%d").date()
 
-        adjusted_start = (start_date_obj - timedelta(days=5)).strftime("%Y-%m-%d")
-        adjusted_end = (end_date_obj + timedelta(days=1)).strftime("%Y-%m-%d")
+        ensure_price_history([ticker], start_date_obj, end_date_obj)
+        prices = read_daily_closes(ticker, start_date_obj, end_date_obj)
 
-        # Fetch data from Yahoo Finance
-        data = yf.download(ticker, start=adjusted_start, end=adjusted_end, progress=False)
-
-        if data.empty:
-            print(f"No data returned from yfinance for {ticker} between {start_date} and {end_date}")
-            return {}
-
-        # Convert DataFrame to dictionary mapping dates to closing prices
-        prices = {}
-        for date, row in data.iterrows():
-            date_str = date.strftime("%Y-%m-%d")
-            # Only include dates in our requested range
-            if start_date <= date_str <= end_date:
-                prices[date_str] = float(row['Close'])
-
-        if prices:
-            print(f"Fetched {len(prices)} historical prices for {ticker} from {start_date} to {end_date}")
-            # Print a few sample prices for debugging
-            sample_keys = list(prices.keys())
-            if len(sample_keys) > 3:
-                sample_keys = [sample_keys[0], sample_keys[len(sample_keys) // 2], sample_keys[-1]]
-            for key in sample_keys:
-                print(f"{key}: ${prices[key]:.2f}")
-        else:
+        if not prices:
             print(f"No prices found in the specified range for {ticker}")
-
         return prices
 
     except Exception as e:
+        db.session.rollback()
         print(f"Error fetching batch historical prices for {ticker}: {e}")
         return {}
 
+def fetch_price_matrix(tickers, start_date, end_date=None):
+    """
+    Fetch daily closes for many tickers as an aligned date x ticker matrix.
+
+    Missing history is downloaded in batched yf.download calls (see
+    ensure_price_history); everything else is read from daily_prices in a
+    single query.
+
+    Args:
+        tickers (iterable): Ticker symbols
+        start_date (date): First date of the range
+        end_date (date, optional): Last date of the range. Defaults to today.
+
+    Returns:
+        pandas.DataFrame: Closes indexed by date, one column per ticker
+                          (NaN where a ticker did not trade)
+    """
+    if end_date is None:
+        end_date = datetime.now().date()
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return pd.DataFrame()
+
+    try:
+        ensure_price_history(tickers, start_date, end_date)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error downloading historical prices for {', '.join(tickers)}: {e}")
+
+    rows = db.session.query(DailyPrice.date, DailyPrice.ticker, DailyPrice.close) \
+        .filter(DailyPrice.ticker.in_(tickers), DailyPrice.date >= start_date, DailyPrice.date <= end_date) \
+        .all()
+    if not rows:
+        return pd.DataFrame(columns=tickers, dtype=float)
+    frame = pd.DataFrame(rows, columns=["date", "ticker", "close"])
+    frame["close"] = frame["close"].astype(float)
+    matrix = frame.pivot(index="date", columns="ticker", values="close").sort_index()
+    return matrix.reindex(columns=tickers)
+
+def invalidate_valuations(portfolio_id, since):
+    """
+    Record a ledger change (no commit): drop stored valuations from `since`
+    (date or datetime) onward and bump the portfolio's ledger_version, which
+    retires every cached structure built from the old ledger.
+    """
+    Portfolio.query.filter(Portfolio.id == portfolio_id).update(
+        {Portfolio.ledger_version: Portfolio.ledger_version + 1}, synchronize_session=False)
+    if isinstance(since, datetime):
+        since = since.date()
+    PortfolioValuation.query.filter(
+        PortfolioValuation.portfolio_id == portfolio_id,
+        PortfolioValuation.date >= since
+    ).delete(synchronize_session=False)
+
+def load_valuations(portfolio_id, start_date, end_date):
+    """Return stored {date: market_value} for a portfolio within [start_date, end_date]."""
+    rows = db.session.query(PortfolioValuation.date, PortfolioValuation.market_value) \
+        .filter(PortfolioValuation.portfolio_id == portfolio_id,
+                PortfolioValuation.date >= start_date,
+                PortfolioValuation.date <= end_date).all()
+    return {day: float(value) for day, value in rows}
+
+def _complete_through(coverage_ends, last_closed, grace_days=None):
+    """
+    Last day for which every ticker's closes are stored, from their PriceCoverage
+    end dates. A ticker whose coverage stopped more than grace_days before
+    last_closed is treated as no longer quoted (delisted) and does not hold
+    the others back.
+    """
+    grace_days = Config.SNAPSHOT_PRICE_GRACE_DAYS if grace_days is None else grace_days
+    ends = [end for end in coverage_ends.values() if (last_closed - end).days <= grace_days]
+    return min(ends, default=last_closed)
+
+def snapshot_portfolio_valuations(portfolio_id, rebuild=False):
+    """
+    Materialize end-of-day valuations for every closed day not stored yet, from
+    the first transaction (or the day after the last stored snapshot) through
+    yesterday, or through the last day every held ticker has a close for.
+
+    Returns:
+        int: Number of days written
+    """
+    if rebuild:
+        invalidate_valuations(portfolio_id, datetime.min)
+
+    ledger = ledger_frame(load_ledger(portfolio_id))
+    if ledger.empty:
+        db.session.commit()
+        return 0
+
+    last_closed = datetime.now().date() - timedelta(days=1)
+    last_stored = db.session.query(db.func.max(PortfolioValuation.date)) \
+        .filter(PortfolioValuation.portfolio_id == portfolio_id).scalar()
+    first_day = last_stored + timedelta(days=1) if last_stored else ledger["date"].iloc[0].date()
+    if first_day > last_closed:
+        db.session.commit()
+        return 0
+
+    dates = pd.date_range(first_day, last_closed, freq="D")
+    tickers = sorted(ledger["ticker"].unique())
+    closes = fetch_price_matrix(tickers, first_day - timedelta(days=7), last_closed)
+
+    # Stop before the first day a held ticker's close is still missing, so those
+    # days are valued by a later run instead of stored with a forward-filled price
+    held = holdings_matrix(ledger, dates, tickers)
+    held_tickers = [ticker for ticker in tickers if (held[ticker] > 0).any()]
+    coverage_ends = dict(db.session.query(PriceCoverage.ticker, PriceCoverage.end_date)
+                         .filter(PriceCoverage.ticker.in_(held_tickers)).all())
+    dates = dates[dates <= pd.Timestamp(_complete_through(coverage_ends, last_closed))]
+    if not len(dates):
+        db.session.commit()
+        return 0
+    snapshots = daily_snapshots(ledger, closes, dates)
+
+    rows = [dict(snapshot, portfolio_id=portfolio_id) for snapshot in snapshots]
+    for i in range(0, len(rows), 1000):
+        stmt = pg_insert(PortfolioValuation.__table__).values(rows[i:i + 1000])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['portfolio_id', 'date'],
+            set_={
+                "market_value": stmt.excluded.market_value,
+                "book_value": stmt.excluded.book_value,
+                "breakdown": stmt.excluded.breakdown
+            }
+        )
+        db.session.execute(stmt)
+    db.session.commit()
+    return len(rows)
+
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
+
+# Seconds an Alpha Vantage response stays fresh, by function. Weekly bars only
+# move during the current week and statements change quarterly.
+ALPHA_VANTAGE_FRESHNESS = {
+    "TIME_SERIES_WEEKLY_ADJUSTED": 24 * 3600,
+    "DIGITAL_CURRENCY_DAILY": 6 * 3600,
+    "INCOME_STATEMENT": 7 * 24 * 3600,
+    "BALANCE_SHEET": 7 * 24 * 3600,
+    "CASH_FLOW": 7 * 24 * 3600
+}
+
+def _alpha_vantage_error(data):
+    """Alpha Vantage reports errors and throttling with HTTP 200 and one of these keys."""
+    return isinstance(data, dict) and any(key in data for key in ("Error Message", "Note", "Information"))
+
+def fetch_alpha_vantage(function, symbol, **params):
+    """
+    Fetch an Alpha Vantage response through the persistent api_cache table.
+
+    Fresh entries are served without an upstream call. Error and throttling
+    payloads are never cached; when one comes back, a stale cached copy is
+    served instead if there is one.
+
+    Returns:
+        tuple: (data, etag, max_age) where max_age is the remaining freshness in
+               seconds (0 and etag None for uncached error payloads)
+    """
+    symbol = symbol.upper()
+    key = ":".join([function, symbol] + [f"{k}={v}" for k, v in sorted(params.items())])
+    now = datetime.utcnow()
+
+    entry = db.session.get(ApiCacheEntry, key)
+    if entry is not None and entry.expires_at > now:
+        max_age = int((entry.expires_at - now).total_seconds())
+        return json.loads(zlib.decompress(entry.payload)), entry.etag, max_age
+
+    query = dict(params, function=function, symbol=symbol, apikey=Config.ALPHAVANTAGE_API_KEY)
+    response = http_client.get(ALPHA_VANTAGE_URL, params=query, limiter="alphavantage")
+    response.raise_for_status()
+    data = response.json()
+
+    if _alpha_vantage_error(data):
+        if entry is not None:
+            print(f"Alpha Vantage returned an error for {key}; serving stale cache")
+            return json.loads(zlib.decompress(entry.payload)), entry.etag, 0
+        return data, None, 0
+
+    body = json.dumps(data, separators=(",", ":"), sort_keys=True).encode()
+    etag = hashlib.sha1(body).hexdigest()
+    freshness = ALPHA_VANTAGE_FRESHNESS.get(function, 3600)
+    stmt = pg_insert(ApiCacheEntry.__table__).values(
+        key=key, payload=zlib.compress(body), etag=etag,
+        fetched_at=now, expires_at=now + timedelta(seconds=freshness)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['key'],
+        set_={
+            "payload": stmt.excluded.payload,
+            "etag": stmt.excluded.etag,
+            "fetched_at": stmt.excluded.fetched_at,
+            "expires_at": stmt.excluded.expires_at
+        }
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+    return data, etag, freshness
+
 def fetch_market_benchmarks():
     """Fetch performance data for major market indices"""
     try:
@@ -392,7 +1048,7 @@ def fetch_market_benchmarks():
 
         result = {}
         for name, ticker in benchmarks.items():
-            data = yf.Ticker(ticker)
+            data = yf.Ticker(ticker, session=http_client.library_session())
             hist = data.history(period="1mo")  # Get 1 month of data
 
             if not hist.empty:
@@ -0,0 +1,161 @@
+# http_client.py
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+from ratelimit import acquire
+
+# Responses worth retrying for idempotent requests
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+_metrics_lock = threading.Lock()
+_host_metrics = {}  # host -> {"requests", "errors", "retries", "total_latency", "max_latency"}
+
+
+def get_session():
+    """
+    Return the process-wide pooled session. A forked worker gets its own session
+    so keep-alive connections are never shared between processes.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=Config.HTTP_POOL_HOSTS, pool_maxsize=Config.HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+def _record(host, latency, error=False, retried=False):
+    with _metrics_lock:
+        m = _host_metrics.setdefault(host, {"requests": 0, "errors": 0, "retries": 0, "total_latency": 0.0, "max_latency": 0.0})
+        m["requests"] += 1
+        m["errors"] += int(error)
+        m["retries"] += int(retried)
+        m["total_latency"] += latency
+        m["max_latency"] = max(m["max_latency"], latency)
+
+
+def host_metrics():
+    """Per-host request counts and latency (seconds) for this process."""
+    with _metrics_lock:
+        return {
+            host: {
+                "requests": m["requests"],
+                "errors": m["errors"],
+                "retries": m["retries"],
+                "avg_latency": round(m["total_latency"] / m["requests"], 4) if m["requests"] else 0.0,
+                "max_latency": round(m["max_latency"], 4)
+            } for host, m in _host_metrics.items()
+        }
+
+
+def _send_with_retries(host, retries, send, before=None):
+    """
+    Run send() -> Response up to retries + 1 times with exponential backoff and
+    full jitter, retrying connection errors, timeouts and 429/5xx responses and
+    recording every attempt in the host metrics. before() runs ahead of each attempt.
+    """
+    for attempt in range(retries + 1):
+        if before:
+            before()
+        start = time.monotonic()
+        try:
+            response = send()
+        except (requests.ConnectionError, requests.Timeout):
+            _record(host, time.monotonic() - start, error=True, retried=attempt > 0)
+            if attempt == retries:
+                raise
+        else:
+            retryable = response.status_code in RETRY_STATUSES
+            _record(host, time.monotonic() - start, error=retryable, retried=attempt > 0)
+            if not retryable or attempt == retries:
+                return response
+            response.close()
+        time.sleep(random.uniform(0, Config.HTTP_BACKOFF * (2 ** attempt)))
+
+
+def get(url, params=None, headers=None, timeout=None, retries=None, limiter=None):
+    """
+    GET through the pooled session with default connect/read timeouts.
+
+    Connection errors, timeouts and 429/5xx responses are retried up to
+    `retries` times with exponential backoff and full jitter. The final
+    response is returned as-is (callers still call raise_for_status), and the
+    final connection error is re-raised.
+
+    With `limiter` (a ratelimit bucket name) one token is taken before every
+    attempt, retries included, so they count against the upstream quota;
+    RateLimitTimeout is raised if no token can be had.
+    """
+    timeout = timeout or (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+    retries = Config.HTTP_RETRIES if retries is None else retries
+    session = get_session()
+    return _send_with_retries(
+        urlparse(url).netloc, retries,
+        lambda: session.get(url, params=params, headers=headers, timeout=timeout),
+        before=(lambda: acquire(limiter)) if limiter else None
+    )
+
+
+class LibrarySession(requests.Session):
+    """
+    Session handed to provider libraries (yfinance, finvizfinance) that make
+    their own requests: the same connection pools, default timeouts, GET
+    retries and host metrics as get().
+    """
+
+    def __init__(self):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=Config.HTTP_POOL_HOSTS, pool_maxsize=Config.HTTP_POOL_SIZE)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+        send = lambda: super(LibrarySession, self).request(method, url, *args, **kwargs)
+        retries = Config.HTTP_RETRIES if method.upper() == "GET" else 0
+        return _send_with_retries(urlparse(url).netloc, retries, send)
+
+
+_library_session = None
+_library_session_pid = None
+
+
+def library_session():
+    """Process-wide LibrarySession (a forked worker gets its own, like get_session)."""
+    global _library_session, _library_session_pid
+    with _session_lock:
+        if _library_session is None or _library_session_pid != os.getpid():
+            _library_session, _library_session_pid = LibrarySession(), os.getpid()
+        return _library_session
+
+
+class _CurrentLibrarySession:
+    """Stands in for a module-level session so each process resolves its own LibrarySession."""
+
+    def __getattr__(self, attr):
+        return getattr(library_session(), attr)
+
+
+def route_finviz(module=None):
+    """
+    finvizfinance scrapes through the module-level `session` of finvizfinance.util
+    and takes no session argument; point it at the pooled library session. Use as
+    the on_load hook of lazily imported finvizfinance modules.
+    """
+    import finvizfinance.util
+    finvizfinance.util.session = _CurrentLibrarySession()
@@ -0,0 +1,228 @@
+# jobs.py
+import io
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import defer
+
+from config import Config
+from models import db, ImportJob
+from csv_import import decode_lines, iter_csv_transactions, to_transaction_row, RowFingerprinter
+from helpers import bulk_insert_transactions, rebuild_holdings, invalidate_valuations
+from ratelimit import request_priority, BACKGROUND
+
+# Error messages kept on a job (the total is always counted in error_count)
+MAX_REPORTED_ERRORS = 1000
+
+
+def enqueue_import(portfolio_id, filename, stream, chunk_size=64 * 1024):
+    """Store an uploaded CSV as a queued import job, compressing it as it is read."""
+    compressor = zlib.compressobj()
+    parts = []
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        parts.append(compressor.compress(chunk))
+    parts.append(compressor.flush())
+    job = ImportJob(portfolio_id=portfolio_id, filename=filename, payload=b"".join(parts), total_bytes=total)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claim_import_job(job_id=None):
+    """
+    Take the oldest queued job (or one whose worker stopped sending heartbeats)
+    and mark it running. FOR UPDATE SKIP LOCKED lets several workers poll the
+    table without picking the same job.
+
+    Returns:
+        ImportJob: The claimed job, or None if there is nothing to do
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=Config.IMPORT_STALE_SECONDS)
+    query = ImportJob.query.filter(or_(
+        ImportJob.status == 'queued',
+        and_(ImportJob.status == 'running', ImportJob.heartbeat_at < stale)
+    ))
+    if job_id:
+        query = query.filter(ImportJob.id == job_id)
+    job = query.order_by(ImportJob.created_at).with_for_update(skip_locked=True).first()
+    if job is None:
+        db.session.rollback()
+        return None
+    job.status = 'running'
+    job.started_at = now
+    job.heartbeat_at = now
+    db.session.commit()
+    return job
+
+
+def _counted(lines, progress):
+    """Pass raw lines through while counting the bytes consumed (for progress and ETA)."""
+    for line in lines:
+        progress["bytes"] += len(line)
+        yield line
+
+
+def run_import_job(job):
+    """
+    Import a claimed job in chunks of IMPORT_CHUNK_ROWS rows, committing the
+    inserted rows together with the job's progress, the holdings of the tickers
+    touched and the valuation invalidation after each chunk. A job picked up
+    again after its worker died starts over from the top of the file; rows it
+    already committed are skipped by their fingerprints.
+    """
+    progress = {"bytes": 0}
+    lines = _counted(io.BytesIO(zlib.decompress(job.payload)), progress)
+    transactions = iter_csv_transactions(decode_lines(lines))
+    fingerprint = RowFingerprinter(scope=job.id)
+    # rows_added, tickers and earliest_date carry over from an interrupted run;
+    # the per-pass counters start again
+    tickers = set(job.tickers or [])
+    earliest_date = job.earliest_date
+    errors = []
+    rows = []
+    job.rows_processed = job.error_count = 0
+
+    def commit_chunk():
+        nonlocal earliest_date
+        inserted = bulk_insert_transactions(job.portfolio_id, rows) if rows else []
+        for ticker, created_at in inserted:
+            tickers.add(ticker)
+            earliest_date = created_at if earliest_date is None else min(earliest_date, created_at)
+        if inserted:
+            # Keep holdings, snapshots and ledger-versioned caches in step with
+            # every committed chunk, not just the finished file
+            invalidate_valuations(job.portfolio_id, min(created_at for _, created_at in inserted))
+            rebuild_holdings(job.portfolio_id, {ticker for ticker, _ in inserted})
+        job.rows_added += len(inserted)
+        job.bytes_processed = min(progress["bytes"], job.total_bytes)
+        job.errors = errors[:MAX_REPORTED_ERRORS]
+        job.tickers = sorted(tickers)
+        job.earliest_date = earliest_date
+        job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+        rows.clear()
+
+    try:
+        pending = 0
+        for transaction in transactions:
+            job.rows_processed += 1
+            pending += 1
+            row, error = to_transaction_row(transaction)
+            if error:
+                job.error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(error)
+            else:
+                rows.append(fingerprint(row))
+            if pending >= Config.IMPORT_CHUNK_ROWS:
+                commit_chunk()
+                pending = 0
+        commit_chunk()
+        if job.rows_processed == 0:
+            job.status = 'failed'
+            job.message = "No valid transactions found in the file"
+        else:
+            job.status = 'done'
+            job.message = f"{job.rows_added} transactions added" + (" with some errors." if job.error_count else " successfully.")
+        job.payload = b""
+    except Exception as e:
+        # The upload is kept so the job can be re-queued (`flask import-worker --retry-failed`);
+        # the chunks committed so far are skipped by their fingerprints
+        db.session.rollback()
+        job.status = 'failed'
+        job.message = f"Error processing file: {str(e)}"
+        print(f"Import job {job.id} failed: {e}")
+
+    job.bytes_processed = job.total_bytes if job.status == 'done' else job.bytes_processed
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def requeue_failed_jobs():
+    """
+    Queue failed jobs that still hold their upload (they failed on an error
+    rather than on an unusable file) to be run again.
+
+    Returns:
+        int: Number of jobs re-queued
+    """
+    count = ImportJob.query.filter(ImportJob.status == 'failed', db.func.length(ImportJob.payload) > 0) \
+        .update({ImportJob.status: 'queued', ImportJob.message: None, ImportJob.finished_at: None},
+                synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def start_inline_worker(app, job_id):
+    """
+    Process a job on a daemon thread of the current process, outside the request,
+    then keep draining the queue (including jobs abandoned by dead workers) so
+    deployments without `flask import-worker` still make progress.
+    """
+    def work():
+        with app.app_context(), request_priority(BACKGROUND):
+            try:
+                job = claim_import_job(job_id)
+                while job is not None:
+                    run_import_job(job)
+                    job = claim_import_job()
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=work, name=f"import-{job_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_abandoned(job, now=None):
+    """
+    True for a job no worker is processing: running without a heartbeat for
+    IMPORT_STALE_SECONDS, or still queued that long after it was created.
+    """
+    now = now or datetime.utcnow()
+    stale = now - timedelta(seconds=Config.IMPORT_STALE_SECONDS)
+    if job.status == 'running':
+        return job.heartbeat_at is not None and job.heartbeat_at < stale
+    if job.status == 'queued':
+        return job.created_at is not None and job.created_at < stale
+    return False
+
+
+def load_import_job(job_id):
+    """Fetch a job for status reporting without loading the stored upload."""
+    return ImportJob.query.options(defer(ImportJob.payload)).filter_by(id=job_id).first()
+
+
+def job_status(job):
+    """Progress report for /api/jobs/<id>, with an ETA extrapolated from bytes processed so far."""
+    fraction = job.bytes_processed / job.total_bytes if job.total_bytes else 0.0
+    eta = None
+    if job.status == 'running' and job.started_at and fraction > 0:
+        elapsed = (datetime.utcnow() - job.started_at).total_seconds()
+        eta = round(elapsed * (1 - fraction) / fraction, 1)
+    elif job.status in ('done', 'failed'):
+        eta = 0
+    return {
+        "id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "rows_processed": job.rows_processed,
+        "rows_added": job.rows_added,
+        "duplicates_skipped": max(0, job.rows_processed - job.rows_added - job.error_count),
+        "error_count": job.error_count,
+        "errors": job.errors,
+        "progress": round(fraction, 4) if job.status != 'done' else 1.0,
+        "eta_seconds": eta,
+        "message": job.message,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
@@ -0,0 +1,78 @@
+# lazy.py
+import importlib
+import threading
+import time
+import types
+
+# name -> seconds spent importing, for modules loaded through lazy_import
+import_times = {}
+
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access, so heavy
+    provider libraries (pandas, yfinance, finvizfinance, openai) are only loaded
+    by the requests that need them.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_on_load"] = []
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    for callback in self.__dict__["_lazy_on_load"]:
+                        callback(module)
+                    import_times[self.__name__] = round(time.perf_counter() - start, 4)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+_modules = {}
+
+
+def lazy_import(name, on_load=None):
+    """
+    Return the shared LazyModule for `name`. on_load(module) runs once after the
+    real import (immediately if it already happened), whichever importer triggers it.
+    """
+    with _lock:
+        module = _modules.get(name)
+        if module is None:
+            module = _modules[name] = LazyModule(name)
+        loaded = module.__dict__["_lazy_module"]
+        if on_load and loaded is None:
+            module.__dict__["_lazy_on_load"].append(on_load)
+    if on_load and loaded is not None:
+        on_load(loaded)
+    return module
+
+
+def loaded_modules():
+    """Lazy modules imported so far in this process, with their import time in seconds."""
+    return dict(import_times)
+
+
+def warm(*modules):
+    """Import lazy modules now (e.g. in the gunicorn master before forking workers)."""
+    for module in modules:
+        if isinstance(module, LazyModule):
+            module._load()
@@ -0,0 +1,80 @@
+# ledger_index.py
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, time
+
+from cache import TTLCache
+from config import Config
+from helpers import load_ledger, ledger_version, iter_replay, holding_values
+
+# (portfolio_id, ledger_version) -> LedgerIndex; a ledger change bumps the version,
+# so stale indexes are never looked up again and simply age out
+ledger_index_cache = TTLCache(maxsize=Config.LEDGER_INDEX_CACHE_MAXSIZE, ttl=Config.LEDGER_INDEX_CACHE_TTL)
+
+
+class LedgerIndex:
+    """
+    Running position of every ticker after each of its transactions, kept as
+    sorted parallel arrays so the holdings at any point in time are found with
+    one binary search per ticker instead of replaying the ledger.
+    """
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows (list): (ticker, created_at, shares, price, transaction_type) sorted by created_at
+        """
+        by_ticker = defaultdict(list)
+        for ticker, created_at, shares, price, transaction_type in rows:
+            by_ticker[ticker].append((created_at or datetime.min, shares, price, transaction_type))
+
+        self.times = {}   # ticker -> [created_at]
+        self.shares = {}  # ticker -> [shares held after the transaction]
+        self.cost = {}    # ticker -> [cost basis after the transaction]
+        for ticker, transactions in by_ticker.items():
+            self.times[ticker] = [created_at for created_at, _, _, _ in transactions]
+            states = list(iter_replay((shares, price, kind) for _, shares, price, kind in transactions))
+            self.shares[ticker] = [shares for shares, _ in states]
+            self.cost[ticker] = [cost for _, cost in states]
+
+    def __len__(self):
+        return sum(len(times) for times in self.times.values())
+
+    def holdings_as_of(self, as_of):
+        """
+        Open positions including every transaction made on or before `as_of`
+        (a date means the end of that day).
+
+        Returns:
+            list: [{"ticker", "shares", "average_cost", "book_value"}] sorted by ticker
+        """
+        if not isinstance(as_of, datetime):
+            as_of = datetime.combine(as_of, time.max)
+        holdings = []
+        for ticker in sorted(self.times):
+            i = bisect_right(self.times[ticker], as_of)
+            if i == 0 or self.shares[ticker][i - 1] <= 0:
+                continue
+            shares, average_cost, book_value = holding_values(self.shares[ticker][i - 1], self.cost[ticker][i - 1])
+            holdings.append({
+                "ticker": ticker,
+                "shares": shares,
+                "average_cost": average_cost,
+                "book_value": book_value
+            })
+        return holdings
+
+
+def get_ledger_index(portfolio_id):
+    """
+    Cached LedgerIndex for the portfolio's current ledger.
+
+    Returns:
+        tuple: (LedgerIndex, ledger_version) - (None, None) if the portfolio does not exist
+    """
+    version = ledger_version(portfolio_id)
+    if version is None:
+        return None, None
+    index = ledger_index_cache.get_or_load(
+        (portfolio_id, version), lambda: LedgerIndex(load_ledger(portfolio_id)))
+    return index, version
@@ -0,0 +1,226 @@
+# lots.py
+from collections import defaultdict
+
+from cache import TTLCache
+from config import Config
+from models import db, Transaction
+from helpers import ledger_version
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Lot relief methods: first-in-first-out, last-in-first-out and the pooled
+# average cost used for PortfolioHolding
+METHODS = ("fifo", "lifo", "average")
+
+# (portfolio_id, ledger_version, method) -> lot report; see ledger_index.py for the versioning
+lot_cache = TTLCache(maxsize=Config.LOT_CACHE_MAXSIZE, ttl=Config.LOT_CACHE_TTL)
+
+
+def load_lot_ledger(portfolio_id):
+    """Transactions as (id, ticker, created_at, shares, price, transaction_type) in ledger order."""
+    return db.session.query(
+        Transaction.id,
+        Transaction.ticker,
+        Transaction.created_at,
+        Transaction.shares,
+        Transaction.price,
+        Transaction.transaction_type
+    ).filter(Transaction.portfolio_id == portfolio_id) \
+        .order_by(Transaction.created_at, Transaction.id).all()
+
+
+def _split_ledger(transactions):
+    """
+    Separate a ticker's ledger into buys and the sells that can be filled. A sell
+    of more shares than are held at that point is set aside, the same rule the
+    holdings replay applies, so lots always reconcile with PortfolioHolding.
+
+    Returns:
+        tuple: (events, ignored) - events are the buys and fillable sells in order
+    """
+    held = 0.0
+    events = []
+    ignored = []
+    for txn_id, created_at, shares, price, kind in transactions:
+        kind = kind.lower()
+        if kind == "buy":
+            held += shares
+            events.append((txn_id, created_at, shares, price, kind))
+        elif kind == "sell":
+            if held >= shares:
+                held -= shares
+                events.append((txn_id, created_at, shares, price, kind))
+            else:
+                ignored.append((txn_id, created_at, shares, price, kind))
+    return events, ignored
+
+
+def _fifo(events):
+    """
+    FIFO relief without walking the lots: with cumulative bought quantity B and
+    cumulative cost C(B), piecewise linear at each buy's price, a sell covering
+    cumulative sold shares (S_prev, S] costs C(S) - C(S_prev). Fillable sells
+    never exceed the shares bought before them, so this only draws on earlier lots.
+    """
+    buys = [e for e in events if e[4] == "buy"]
+    sells = [e for e in events if e[4] == "sell"]
+    buy_shares = np.array([e[2] for e in buys], dtype=float)
+    buy_prices = np.array([e[3] for e in buys], dtype=float)
+    bought = np.concatenate(([0.0], np.cumsum(buy_shares)))
+    cost = np.concatenate(([0.0], np.cumsum(buy_shares * buy_prices)))
+    sold = np.concatenate(([0.0], np.cumsum([e[2] for e in sells])))
+
+    sell_costs = np.diff(np.interp(sold, bought, cost)) if len(buys) else np.zeros(len(sells))
+    # Shares left in each lot once the first sold[-1] bought shares are used up
+    remaining = np.clip(bought[1:] - np.maximum(sold[-1], bought[:-1]), 0.0, None)
+    open_lots = [(buy, float(left), float(buy[3])) for buy, left in zip(buys, remaining) if left > 1e-9]
+    return list(zip(sells, sell_costs.tolist())), open_lots
+
+
+def _lifo(events):
+    """LIFO relief: sells consume the most recent lots still open (amortized one pass)."""
+    stack = []  # [buy event, shares left]
+    realized = []
+    for event in events:
+        if event[4] == "buy":
+            stack.append([event, event[2]])
+            continue
+        to_fill = event[2]
+        sell_cost = 0.0
+        while to_fill > 1e-9 and stack:
+            lot = stack[-1]
+            take = min(lot[1], to_fill)
+            sell_cost += take * lot[0][3]
+            lot[1] -= take
+            to_fill -= take
+            if lot[1] <= 1e-9:
+                stack.pop()
+        realized.append((event, sell_cost))
+    return realized, [(buy, left, buy[3]) for buy, left in stack]
+
+
+def _average(events):
+    """Average-cost relief, matching replay_holding: one pooled lot per ticker."""
+    shares = 0.0
+    cost = 0.0
+    first = None
+    realized = []
+    for event in events:
+        if event[4] == "buy":
+            if shares <= 1e-9:
+                first = event
+            shares += event[2]
+            cost += event[2] * event[3]
+        else:
+            sell_cost = event[2] * cost / shares if shares > 0 else 0.0
+            shares -= event[2]
+            cost -= sell_cost
+            realized.append((event, sell_cost))
+    open_lots = [(first, shares, cost / shares)] if shares > 1e-9 else []
+    return realized, open_lots
+
+
+RELIEF = {"fifo": _fifo, "lifo": _lifo, "average": _average}
+
+
+def compute_lots(rows, method="average"):
+    """
+    Match sells against lots for every ticker in a ledger.
+
+    Args:
+        rows (list): Output of load_lot_ledger()
+        method (str): fifo | lifo | average
+
+    Returns:
+        dict: {"realized": [per fillable sell], "open_lots": [per open lot],
+               "ignored_sells": [sells exceeding the shares held],
+               "realized_by_ticker": {ticker: realized P&L},
+               "realized_by_transaction": {sell transaction id: realized P&L}}
+    """
+    if method not in RELIEF:
+        raise ValueError(f"Invalid method '{method}'. Use one of: {', '.join(METHODS)}")
+    by_ticker = defaultdict(list)
+    for txn_id, ticker, created_at, shares, price, kind in rows:
+        by_ticker[ticker].append((txn_id, created_at, float(shares), float(price), kind))
+
+    report = {"realized": [], "open_lots": [], "ignored_sells": [],
+              "realized_by_ticker": {}, "realized_by_transaction": {}}
+    for ticker in sorted(by_ticker):
+        events, ignored = _split_ledger(by_ticker[ticker])
+        realized, open_lots = RELIEF[method](events)
+        total = 0.0
+        for (txn_id, created_at, shares, price, _), cost_basis in realized:
+            pnl = shares * price - cost_basis
+            total += pnl
+            report["realized_by_transaction"][txn_id] = pnl
+            report["realized"].append({
+                "transaction_id": txn_id,
+                "ticker": ticker,
+                "date": created_at.isoformat() if created_at else None,
+                "shares": shares,
+                "price": price,
+                "proceeds": shares * price,
+                "cost_basis": cost_basis,
+                "realized_pnl": pnl
+            })
+        report["realized_by_ticker"][ticker] = total
+        for buy, shares, cost_per_share in open_lots:
+            report["open_lots"].append({
+                # The pooled average-cost lot is dated by the buy that opened the position
+                "transaction_id": buy[0] if method != "average" else None,
+                "ticker": ticker,
+                "acquired_at": buy[1].isoformat() if buy[1] else None,
+                "shares": shares,
+                "cost_per_share": cost_per_share,
+                "cost_basis": shares * cost_per_share
+            })
+        for txn_id, created_at, shares, price, _ in ignored:
+            report["ignored_sells"].append({
+                "transaction_id": txn_id,
+                "ticker": ticker,
+                "date": created_at.isoformat() if created_at else None,
+                "shares": shares,
+                "price": price,
+                "reason": "Sell exceeds the shares held at that time"
+            })
+    return report
+
+
+def get_lot_report(portfolio_id, method="average"):
+    """
+    Cached compute_lots() for the portfolio's current ledger.
+
+    Returns:
+        tuple: (report, ledger_version) - (None, None) if the portfolio does not exist
+    """
+    version = ledger_version(portfolio_id)
+    if version is None:
+        return None, None
+    report = lot_cache.get_or_load(
+        (portfolio_id, version, method), lambda: compute_lots(load_lot_ledger(portfolio_id), method))
+    return report, version
+
+
+def unrealized_pnl(open_lots, prices):
+    """
+    Value open lots at current prices.
+
+    Args:
+        open_lots (list): report["open_lots"]
+        prices (dict): ticker -> market price (missing or non-numeric leaves the lot unpriced)
+
+    Returns:
+        list: Copies of the lots with market_price, market_value and unrealized_pnl (None when unpriced)
+    """
+    valued = []
+    for lot in open_lots:
+        price = prices.get(lot["ticker"])
+        priced = isinstance(price, (int, float))
+        valued.append(dict(
+            lot,
+            market_price=price if priced else None,
+            market_value=lot["shares"] * price if priced else None,
+            unrealized_pnl=lot["shares"] * price - lot["cost_basis"] if priced else None
+        ))
+    return valued
@@ -21,6 +21,8 @@ class Portfolio(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Incremented on every ledger change; keys the caches derived from the ledger
+    ledger_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Relationship - A portfolio has many holdings & transactions
     user = db.relationship('User', back_populates='portfolio')
@@ -29,6 +31,7 @@ class Portfolio(db.Model):
 
 class PortfolioHolding(db.Model):
     __tablename__ = 'portfolio_holdings'
+    __table_args__ = (db.UniqueConstraint('portfolio_id', 'ticker'),)  # Target of the holdings upsert
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     portfolio_id = db.Column(db.String(36), db.ForeignKey('portfolios.id', ondelete='CASCADE'), nullable=False)
     ticker = db.Column(db.String(10), nullable=False)
@@ -50,10 +53,76 @@ class Transaction(db.Model):
     price = db.Column(db.Numeric(12,2), nullable=False)  # Prevent negative price
     transaction_type = db.Column(db.String(10), nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    # Content hash of an imported row (NULL for trades entered in the app); re-imported rows are skipped
+    fingerprint = db.Column(db.String(40))
+
+    __table_args__ = (
+        db.Index('idx_transactions_portfolio_fingerprint', 'portfolio_id', 'fingerprint', unique=True),
+        # Keyset pagination/ledger scans (newest-first pages walk this backwards)
+        db.Index('idx_transactions_portfolio_created_at', 'portfolio_id', 'created_at', 'id'),
+        # Ticker-filtered pages and per-ticker replays
+        db.Index('idx_transactions_portfolio_ticker_created_at', 'portfolio_id', 'ticker', 'created_at', 'id'),
+    )
 
     # Relationship - Belongs to a portfolio
     portfolio = db.relationship('Portfolio', back_populates='transactions')
 
+class DailyPrice(db.Model):
+    __tablename__ = 'daily_prices'
+    ticker = db.Column(db.String(10), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    close = db.Column(db.Numeric(14,4), nullable=False)
+
+class PriceCoverage(db.Model):
+    __tablename__ = 'price_coverage'
+    # Date range already fetched into daily_prices for a ticker (weekends/holidays included)
+    ticker = db.Column(db.String(10), primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PortfolioValuation(db.Model):
+    __tablename__ = 'portfolio_valuations'
+    # Materialized end-of-day valuation; rows from a transaction's date onward are
+    # deleted when the ledger changes and rebuilt by `flask snapshot-valuations`
+    portfolio_id = db.Column(db.String(36), db.ForeignKey('portfolios.id', ondelete='CASCADE'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    market_value = db.Column(db.Numeric(16,2), nullable=False, default=0)
+    book_value = db.Column(db.Numeric(16,2), nullable=False, default=0)
+    breakdown = db.Column(db.JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ApiCacheEntry(db.Model):
+    __tablename__ = 'api_cache'
+    # Upstream API response cached by request key (e.g. "INCOME_STATEMENT:AAPL"), zlib-compressed JSON
+    key = db.Column(db.String(255), primary_key=True)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    etag = db.Column(db.String(64), nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+    # Large CSV upload processed in the background; the file is stored zlib-compressed
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    portfolio_id = db.Column(db.String(36), db.ForeignKey('portfolios.id', ondelete='CASCADE'), nullable=False, index=True)
+    filename = db.Column(db.String(255))
+    payload = db.Column(db.LargeBinary, nullable=False)
+    total_bytes = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued | running | done | failed
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    rows_added = db.Column(db.Integer, nullable=False, default=0)
+    bytes_processed = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.JSON, nullable=False, default=list)  # first MAX_REPORTED_ERRORS messages
+    tickers = db.Column(db.JSON, nullable=False, default=list)
+    earliest_date = db.Column(db.DateTime)
+    message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
 class Watchlist(db.Model):
     __tablename__ = 'watchlist'
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
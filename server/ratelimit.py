@@ -0,0 +1,159 @@
+# ratelimit.py
+import contextvars
+import fcntl
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from config import Config
+
+# Request priorities: lower values are served first when an upstream is saturated
+INTERACTIVE = 0
+BACKGROUND = 10
+
+# A waiter that stops polling (e.g. its worker was killed) is forgotten after this many seconds
+WAITER_TTL = 5.0
+
+_priority = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+_waiter_ids = itertools.count()
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a token could not be acquired within the allowed wait."""
+
+
+@contextmanager
+def request_priority(priority):
+    """Run upstream calls made inside the block at the given priority (e.g. BACKGROUND prefetches)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class SharedTokenBucket:
+    """
+    Token bucket shared by every process on the host through a flock-guarded
+    state file, so all gunicorn workers draw from the same upstream quota.
+
+    Waiting callers register in the shared state with their priority; a caller
+    only takes a token when no higher-priority caller is waiting, so interactive
+    requests go ahead of background work.
+    """
+
+    def __init__(self, name, capacity, period, state_dir):
+        self.name = name
+        self.capacity = float(capacity)
+        self.rate = capacity / float(period)
+        self.path = os.path.join(state_dir, f"stockr-ratelimit-{name}.json")
+        self._metrics_lock = threading.Lock()
+        self._metrics = {}  # priority -> {"acquired", "total_wait", "max_wait", "timeouts"}
+
+    def _transact(self, update):
+        """Apply update(state) under an exclusive file lock and persist the result."""
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            raw = f.read()
+            try:
+                state = json.loads(raw) if raw else None
+            except ValueError:
+                state = None
+            if state is None:
+                state = {"tokens": self.capacity, "updated": time.time(), "waiters": {}}
+            result = update(state)
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            return result
+
+    def acquire(self, tokens=1, priority=None, timeout=None):
+        """
+        Block until `tokens` tokens are available and take them.
+
+        Returns:
+            float: Seconds spent waiting in the queue
+        """
+        priority = _priority.get() if priority is None else priority
+        timeout = Config.RATE_LIMIT_MAX_WAIT if timeout is None else timeout
+        waiter_id = f"{os.getpid()}-{threading.get_ident()}-{next(_waiter_ids)}"
+        tokens = min(float(tokens), self.capacity)
+        start = time.monotonic()
+
+        def attempt(state):
+            now = time.time()
+            state["tokens"] = min(self.capacity, state["tokens"] + (now - state["updated"]) * self.rate)
+            state["updated"] = now
+            waiters = {k: v for k, v in state["waiters"].items() if v[1] > now and k != waiter_id}
+            state["waiters"] = waiters
+            ahead = any(p < priority for p, _ in waiters.values())
+            if not ahead and state["tokens"] >= tokens:
+                state["tokens"] -= tokens
+                return 0.0
+            waiters[waiter_id] = [priority, now + WAITER_TTL]
+            return max((tokens - state["tokens"]) / self.rate, 0.05)
+
+        def withdraw(state):
+            state["waiters"].pop(waiter_id, None)
+
+        while True:
+            wait = self._transact(attempt)
+            waited = time.monotonic() - start
+            if wait == 0.0:
+                self._record(priority, waited)
+                return waited
+            if waited + wait > timeout:
+                self._transact(withdraw)
+                self._record(priority, waited, timed_out=True)
+                raise RateLimitTimeout(f"Rate limit for {self.name} exceeded; gave up after {waited:.1f}s")
+            time.sleep(min(wait, 1.0))
+
+    def _record(self, priority, waited, timed_out=False):
+        with self._metrics_lock:
+            m = self._metrics.setdefault(priority, {"acquired": 0, "total_wait": 0.0, "max_wait": 0.0, "timeouts": 0})
+            if timed_out:
+                m["timeouts"] += 1
+                return
+            m["acquired"] += 1
+            m["total_wait"] += waited
+            m["max_wait"] = max(m["max_wait"], waited)
+
+    def metrics(self):
+        """Queue wait metrics for this process, per priority."""
+        with self._metrics_lock:
+            return {
+                str(priority): {
+                    "acquired": m["acquired"],
+                    "timeouts": m["timeouts"],
+                    "avg_wait": round(m["total_wait"] / m["acquired"], 4) if m["acquired"] else 0.0,
+                    "max_wait": round(m["max_wait"], 4)
+                } for priority, m in self._metrics.items()
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """Return the shared bucket for an upstream configured in Config.UPSTREAM_RATE_LIMITS."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            capacity, period = Config.UPSTREAM_RATE_LIMITS[name]
+            limiter = SharedTokenBucket(name, capacity, period, Config.RATE_LIMIT_STATE_DIR)
+            _limiters[name] = limiter
+        return limiter
+
+
+def acquire(name, tokens=1, priority=None):
+    """Wait for permission to make `tokens` calls to an upstream."""
+    return get_limiter(name).acquire(tokens=tokens, priority=priority)
+
+
+def limiter_metrics():
+    return {name: limiter.metrics() for name, limiter in _limiters.items()}
@@ -1,32 +1,111 @@
 # routes.py
 import uuid
+import hashlib
+import hmac
 from re import findall
 import os
 import time
 import json
 import requests
-import pandas as pd
 import csv
-import openai
 
 from flask import Flask, jsonify, request, g
 from firebase_admin import auth
-from finvizfinance.quote import finvizfinance
-from finvizfinance.news import News
-from io import StringIO
 from datetime import datetime
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
 from models import db, User, Watchlist, Portfolio, Transaction, PortfolioHolding, UserThread
-from helpers import convert_data, safe_convert, parse_csv_with_mapping, fetch_stock_data, fetch_market_price, recalc_portfolio, fetch_stock_sector, wait_for_run_completion, cleanup_old_threads, fetch_historical_price, fetch_batch_historical_prices, fetch_market_benchmarks
-
-openai.api_key = os.getenv("OPENAI_AGENT_API_KEY")
+from cache import TTLCache
+from ratelimit import acquire, limiter_metrics, RateLimitTimeout
+import http_client
+from symbols import get_symbol_index
+from helpers import convert_data, safe_convert, fetch_stock_data, fetch_market_price, recalc_portfolio, apply_transaction, bulk_insert_transactions, rebuild_holdings, fetch_stock_sector, wait_for_run_completion, fetch_market_benchmarks, parallel_map, fetch_market_prices, fetch_price_matrix, load_ledger, invalidate_valuations, load_valuations, fetch_alpha_vantage, fundamentals_cache, quotes_cache, encode_transaction_cursor, decode_transaction_cursor
+from valuation import INTERVALS, ledger_frame, sample_dates, value_history
+from series import downsample_series, series_since
+from csv_import import decode_lines, iter_csv_transactions, to_transaction_row, RowFingerprinter
+from jobs import enqueue_import, start_inline_worker, load_import_job, job_status, is_abandoned
+from ledger_index import get_ledger_index, ledger_index_cache
+from lots import METHODS as LOT_METHODS, get_lot_report, unrealized_pnl, lot_cache
+from analytics import WINDOWS as ANALYTICS_WINDOWS, RISK_WINDOWS, get_portfolio_analytics, get_portfolio_risk, analytics_cache, risk_cache
+from lazy import lazy_import, loaded_modules
+from startup import rss_mb
+
+# Provider libraries are imported on first use (see lazy.py)
+pd = lazy_import("pandas")
+openai = lazy_import("openai", on_load=lambda module: setattr(module, "api_key", os.getenv("OPENAI_AGENT_API_KEY")))
+finviz_quote = lazy_import("finvizfinance.quote", on_load=http_client.route_finviz)
+finviz_news = lazy_import("finvizfinance.news", on_load=http_client.route_finviz)
 ASSISTANT_ID = os.getenv("STOCKR_ASSISTANT_ID")
 ALPHA_ID = os.getenv("STOCKR_ALPHA_ID")
 
+# Parsed upload rows buffered per multi-row INSERT
+UPLOAD_INSERT_CHUNK = 1000
+
+# Identity resolved for an authenticated request; stored on g.user in place of the ORM User.
+AuthContext = namedtuple('AuthContext', ['id', 'firebase_uid', 'portfolio_id'])
+
+
 def register_routes(app):
 
+    # Verified tokens -> AuthContext, so repeat requests skip signature checks and lookups.
+    auth_cache = TTLCache(maxsize=app.config.get('AUTH_CACHE_MAXSIZE', 2048))
+    app.extensions['auth_cache'] = auth_cache
+
+    def resolve_auth_context(id_token):
+        """Return the AuthContext for a token, verifying and querying only on a cache miss."""
+        cache_key = hashlib.sha256(id_token.encode()).hexdigest()
+        context = auth_cache.get(cache_key)
+        if context is not None:
+            return context
+        decoded_token = auth.verify_id_token(id_token)
+        row = db.session.query(User.id, Portfolio.id) \
+            .outerjoin(Portfolio, Portfolio.user_id == User.id) \
+            .filter(User.firebase_uid == decoded_token['uid']).first()
+        if not row:
+            return None
+        context = AuthContext(id=row[0], firebase_uid=decoded_token['uid'], portfolio_id=row[1])
+        auth_cache.set(cache_key, context, expires_at=decoded_token['exp'])
+        return context
+
+    def owns_portfolio(portfolio_id):
+        return g.portfolio_id is not None and g.portfolio_id == portfolio_id
+
+    def cached_response(payload, etag, max_age):
+        """JSON response with ETag/Cache-Control; 304 when the client already has this version."""
+        if etag and etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(payload)
+        if etag:
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.max_age = max_age
+        return response, response.status_code
+
+    def historical_response(dates, prices, etag, max_age):
+        """
+        Serve a price series honouring ?points=N&from=YYYY-MM-DD&to=YYYY-MM-DD:
+        the series is sliced to the range and downsampled with LTTB to at most N points.
+
+        With ?since=<cursor> only points after the cursor are returned; every
+        response carries the cursor to send on the next call (see series_since).
+        """
+        points = request.args.get('points', type=int)
+        start, end = request.args.get('from'), request.args.get('to')
+        since = request.args.get('since')
+        if points is not None and points < 3:
+            return jsonify({"error": "points must be at least 3"}), 400
+        try:
+            dates, prices, cursor = series_since(dates, prices, since)
+            dates, prices = downsample_series(dates, prices, points=points, start=start, end=end)
+        except ValueError:
+            return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+        if etag and (points or start or end or since):
+            # Each slice/resolution is a different representation of the upstream data
+            etag = hashlib.sha1(f"{etag}:{points}:{start}:{end}:{since}".encode()).hexdigest()
+        return cached_response({"dates": dates, "prices": prices, "cursor": cursor}, etag, max_age)
+
     # Before each request, check Firebase token for protected endpoints.
     @app.before_request
     def authenticate():
@@ -39,7 +118,8 @@ def register_routes(app):
             'withdraw_cash', 'delete_transaction', 'get_transactions', 'buy_asset', 'sell_asset',
             'get_portfolio_id', 'sell_portfolio_asset', 'add_portfolio_asset', 'get_stock_market_price',
             'search_stocks', 'upload_transactions', 'get_portfolio_assistant_context', 'start_chat_thread',
-            'continue_chat_thread', 'get_portfolio_history'
+            'continue_chat_thread', 'get_portfolio_history', 'get_quotes', 'get_import_job',
+            'get_holdings_as_of', 'get_portfolio_gains', 'get_analytics', 'get_portfolio_risk_report'
         ]
         if request.endpoint in protected_endpoints:
             auth_header = request.headers.get('Authorization')
@@ -47,10 +127,10 @@ def register_routes(app):
                 return jsonify({"error": "Unauthorized"}), 401
             id_token = auth_header.split('Bearer ')[1]
             try:
-                decoded_token = auth.verify_id_token(id_token)
-                g.user = User.query.filter_by(firebase_uid=decoded_token['uid']).first()
+                g.user = resolve_auth_context(id_token)
                 if not g.user:
                     return jsonify({"error": "User not found"}), 401
+                g.portfolio_id = g.user.portfolio_id
             except Exception as e:
                 return jsonify({"error": str(e)}), 401
 
@@ -60,31 +140,73 @@ def register_routes(app):
     def home():
         return jsonify({"message": "FinViz Stock Watchlist API is running!"})
 
+    @app.route("/api/metrics", methods=["GET"])
+    def get_metrics():
+        """
+        Process, limiter and cache statistics for operators. Requires
+        `Authorization: Bearer <METRICS_TOKEN>`; without a configured token only
+        requests from the host itself are answered.
+        """
+        token = app.config.get('METRICS_TOKEN')
+        if token:
+            supplied = request.headers.get('Authorization', '').replace('Bearer ', '', 1)
+            allowed = hmac.compare_digest(supplied.encode(), token.encode())
+        else:
+            allowed = request.remote_addr in ('127.0.0.1', '::1')
+        if not allowed:
+            return jsonify({"error": "Not found"}), 404
+        return jsonify({
+            "pid": os.getpid(),
+            "rss_mb": rss_mb(),
+            "startup": app.extensions.get('startup'),
+            "lazy_imports": loaded_modules(),
+            "rate_limits": limiter_metrics(),
+            "upstream_latency": http_client.host_metrics(),
+            "caches": {
+                "auth": auth_cache.stats(),
+                "fundamentals": fundamentals_cache.stats(),
+                "ledger_index": ledger_index_cache.stats(),
+                "lots": lot_cache.stats(),
+                "analytics": analytics_cache.stats(),
+                "risk": risk_cache.stats(),
+                "quotes": quotes_cache.stats()
+            }
+        }), 200
+
     @app.route("/api/calendar", methods=["GET"])
     def get_economic_calendar():
         return jsonify({"message": "FinViz Stock Watchlist API is running!"})
 
     @app.route("/api/stocks/<string:query>", methods=["GET"])
     def search_stocks(query):
+        matches = get_symbol_index().search(query, limit=5)
+        suggestions = [{"symbol": m["symbol"], "name": m["name"]} for m in matches]
+        if any(m["match"] != "fuzzy" for m in matches):
+            return jsonify({"stocks": suggestions}), 200
+        # Not in the local listing (e.g. foreign listings, newly listed names) or only
+        # typo matches: ask Yahoo, falling back to the typo matches
         try:
             yahoo_api_url = f"https://query1.finance.yahoo.com/v6/finance/autocomplete?lang=en&query={query}"
             headers = {"User-Agent": "Mozilla/5.0"}
-            response = requests.get(yahoo_api_url, headers=headers, timeout=5)
+            response = http_client.get(yahoo_api_url, headers=headers, timeout=5)
             response.raise_for_status()
             data = response.json()
             results = data.get("ResultSet", {}).get("Result", [])
-            stocks = [{"symbol": stock.get("symbol"), "name": stock.get("name")} for stock in results[:5]]
+            stocks = [{"symbol": stock.get("symbol"), "name": stock.get("name")} for stock in results[:5]] or suggestions
             if not stocks:
                 return jsonify({"error": "No matching stocks found"}), 404
             return jsonify({"stocks": stocks}), 200
         except requests.exceptions.RequestException as e:
+            if suggestions:
+                return jsonify({"stocks": suggestions}), 200
             return jsonify({"error": str(e)}), 500
 
     @app.route("/api/stock/<string:ticker>", methods=["GET"])
     def get_stock_data(ticker):
         try:
             ticker = ticker.upper()
-            stock = finvizfinance(ticker)
+            acquire("finviz")
+            stock = finviz_quote.finvizfinance(ticker)
             stock_fundament = convert_data(stock.ticker_fundament())
             stock_description = convert_data(stock.ticker_description())
             outer_ratings = convert_data(stock.ticker_outer_ratings())
@@ -106,18 +228,38 @@ def register_routes(app):
         market_data = fetch_market_price(ticker)
         return jsonify(market_data), 200
 
+    @app.route("/api/quotes", methods=["GET"])
+    def get_quotes():
+        tickers = request.args.get('tickers')
+        if not tickers:
+            return jsonify({"error": "The 'tickers' query parameter is required."}), 400
+        symbols = [t.strip().upper() for t in tickers.split(',') if t.strip()]
+        if len(symbols) > app.config.get('QUOTES_MAX_TICKERS', 500):
+            return jsonify({"error": "Too many tickers requested."}), 400
+        try:
+            quotes = fetch_market_prices(symbols)
+            return jsonify({"quotes": [quotes[symbol] for symbol in dict.fromkeys(symbols)]}), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
     @app.route("/api/watchlist/stocks", methods=["GET"])
     def get_watchlist_stocks():
         try:
             watchlist_items = Watchlist.query.filter_by(user_id=g.user.id).all()
             tickers = [item.ticker for item in watchlist_items]
             stocks_data = []
-            for ticker in tickers:
-                try:
-                    stock_data = fetch_stock_data(ticker)
-                    stocks_data.append(stock_data)
-                except Exception as inner_error:
+            results = parallel_map(
+                fetch_stock_data,
+                tickers,
+                max_workers=app.config.get('WATCHLIST_FETCH_WORKERS', 8),
+                item_timeout=app.config.get('WATCHLIST_TICKER_TIMEOUT', 20),
+                total_timeout=app.config.get('WATCHLIST_REQUEST_BUDGET', 60)
+            )
+            for ticker, (stock_data, inner_error) in zip(tickers, results):
+                if inner_error is not None:
                     stocks_data.append({"ticker": ticker, "error": str(inner_error)})
+                else:
+                    stocks_data.append(stock_data)
             return jsonify(stocks_data), 200
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -154,47 +296,48 @@ def register_routes(app):
     @app.route("/api/stock/historical/<string:symbol>", methods=["GET"])
     def get_stock_historical(symbol):
         symbol = symbol.upper()
-        url = f'https://www.alphavantage.co/query?function=TIME_SERIES_WEEKLY_ADJUSTED&symbol={symbol}&outputsize=full&apikey={ALPHA_ID}'
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            data, etag, max_age = fetch_alpha_vantage("TIME_SERIES_WEEKLY_ADJUSTED", symbol, outputsize="full")
             if "Error Message" in data:
                 return jsonify({"error": data["Error Message"]}), 400
+            if "Note" in data or "Information" in data:
+                return jsonify({"error": "Alpha Vantage rate limit reached, try again shortly"}), 503
             if "Weekly Adjusted Time Series" not in data:
                 return jsonify({"error": "Invalid response from Alpha Vantage"}), 400
             time_series = data["Weekly Adjusted Time Series"]
             dates = sorted(time_series.keys())
             prices = [time_series[date]["5. adjusted close"] for date in dates]
-            graph_data = {"dates": dates, "prices": prices}
-            return jsonify(graph_data), 200
+            return historical_response(dates, prices, etag, max_age)
+        except RateLimitTimeout as e:
+            return jsonify({"error": str(e)}), 503
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route("/api/crypto/historical/<string:symbol>", methods=["GET"])
     def get_crypto_historical(symbol):
         symbol = symbol.upper()
-        url = f'https://www.alphavantage.co/query?function=DIGITAL_CURRENCY_DAILY&symbol={symbol}&market=USD&apikey={ALPHA_ID}'
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            data, etag, max_age = fetch_alpha_vantage("DIGITAL_CURRENCY_DAILY", symbol, market="USD")
             if "Error Message" in data:
                 return jsonify({"error": data["Error Message"]}), 400
+            if "Note" in data or "Information" in data:
+                return jsonify({"error": "Alpha Vantage rate limit reached, try again shortly"}), 503
             if "Time Series (Digital Currency Daily)" not in data:
                 return jsonify({"error": "Invalid response from Alpha Vantage"}), 400
             time_series = data["Time Series (Digital Currency Daily)"]
             dates = sorted(time_series.keys())
             prices = [time_series[date]["4a. close (USD)"] for date in dates]
-            graph_data = {"dates": dates, "prices": prices}
-            return jsonify(graph_data), 200
+            return historical_response(dates, prices, etag, max_age)
+        except RateLimitTimeout as e:
+            return jsonify({"error": str(e)}), 503
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route("/api/market-news", methods=["GET"])
     def get_market_news():
         try:
-            news = News()
+            acquire("finviz")
+            news = finviz_news.News()
             news_data = news.get_news()
             news_data_converted = {}
             for key, value in news_data.items():
@@ -210,11 +353,33 @@ def register_routes(app):
     @app.route("/api/ticker-search", methods=["GET"])
     def get_ticker():
         keyword = request.args.get('keywords', 'Microsoft')
+        matches = get_symbol_index().search(keyword, limit=10)
+        # Same shape as Alpha Vantage SYMBOL_SEARCH so the client is unaffected
+        local = {"bestMatches": [{
+            "1. symbol": m["symbol"],
+            "2. name": m["name"],
+            "4. region": "United States",
+            "8. currency": "USD"
+        } for m in matches]}
+        if any(m["match"] != "fuzzy" for m in matches):
+            return jsonify(local), 200
+        # Unknown or typo-only matches: ask Alpha Vantage, falling back to the typo matches
         url = f'https://www.alphavantage.co/query?function=SYMBOL_SEARCH&keywords={keyword}&apikey={ALPHA_ID}'
-        r = requests.get(url)
+        try:
+            r = http_client.get(url, limiter="alphavantage")
+        except (RateLimitTimeout, requests.RequestException) as e:
+            if matches:
+                return jsonify(local), 200
+            if isinstance(e, RateLimitTimeout):
+                return jsonify({"error": str(e)}), 503
+            return jsonify({"error": "Failed to fetch data from Alpha Vantage"}), 500
         if r.status_code != 200:
+            if matches:
+                return jsonify(local), 200
             return jsonify({"error": "Failed to fetch data from Alpha Vantage"}), 500
         data = r.json()
+        if not data.get("bestMatches") and matches:
+            return jsonify(local), 200
         return jsonify(data), 200
 
     @app.route("/api/news-sentiment", methods=["GET"])
@@ -229,8 +394,10 @@ def register_routes(app):
         url += f'&apikey={ALPHA_ID}'
         print(url)
         try:
-            response = requests.get(url)
+            response = http_client.get(url, limiter="alphavantage")
             response.raise_for_status()
+        except RateLimitTimeout as e:
+            return jsonify({"error": str(e)}), 503
         except requests.RequestException as req_err:
             return jsonify({"error": f"Failed to fetch data from Alpha Vantage: {req_err}"}), 500
         data = response.json()
@@ -241,50 +408,46 @@ def register_routes(app):
         symbol = request.args.get('symbol')
         if not symbol:
             return jsonify({"error": "The 'symbol' query parameter is required."}), 400
-        url = f'https://www.alphavantage.co/query?function=INCOME_STATEMENT&symbol={symbol}&apikey={ALPHA_ID}'
         try:
-            response = requests.get(url)
-            response.raise_for_status()
+            data, etag, max_age = fetch_alpha_vantage("INCOME_STATEMENT", symbol)
+        except RateLimitTimeout as e:
+            return jsonify({"error": str(e)}), 503
         except requests.RequestException as req_err:
             return jsonify({"error": f"Failed to fetch data from Alpha Vantage: {req_err}"}), 500
-        data = response.json()
-        return jsonify(data), 200
+        return cached_response(data, etag, max_age)
 
     @app.route("/api/balance-sheet", methods=["GET"])
     def get_balance_sheet():
         symbol = request.args.get('symbol')
         if not symbol:
             return jsonify({"error": "The 'symbol' query parameter is required."}), 400
-        url = f'https://www.alphavantage.co/query?function=BALANCE_SHEET&symbol={symbol}&apikey={ALPHA_ID}'
         try:
-            response = requests.get(url)
-            response.raise_for_status()
+            data, etag, max_age = fetch_alpha_vantage("BALANCE_SHEET", symbol)
+        except RateLimitTimeout as e:
+            return jsonify({"error": str(e)}), 503
         except requests.RequestException as req_err:
             return jsonify({"error": f"Failed to fetch data from Alpha Vantage: {req_err}"}), 500
-        data = response.json()
-        return jsonify(data), 200
+        return cached_response(data, etag, max_age)
 
     @app.route("/api/cash-flow", methods=["GET"])
     def get_cash_flow():
         symbol = request.args.get('symbol')
         if not symbol:
             return jsonify({"error": "The 'symbol' query parameter is required."}), 400
-        url = f'https://www.alphavantage.co/query?function=CASH_FLOW&symbol={symbol}&apikey={ALPHA_ID}'
         try:
-            response = requests.get(url)
-            response.raise_for_status()
+            data, etag, max_age = fetch_alpha_vantage("CASH_FLOW", symbol)
+        except RateLimitTimeout as e:
+            return jsonify({"error": str(e)}), 503
         except requests.RequestException as req_err:
             return jsonify({"error": f"Failed to fetch data from Alpha Vantage: {req_err}"}), 500
-        data = response.json()
-        return jsonify(data), 200
+        return cached_response(data, etag, max_age)
 
     @app.route("/api/portfolio/<string:portfolio_id>", methods=["GET"])
     def get_portfolio(portfolio_id):
         try:
             if not hasattr(g, 'user') or g.user is None:
                 return jsonify({"error": "User not authenticated"}), 401
-            portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=g.user.id).first()
-            if not portfolio:
+            if not owns_portfolio(portfolio_id):
                 return jsonify({"error": "Portfolio not found or unauthorized"}), 404
             portfolio_entries = PortfolioHolding.query.filter_by(portfolio_id=portfolio_id).all()
             portfolio_list = [{
@@ -310,22 +473,23 @@ def register_routes(app):
             return jsonify({"error": "Ticker, shares, and price are required."}), 400
         ticker = ticker.upper()
         try:
-            user = g.user
-            portfolio = Portfolio.query.filter_by(user_id=user.id).first()
-            if not portfolio:
+            portfolio_id = g.portfolio_id
+            if not portfolio_id:
                 return jsonify({"error": "Portfolio not found"}), 404
             new_txn = Transaction(
-                portfolio_id=portfolio.id,
+                portfolio_id=portfolio_id,
                 ticker=ticker,
                 shares=shares,
                 price=price,
                 transaction_type="buy"
             )
             db.session.add(new_txn)
+            invalidate_valuations(portfolio_id, datetime.now())
+            apply_transaction(new_txn)
             db.session.commit()
-            recalc_portfolio(portfolio.id, ticker)
             return jsonify({"message": "Asset purchased successfully.", "ticker": ticker}), 201
         except Exception as e:
+            db.session.rollback()
             return jsonify({"error": str(e)}), 500
 
     @app.route("/api/portfolio/sell", methods=["POST"])
@@ -340,25 +504,26 @@ def register_routes(app):
             return jsonify({"error": "Ticker, shares, and price are required."}), 400
         ticker = ticker.upper()
         try:
-            user = g.user
-            portfolio = Portfolio.query.filter_by(user_id=user.id).first()
-            if not portfolio:
+            portfolio_id = g.portfolio_id
+            if not portfolio_id:
                 return jsonify({"error": "Portfolio not found"}), 404
-            holding = PortfolioHolding.query.filter_by(portfolio_id=portfolio.id, ticker=ticker).first()
+            holding = PortfolioHolding.query.filter_by(portfolio_id=portfolio_id, ticker=ticker).first()
             if not holding or holding.shares < shares:
                 return jsonify({"error": "Not enough shares to sell."}), 400
             new_txn = Transaction(
-                portfolio_id=portfolio.id,
+                portfolio_id=portfolio_id,
                 ticker=ticker,
                 shares=shares,
                 price=price,
                 transaction_type="sell"
             )
             db.session.add(new_txn)
+            invalidate_valuations(portfolio_id, datetime.now())
+            apply_transaction(new_txn)
             db.session.commit()
-            recalc_portfolio(portfolio.id, ticker)
             return jsonify({"message": "Asset sold successfully.", "ticker": ticker}), 201
         except Exception as e:
+            db.session.rollback()
             return jsonify({"error": str(e)}), 500
 
     @app.route("/api/portfolio/<string:portfolio_id>/add-asset", methods=["POST"])
@@ -376,18 +541,18 @@ def register_routes(app):
             if not ticker or shares is None or price is None:
                 return jsonify({"error": "Ticker, shares, and price are required."}), 400
             ticker = ticker.upper()
-            portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=g.user.id).first()
-            if not portfolio:
+            if not owns_portfolio(portfolio_id):
                 return jsonify({"error": "Portfolio not found or unauthorized"}), 404
             new_txn = Transaction(
-                portfolio_id=portfolio.id,
+                portfolio_id=portfolio_id,
                 ticker=ticker,
                 shares=shares,
                 price=price,
                 transaction_type=transaction_type
             )
             db.session.add(new_txn)
-            recalc_portfolio(portfolio.id, ticker)
+            invalidate_valuations(portfolio_id, datetime.now())
+            apply_transaction(new_txn)
             db.session.commit()
             return jsonify({"message": "Transaction recorded and portfolio updated successfully."}), 201
         except Exception as e:
@@ -409,34 +574,163 @@ def register_routes(app):
             if not ticker or shares is None or price is None:
                 return jsonify({"error": "Ticker, shares, and price are required."}), 400
             ticker = ticker.upper()
-            portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=g.user.id).first()
-            if not portfolio:
+            if not owns_portfolio(portfolio_id):
                 return jsonify({"error": "Portfolio not found or unauthorized"}), 404
-            portfolio_entry = PortfolioHolding.query.filter_by(portfolio_id=portfolio.id, ticker=ticker).first()
+            portfolio_entry = PortfolioHolding.query.filter_by(portfolio_id=portfolio_id, ticker=ticker).first()
             if not portfolio_entry or portfolio_entry.shares < shares:
                 return jsonify({"error": "Insufficient shares to sell"}), 400
             new_txn = Transaction(
-                portfolio_id=portfolio.id,
+                portfolio_id=portfolio_id,
                 ticker=ticker,
                 shares=shares,
                 price=price,
                 transaction_type=transaction_type
             )
             db.session.add(new_txn)
-            recalc_portfolio(portfolio.id, ticker)
+            invalidate_valuations(portfolio_id, datetime.now())
+            apply_transaction(new_txn)
             db.session.commit()
             return jsonify({"message": "Transaction recorded and portfolio updated successfully."}), 201
         except Exception as e:
             db.session.rollback()
             return jsonify({"error": str(e)}), 500
 
+    @app.route("/api/portfolio/<string:portfolio_id>/holdings", methods=["GET"])
+    def get_holdings_as_of(portfolio_id):
+        """
+        Holdings as they stood at the end of a past day, answered from the cached
+        ledger index (see ledger_index.py) instead of replaying the ledger.
+
+        Query params:
+            as_of: YYYY-MM-DD (default: today)
+        """
+        try:
+            if not hasattr(g, 'user') or g.user is None:
+                return jsonify({"error": "User not authenticated"}), 401
+            if not owns_portfolio(portfolio_id):
+                return jsonify({"error": "Portfolio not found or unauthorized"}), 404
+            as_of = datetime.now().date()
+            if request.args.get('as_of'):
+                try:
+                    as_of = datetime.strptime(request.args['as_of'], "%Y-%m-%d").date()
+                except ValueError:
+                    return jsonify({"error": "Invalid as_of date format. Use YYYY-MM-DD."}), 400
+            index, version = get_ledger_index(portfolio_id)
+            if index is None:
+                return jsonify({"error": "Portfolio not found or unauthorized"}), 404
+            return jsonify({
+                "as_of": as_of.isoformat(),
+                "ledger_version": version,
+                "holdings": index.holdings_as_of(as_of)
+            }), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/portfolio/<string:portfolio_id>/gains", methods=["GET"])
+    def get_portfolio_gains(portfolio_id):
+        """
+        Realized P&L per sell and unrealized P&L per open lot (see lots.py). Lot
+        matching is cached per ledger version; only current prices are fetched.
+
+        Query params:
+            method: fifo | lifo | average (default, matches the holdings' average cost)
+        """
+        try:
+            if not hasattr(g, 'user') or g.user is None:
+                return jsonify({"error": "User not authenticated"}), 401
+            if not owns_portfolio(portfolio_id):
+                return jsonify({"error": "Portfolio not found or unauthorized"}), 404
+            method = request.args.get('method', 'average').lower()
+            if method not in LOT_METHODS:
+                return jsonify({"error": f"Invalid method. Use one of: {', '.join(LOT_METHODS)}"}), 400
+            report, version = get_lot_report(portfolio_id, method)
+            if report is None:
+                return jsonify({"error": "Portfolio not found or unauthorized"}), 404
+
+            open_tickers = sorted({lot["ticker"] for lot in report["open_lots"]})
+            try:
+                quotes = fetch_market_prices(open_tickers)
+            except Exception as e:
+                app.logger.error(f"Error fetching market prices for gains: {e}")
+                quotes = {}
+            prices = {ticker: quote.get("market_price") for ticker, quote in quotes.items()}
+            open_lots = unrealized_pnl(report["open_lots"], prices)
+
+            unrealized_by_ticker = {}
+            for lot in open_lots:
+                if lot["unrealized_pnl"] is not None:
+                    unrealized_by_ticker[lot["ticker"]] = unrealized_by_ticker.get(lot["ticker"], 0) + lot["unrealized_pnl"]
+            return jsonify({
+                "method": method,
+                "ledger_version": version,
+                "realized": report["realized"],
+                "open_lots": open_lots,
+                "ignored_sells": report["ignored_sells"],
+                "totals": {
+                    "realized_pnl": sum(report["realized_by_ticker"].values()),
+                    "unrealized_pnl": sum(unrealized_by_ticker.values()),
+                    "realized_by_ticker": report["realized_by_ticker"],
+                    "unrealized_by_ticker": unrealized_by_ticker
+                }
+            }), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/portfolio/<string:portfolio_id>/analytics", methods=["GET"])
+    def get_analytics(portfolio_id):
+        """
+        Time-weighted return, volatility, Sharpe, max drawdown and beta over a
+        window of closed trading days (see analytics.py).
+
+        Query params:
+            window: 1m | 3m | 6m | 1y (default) | 3y | ytd | max
+        """
+        try:
+            if not hasattr(g, 'user') or g.user is None:
+                return jsonify({"error": "User not authenticated"}), 401
+            if not owns_portfolio(portfolio_id):
+                return jsonify({"error": "Portfolio not found or unauthorized"}), 404
+            window = request.args.get('window', '1y').lower()
+            if window not in ANALYTICS_WINDOWS:
+                return jsonify({"error": f"Invalid window. Use one of: {', '.join(ANALYTICS_WINDOWS)}"}), 400
+            analytics, version = get_portfolio_analytics(portfolio_id, window)
+            if version is None:
+                return jsonify({"error": "Portfolio not found or unauthorized"}), 404
+            if analytics is None:
+                return jsonify({"window": window, "metrics": None, "message": "No transactions found"}), 200
+            return jsonify(dict(analytics, ledger_version=version)), 200
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/portfolio/<string:portfolio_id>/risk", methods=["GET"])
+    def get_portfolio_risk_report(portfolio_id):
+        """
+        Return correlation matrix, variance contributions and 1-day 95%/99%
+        historical VaR of the current holdings (see analytics.py).
+
+        Query params:
+            window: 3m | 6m | 1y (default) | 3y
+        """
+        try:
+            if not hasattr(g, 'user') or g.user is None:
+                return jsonify({"error": "User not authenticated"}), 401
+            if not owns_portfolio(portfolio_id):
+                return jsonify({"error": "Portfolio not found or unauthorized"}), 404
+            window = request.args.get('window', '1y').lower()
+            if window not in RISK_WINDOWS:
+                return jsonify({"error": f"Invalid window. Use one of: {', '.join(RISK_WINDOWS)}"}), 400
+            return jsonify(get_portfolio_risk(portfolio_id, window)), 200
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
     @app.route("/api/portfolio/graph/<string:portfolio_id>", methods=["GET"])
     def get_portfolio_for_graph(portfolio_id):
         try:
             if not hasattr(g, 'user') or g.user is None:
                 return jsonify({"error": "User not authenticated"}), 401
-            portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=g.user.id).first()
-            if not portfolio:
+            if not owns_portfolio(portfolio_id):
                 return jsonify({"error": "Portfolio not found or unauthorized"}), 404
             portfolio_entries = PortfolioHolding.query.filter_by(portfolio_id=portfolio_id).all()
             portfolio_list = [{
@@ -449,22 +743,72 @@ def register_routes(app):
 
     @app.route("/api/transactions", methods=["GET"])
     def get_transactions():
+        """
+        Newest-first page of the portfolio's transactions.
+
+        Query params:
+            limit: page size (default 15, max 100)
+            cursor: next_cursor from the previous page
+            ticker, type (buy | sell), from, to (YYYY-MM-DD, inclusive): filters
+            method: lot relief for realized_pnl on sells - fifo | lifo | average (default)
+        """
         try:
             if not hasattr(g, 'user') or g.user is None:
                 return jsonify({"error": "User not authenticated"}), 401
-            portfolio = Portfolio.query.filter_by(user_id=g.user.id).first()
-            if not portfolio:
+            portfolio_id = g.portfolio_id
+            if not portfolio_id:
                 return jsonify({"error": "Portfolio not found"}), 404
-            transactions = Transaction.query.filter_by(portfolio_id=portfolio.id).order_by(Transaction.created_at.desc()).limit(15).all()
+            limit = min(max(request.args.get('limit', 15, type=int), 1), 100)
+            method = request.args.get('method', 'average').lower()
+            if method not in LOT_METHODS:
+                return jsonify({"error": f"Invalid method. Use one of: {', '.join(LOT_METHODS)}"}), 400
+            query = db.session.query(
+                Transaction.id, Transaction.ticker, Transaction.shares, Transaction.price,
+                Transaction.transaction_type, Transaction.created_at
+            ).filter(Transaction.portfolio_id == portfolio_id)
+
+            ticker = request.args.get('ticker')
+            if ticker:
+                query = query.filter(Transaction.ticker == ticker.upper())
+            transaction_type = request.args.get('type')
+            if transaction_type:
+                if transaction_type.lower() not in ('buy', 'sell'):
+                    return jsonify({"error": "Invalid type. Use buy or sell."}), 400
+                query = query.filter(Transaction.transaction_type == transaction_type.lower())
+            try:
+                if request.args.get('from'):
+                    query = query.filter(Transaction.created_at >= datetime.strptime(request.args['from'], "%Y-%m-%d"))
+                if request.args.get('to'):
+                    day_after = datetime.strptime(request.args['to'], "%Y-%m-%d") + timedelta(days=1)
+                    query = query.filter(Transaction.created_at < day_after)
+            except ValueError:
+                return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+
+            # Keyset pagination: continue strictly after the last row of the previous page
+            cursor = request.args.get('cursor')
+            if cursor:
+                try:
+                    cursor_created_at, cursor_id = decode_transaction_cursor(cursor)
+                except ValueError:
+                    return jsonify({"error": "Invalid cursor"}), 400
+                query = query.filter(db.tuple_(Transaction.created_at, Transaction.id) < (cursor_created_at, cursor_id))
+
+            rows = query.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(limit + 1).all()
+            page = rows[:limit]
+            next_cursor = encode_transaction_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None
+            # Realized P&L of sells comes from the cached lot report, not a per-page replay
+            report, _ = get_lot_report(portfolio_id, method)
+            realized = report["realized_by_transaction"] if report else {}
             transactions_list = [{
                 "id": txn.id,
                 "ticker": txn.ticker,
                 "shares": float(txn.shares),
                 "price": float(txn.price),
                 "transaction_type": txn.transaction_type,
-                "created_at": txn.created_at.isoformat()
-            } for txn in transactions]
-            return jsonify({"transactions": transactions_list}), 200
+                "created_at": txn.created_at.isoformat(),
+                "realized_pnl": realized.get(txn.id)
+            } for txn in page]
+            return jsonify({"transactions": transactions_list, "next_cursor": next_cursor}), 200
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
@@ -473,39 +817,20 @@ def register_routes(app):
         try:
             if not hasattr(g, 'user') or g.user is None:
                 return jsonify({"error": "User not authenticated"}), 401
-            portfolio = Portfolio.query.filter_by(user_id=g.user.id).first()
-            if not portfolio:
+            portfolio_id = g.portfolio_id
+            if not portfolio_id:
                 return jsonify({"error": "Portfolio not found"}), 404
-            transaction = Transaction.query.filter_by(id=transaction_id, portfolio_id=portfolio.id).first()
+            transaction = Transaction.query.filter_by(id=transaction_id, portfolio_id=portfolio_id).first()
             if not transaction:
                 return jsonify({"error": "Transaction not found"}), 404
             ticker = transaction.ticker
-            shares = float(transaction.shares)
-            price = float(transaction.price)
-            total_value = shares * price
-            holding = PortfolioHolding.query.filter_by(portfolio_id=portfolio.id, ticker=ticker).first()
-            if transaction.transaction_type.lower() == 'buy':
-                if holding:
-                    holding.shares -= shares
-                    holding.book_value -= total_value
-                    if holding.shares <= 0:
-                        db.session.delete(holding)
-            elif transaction.transaction_type.lower() == 'sell':
-                if holding:
-                    holding.shares += shares
-                    holding.book_value += total_value
-                else:
-                    new_holding = PortfolioHolding(
-                        id=str(uuid.uuid4()),
-                        portfolio_id=portfolio.id,
-                        ticker=ticker,
-                        shares=shares,
-                        average_cost=price,
-                        book_value=total_value
-                    )
-                    db.session.add(new_holding)
+            invalidate_valuations(portfolio_id, transaction.created_at)
             db.session.delete(transaction)
+            db.session.flush()
+            # Removing a trade changes the cost basis of everything after it: replay the ticker
+            recalc_portfolio(portfolio_id, ticker, commit=False)
             db.session.commit()
+            holding = PortfolioHolding.query.filter_by(portfolio_id=portfolio_id, ticker=ticker).first()
             return jsonify({
                 "message": "Transaction deleted successfully.",
                 "updated_portfolio": {
@@ -555,10 +880,10 @@ def register_routes(app):
         try:
             if not hasattr(g, 'user') or g.user is None:
                 return jsonify({"error": "User not authenticated"}), 401
-            portfolio = Portfolio.query.filter_by(user_id=g.user.id).first()
-            if not portfolio:
+            portfolio_id = g.portfolio_id
+            if not portfolio_id:
                 return jsonify({"error": "Portfolio not found"}), 404
-            return jsonify({"portfolio_id": portfolio.id}), 200
+            return jsonify({"portfolio_id": portfolio_id}), 200
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
@@ -577,88 +902,57 @@ def register_routes(app):
             return jsonify({"error": "No selected file"}), 400
 
         try:
-            # Read file content and create a StringIO stream.
-            content = file.read().decode("UTF8")
-            stream = StringIO(content, newline=None)
-
-            # Parse the CSV using the flexible mapping helper.
-            transactions = parse_csv_with_mapping(stream)
-            if not transactions:
-                return jsonify({"error": "No valid transactions found in the file"}), 400
-
             # Get the portfolio for the authenticated user using the provided portfolio_id.
-            portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=g.user.id).first()
-            if not portfolio:
+            if not owns_portfolio(portfolio_id):
                 return jsonify({"error": "Portfolio not found or unauthorized"}), 404
 
-            transactions_added = 0
-            errors = []
-            tickers_set = set()
+            # Large files would outlive the worker timeout: queue them as a background job.
+            file.stream.seek(0, os.SEEK_END)
+            size = file.stream.tell()
+            file.stream.seek(0)
+            if size > app.config['IMPORT_ASYNC_BYTES']:
+                job = enqueue_import(portfolio_id, file.filename, file.stream)
+                if app.config['IMPORT_INLINE_WORKER']:
+                    start_inline_worker(app, job.id)
+                return jsonify({
+                    "message": "File accepted for background import.",
+                    "job_id": job.id,
+                    "status_url": f"/api/jobs/{job.id}"
+                }), 202
 
-            for transaction in transactions:
-                # Normalize ticker.
-                ticker = transaction.get("ticker", "").strip().upper()
+            # Decode and parse the upload as a stream; rows are inserted in chunks as they arrive.
+            transactions = iter_csv_transactions(decode_lines(file.stream))
 
-                try:
-                    shares = float(transaction.get("shares", 0))
-                    price = float(transaction.get("price", 0))
-                except ValueError as e:
-                    errors.append(f"Invalid numeric values in transaction: {transaction}. Error: {str(e)}")
-                    continue
+            transactions_parsed = 0
+            errors = []
+            new_rows = []
+            fingerprint = RowFingerprinter()
+            # Rows actually inserted (rows already imported earlier are skipped by fingerprint)
+            inserted = []
 
-                transaction_type = transaction.get("transaction_type", "buy").strip().lower()
-
-                # Process the date if provided. We'll use it to override created_at.
-                transaction_date = transaction.get("date")
-                created_at_val = None
-                if transaction_date:
-                    # If the date is already a date/datetime object, combine with midnight if needed.
-                    if isinstance(transaction_date, datetime):
-                        created_at_val = transaction_date
-                    elif hasattr(transaction_date, "year"):
-                        created_at_val = datetime.combine(transaction_date, datetime.min.time())
-                    else:
-                        # Otherwise, try parsing from string (assumes formats like YYYY-MM-DD).
-                        try:
-                            created_at_val = datetime.strptime(transaction_date, "%Y-%m-%d")
-                        except Exception:
-                            # If parsing fails, leave created_at_val as None (default will be used).
-                            pass
-
-                if not ticker or shares <= 0 or price <= 0:
-                    errors.append(f"Invalid data in transaction: {transaction}")
+            for transaction in transactions:
+                transactions_parsed += 1
+                row, error = to_transaction_row(transaction)
+                if error:
+                    errors.append(error)
                     continue
 
-                tickers_set.add(ticker)
-
-                # Create the transaction record.
-                # If a CSV date is provided, override created_at.
-                if created_at_val is not None:
-                    new_txn = Transaction(
-                        portfolio_id=portfolio.id,
-                        ticker=ticker,
-                        shares=shares,
-                        price=price,
-                        transaction_type=transaction_type,
-                        created_at=created_at_val
-                    )
-                else:
-                    new_txn = Transaction(
-                        portfolio_id=portfolio.id,
-                        ticker=ticker,
-                        shares=shares,
-                        price=price,
-                        transaction_type=transaction_type
-                    )
+                new_rows.append(fingerprint(row))
+                if len(new_rows) >= UPLOAD_INSERT_CHUNK:
+                    inserted.extend(bulk_insert_transactions(portfolio_id, new_rows))
+                    new_rows = []
 
-                db.session.add(new_txn)
-                transactions_added += 1
+            if transactions_parsed == 0:
+                return jsonify({"error": "No valid transactions found in the file"}), 400
 
+            if new_rows:
+                inserted.extend(bulk_insert_transactions(portfolio_id, new_rows))
+            transactions_added = len(inserted)
             if transactions_added > 0:
+                # Only tickers with new rows are rebuilt; one commit for the whole file
+                invalidate_valuations(portfolio_id, min(created_at for _, created_at in inserted))
+                rebuild_holdings(portfolio_id, {ticker for ticker, _ in inserted})
                 db.session.commit()
-                # Recalculate portfolio holdings for each unique ticker.
-                for ticker in tickers_set:
-                    recalc_portfolio(portfolio.id, ticker)
 
             if errors:
                 return (
@@ -676,175 +970,136 @@ def register_routes(app):
             app.logger.error(f"Error processing CSV file: {str(e)}")
             return jsonify({"error": f"Error processing file: {str(e)}"}), 500
 
+    @app.route("/api/jobs/<string:job_id>", methods=["GET"])
+    def get_import_job(job_id):
+        """Progress of a background import: rows processed, errors and estimated time remaining."""
+        job = load_import_job(job_id)
+        if job is None or not owns_portfolio(job.portfolio_id):
+            return jsonify({"error": "Job not found"}), 404
+        # The worker that held the job died (e.g. a recycled gunicorn worker): resume it
+        # here; claim_import_job's SKIP LOCKED keeps concurrent polls from doubling up
+        if app.config['IMPORT_INLINE_WORKER'] and is_abandoned(job):
+            start_inline_worker(app, job.id)
+        return jsonify(job_status(job)), 200
+
     @app.route("/api/portfolio/<string:portfolio_id>/history", methods=["GET"])
     def get_portfolio_history(portfolio_id):
         """
         Calculates the portfolio's market value over time based on transaction history
-        and historical market prices using helper functions.
+        and historical market prices. Holdings and prices are evaluated as-of each
+        sampled date with vectorized array operations (see valuation.py).
         Returns data points for plotting a line chart of portfolio growth.
+
+        Query params:
+            interval: day | week | month (default: week)
+            since: cursor from a previous response; only later points are returned
         """
         try:
             if not hasattr(g, 'user') or g.user is None:
                 return jsonify({"error": "User not authenticated"}), 401
 
             # Verify the portfolio belongs to the user
-            portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=g.user.id).first()
-            if not portfolio:
+            if not owns_portfolio(portfolio_id):
                 return jsonify({"error": "Portfolio not found or unauthorized"}), 404
 
-            # Get all transactions sorted by date
-            transactions = Transaction.query.filter_by(portfolio_id=portfolio_id).order_by(Transaction.created_at).all()
+            interval = request.args.get('interval', 'week').lower()
+            if interval not in INTERVALS:
+                return jsonify({"error": f"Invalid interval. Use one of: {', '.join(INTERVALS)}"}), 400
 
-            if not transactions:
-                return jsonify({"history": [], "message": "No transactions found"}), 200
+            # Load the ledger (columns only) sorted by date
+            ledger = ledger_frame(load_ledger(portfolio_id))
 
-            # Find the date of the first transaction to establish our timeline start
-            start_date = transactions[0].created_at.date()
-            end_date = datetime.now().date()  # Use current date as end date
+            since = None
+            if request.args.get('since'):
+                try:
+                    since = datetime.strptime(request.args['since'], "%Y-%m-%d").date()
+                except ValueError:
+                    return jsonify({"error": "Invalid since date format. Use YYYY-MM-DD."}), 400
 
-            app.logger.info(f"Calculating portfolio history from {start_date} to {end_date}")
+            if ledger.empty:
+                return jsonify({"history": [], "cursor": None, "message": "No transactions found"}), 200
 
-            # Get all unique tickers in the portfolio
-            unique_tickers = set(txn.ticker for txn in transactions)
+            # Find the date of the first transaction to establish our timeline start
+            start_date = ledger["date"].iloc[0].date()
+            end_date = datetime.now().date()  # Use current date as end date
+            unique_tickers = sorted(ledger["ticker"].unique())
 
-            app.logger.info(f"Found {len(unique_tickers)} unique tickers: {', '.join(unique_tickers)}")
+            app.logger.info(f"Calculating {interval} portfolio history from {start_date} to {end_date} "
+                            f"for {len(unique_tickers)} tickers")
 
             # Get current holdings to use for the final data point
-            current_holdings = {}
-            portfolio_entries = PortfolioHolding.query.filter_by(portfolio_id=portfolio_id).all()
-
-            for entry in portfolio_entries:
-                current_holdings[entry.ticker] = float(entry.shares)
+            current_holdings = {
+                ticker: float(shares) for ticker, shares in
+                db.session.query(PortfolioHolding.ticker, PortfolioHolding.shares)
+                .filter(PortfolioHolding.portfolio_id == portfolio_id).all()
+            }
 
-            # Fetch real-time current market prices for current holdings
+            # Fetch real-time current market prices for current holdings in one batch
             current_market_prices = {}
-            for ticker, shares in current_holdings.items():
-                if shares <= 0:  # Skip positions with 0 shares
-                    continue
-
-                try:
-                    market_data = fetch_market_price(ticker)
-                    if market_data and "market_price" in market_data and market_data["market_price"] != "N/A":
-                        try:
-                            current_market_prices[ticker] = float(market_data["market_price"])
-                            app.logger.info(f"Current market price for {ticker}: ${current_market_prices[ticker]}")
-                        except (ValueError, TypeError):
-                            app.logger.warning(f"Invalid market price for {ticker}: {market_data['market_price']}")
-                    else:
-                        app.logger.warning(f"Market price for {ticker} not available")
-                except Exception as e:
-                    app.logger.error(f"Error fetching current market price for {ticker}: {e}")
-
-            # Fetch historical price data for each ticker
-            ticker_historical_prices = {}
-
-            for ticker in unique_tickers:
-                # Use the fetch_batch_historical_prices helper function
-                prices = fetch_batch_historical_prices(
-                    ticker,
-                    start_date.isoformat(),
-                    end_date.isoformat()
-                )
-                ticker_historical_prices[ticker] = prices
-
-                # Ensure we don't hit API rate limits
-                time.sleep(0.5)  # Add a small delay between API calls
+            held_tickers = [ticker for ticker, shares in current_holdings.items() if shares > 0]
+            try:
+                batch_quotes = fetch_market_prices(held_tickers)
+            except Exception as e:
+                app.logger.error(f"Error fetching current market prices: {e}")
+                batch_quotes = {}
+            for ticker in held_tickers:
+                market_data = batch_quotes.get(ticker)
+                if market_data and market_data.get("market_price") not in (None, "N/A"):
+                    try:
+                        current_market_prices[ticker] = float(market_data["market_price"])
+                    except (ValueError, TypeError):
+                        app.logger.warning(f"Invalid market price for {ticker}: {market_data['market_price']}")
+                else:
+                    app.logger.warning(f"Market price for {ticker} not available")
+
+            # Serve closed days from materialized snapshots and value only the
+            # sampled dates that have no snapshot yet
+            dates = sample_dates(start_date, end_date, interval)
+            # Closed days are settled; the cursor is the last of them (today's point is always re-sent)
+            cursor = dates[-1].date().isoformat() if len(dates) > 0 else None
+            if since:
+                cursor = max(cursor, since.isoformat()) if cursor else since.isoformat()
+                dates = dates[dates.date > since]
+            stored = load_valuations(portfolio_id, dates[0].date() if len(dates) > 0 else end_date, end_date - timedelta(days=1))
+            missing_dates = dates[[day.date() not in stored for day in dates]]
+            closes = None
+            computed = {}
+            if len(missing_dates) > 0:
+                # Daily closes with a few days of lookback so the first missing date
+                # can be priced as-of the previous close
+                closes = fetch_price_matrix(unique_tickers, missing_dates[0].date() - timedelta(days=7), end_date)
+                values, _, _ = value_history(ledger, closes, missing_dates)
+                computed = {day.date(): float(value) for day, value in values.items()}
+            app.logger.info(f"Served {len(dates) - len(missing_dates)} of {len(dates)} history points from snapshots")
 
-            # Create a day-by-day portfolio value calculation
             portfolio_history = []
-
-            # Sample dates - weekly intervals for past data points
-            sampling_rate = 7  # One data point per week
-
-            date_range = []
-            current_date = start_date
-            while current_date < end_date:  # Note: we'll handle end_date separately for current prices
-                date_range.append(current_date)
-                current_date += timedelta(days=sampling_rate)
-
-            # Process each sampled date
-            for current_date in date_range:
-                date_str = current_date.isoformat()
-
-                # Calculate holdings as of this date
-                holdings = defaultdict(float)  # ticker -> shares
-
-                # Apply all transactions up to and including this date
-                for txn in transactions:
-                    if txn.created_at.date() <= current_date:
-                        ticker = txn.ticker
-                        shares = float(txn.shares)
-
-                        if txn.transaction_type.lower() == 'buy':
-                            holdings[ticker] += shares
-                        elif txn.transaction_type.lower() == 'sell':
-                            holdings[ticker] -= shares
-
-                # Calculate portfolio value for this day using historical market prices
-                day_value = 0
-
-                for ticker, shares in holdings.items():
-                    if shares <= 0:
-                        continue
-
-                    # Try to get the market price for this ticker on this date
-                    price = None
-
-                    if date_str in ticker_historical_prices.get(ticker, {}):
-                        # Use price from our already fetched batch
-                        price = ticker_historical_prices[ticker][date_str]
-                    else:
-                        # Fetch individual price if not in batch (as a fallback)
-                        price = fetch_historical_price(ticker, date_str)
-
-                        if price is None:
-                            # If still no price, use the last transaction price for this ticker
-                            for t in reversed(transactions):
-                                if t.ticker == ticker and t.created_at.date() <= current_date:
-                                    price = float(t.price)
-                                    break
-
-                    # If a price was found, add to the day's value
-                    if price:
-                        day_value += shares * price
-                    else:
-                        app.logger.warning(f"No price found for {ticker} on {date_str}")
-
-                # Add data point for this day
+            for day in dates:
+                value = stored.get(day.date(), computed.get(day.date(), 0))
                 portfolio_history.append({
-                    "date": date_str,
-                    "value": round(day_value, 2),
-                    "market_value": round(day_value, 2)
+                    "date": day.date().isoformat(),
+                    "value": round(value, 2),
+                    "market_value": round(value, 2)
                 })
 
-            # Add current day using real-time market prices
+            # Add current day using real-time market prices, falling back to the last
+            # stored close and then the last transaction price
+            unpriced = [t for t in held_tickers if t not in current_market_prices]
+            if unpriced and closes is None:
+                closes = fetch_price_matrix(unpriced, end_date - timedelta(days=14), end_date)
+            last_closes = closes.ffill().iloc[-1] if closes is not None and not closes.empty else pd.Series(dtype=float)
+            last_trade_prices = ledger.groupby("ticker")["price"].last()
             current_day_value = 0
-
             for ticker, shares in current_holdings.items():
                 if shares <= 0:
                     continue
-
-                if ticker in current_market_prices:
-                    # Use real-time market price
-                    price = current_market_prices[ticker]
-                    current_day_value += shares * price
-                else:
-                    # Fallback if real-time price not available
+                price = current_market_prices.get(ticker)
+                if price is None:
                     app.logger.warning(f"No current market price available for {ticker}, using fallback")
-
-                    # Try historical prices first
-                    latest_prices = ticker_historical_prices.get(ticker, {})
-                    if latest_prices:
-                        latest_date = max(latest_prices.keys())
-                        price = latest_prices[latest_date]
-                        current_day_value += shares * price
-                    else:
-                        # Last resort: use transaction price
-                        for t in reversed(transactions):
-                            if t.ticker == ticker:
-                                price = float(t.price)
-                                current_day_value += shares * price
-                                break
+                    price = last_closes.get(ticker)
+                    if price is None or pd.isna(price):
+                        price = last_trade_prices.get(ticker)
+                if price is not None and not pd.isna(price):
+                    current_day_value += shares * float(price)
 
             # Add current day data point
             portfolio_history.append({
@@ -858,6 +1113,8 @@ def register_routes(app):
 
             return jsonify({
                 "history": portfolio_history,
+                "interval": interval,
+                "cursor": cursor,
                 "message": "Portfolio history with current market values",
                 "total_value": round(current_day_value, 2)
             }), 200
@@ -881,12 +1138,12 @@ def register_routes(app):
                 return jsonify({"error": "Question is required"}), 400
 
             # Get the user's portfolio (removed is_default filter since Portfolio doesn't have it)
-            portfolio = Portfolio.query.filter_by(user_id=g.user.id).first()
-            if not portfolio:
+            portfolio_id = g.portfolio_id
+            if not portfolio_id:
                 return jsonify({"error": "No portfolio found for this user"}), 404
 
             # Retrieve portfolio holdings and benchmarks
-            portfolio_entries = PortfolioHolding.query.filter_by(portfolio_id=portfolio.id).all()
+            portfolio_entries = PortfolioHolding.query.filter_by(portfolio_id=portfolio_id).all()
             benchmarks = fetch_market_benchmarks()
 
             if not portfolio_entries:
@@ -1050,15 +1307,15 @@ def register_routes(app):
                 return jsonify({"error": "Thread not found or unauthorized"}), 404
 
             # Check if any portfolio holdings have been updated since thread creation
-            portfolio = Portfolio.query.filter_by(user_id=g.user.id).first()
-            if portfolio:
+            portfolio_id = g.portfolio_id
+            if portfolio_id:
                 # Find the most recently updated holding
                 latest_holding_update = db.session.query(db.func.max(PortfolioHolding.updated_at)) \
-                    .filter(PortfolioHolding.portfolio_id == portfolio.id).scalar()
+                    .filter(PortfolioHolding.portfolio_id == portfolio_id).scalar()
 
                 # Check for new transactions since thread creation
                 latest_transaction = db.session.query(db.func.max(Transaction.created_at)) \
-                    .filter(Transaction.portfolio_id == portfolio.id).scalar()
+                    .filter(Transaction.portfolio_id == portfolio_id).scalar()
 
                 # If holdings were updated or new transactions added after thread creation
                 if (latest_holding_update and latest_holding_update > user_thread.created_at) or \
@@ -0,0 +1,111 @@
+# series.py
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of the threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the point
+    kept from the previous bucket and the mean of the next bucket.
+
+    Args:
+        x (ndarray): Increasing x values
+        y (ndarray): y values
+        threshold (int): Number of points to keep
+
+    Returns:
+        ndarray: Sorted indices of the points to keep
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket boundaries over the interior points [1, n - 1)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    edges[-1] = n - 1
+    starts, ends = edges[:-1], edges[1:]
+
+    # Mean of every bucket in one pass via prefix sums; the last point acts as the final "next bucket"
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    counts = ends - starts
+    mean_x = np.append((cx[ends] - cx[starts]) / counts, x[-1])
+    mean_y = np.append((cy[ends] - cy[starts]) / counts, y[-1])
+
+    # Pad buckets into a (buckets x width) matrix so each step is a row-wise argmax
+    width = counts.max()
+    cols = starts[:, None] + np.arange(width)[None, :]
+    valid = cols < ends[:, None]
+    cols = np.where(valid, cols, ends[:, None] - 1)
+    bx, by = x[cols], y[cols]
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(len(starts)):
+        # Twice the triangle area; the 1/2 factor does not change the argmax
+        area = np.abs((x[a] - mean_x[i + 1]) * (by[i] - y[a]) - (x[a] - bx[i]) * (mean_y[i + 1] - y[a]))
+        area[~valid[i]] = -1.0
+        a = cols[i, int(np.argmax(area))]
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_series(dates, values, points=None, start=None, end=None):
+    """
+    Slice a date-sorted series to [start, end] and reduce it to at most `points` points with LTTB.
+
+    Args:
+        dates (list): ISO date strings in ascending order
+        values (list): Values aligned with dates (numeric or numeric strings)
+        points (int): Maximum points to return (None keeps every point in range)
+        start (str): Inclusive lower date bound (YYYY-MM-DD)
+        end (str): Inclusive upper date bound (YYYY-MM-DD)
+
+    Returns:
+        tuple: (dates, values) lists
+    """
+    stamps = pd.to_datetime(pd.Index(dates))
+    lo = stamps.searchsorted(pd.Timestamp(start), side="left") if start else 0
+    hi = stamps.searchsorted(pd.Timestamp(end), side="right") if end else len(stamps)
+    dates, values = list(dates[lo:hi]), list(values[lo:hi])
+    if not points or len(dates) <= points:
+        return dates, values
+
+    x = stamps[lo:hi].asi8 / 86_400e9  # days since epoch
+    y = pd.to_numeric(pd.Series(values), errors="coerce").ffill().bfill().to_numpy(dtype=float)
+    keep = lttb_indices(x, y, points)
+    return [dates[i] for i in keep], [values[i] for i in keep]
+
+
+def series_since(dates, values, since=None):
+    """
+    Delta of a date-sorted series for a client that already holds everything up to `since`.
+
+    The latest point is treated as provisional (today's or this week's bar keeps
+    changing until it closes), so the returned cursor is the last settled date and
+    the next delta re-sends the provisional point. Clients drop what they hold after
+    `since` and append the returned points.
+
+    Args:
+        dates (list): ISO date strings in ascending order
+        values (list): Values aligned with dates
+        since (str): Last cursor returned to the client (YYYY-MM-DD), or None for the full series
+
+    Returns:
+        tuple: (dates, values, cursor)
+    """
+    stamps = pd.to_datetime(pd.Index(dates))
+    lo = stamps.searchsorted(pd.Timestamp(since), side="right") if since else 0
+    cursor = dates[-2] if len(dates) >= 2 else since
+    if since and (cursor is None or pd.Timestamp(cursor) < pd.Timestamp(since)):
+        cursor = since
+    return list(dates[lo:]), list(values[lo:]), cursor
@@ -0,0 +1,29 @@
+# startup.py
+# Imported first by app.py so the timer covers every import made while booting.
+import os
+import resource
+import time
+
+STARTED_AT = time.perf_counter()
+STARTED_WALL = time.time()
+
+
+def rss_mb():
+    """Current resident memory of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def startup_report(imports_done_at, app_ready_at):
+    """Boot timings (seconds) and memory for the startup log line and /api/metrics."""
+    return {
+        "pid": os.getpid(),
+        "imports_seconds": round(imports_done_at - STARTED_AT, 3),
+        "create_app_seconds": round(app_ready_at - imports_done_at, 3),
+        "total_seconds": round(app_ready_at - STARTED_AT, 3),
+        "rss_mb": rss_mb()
+    }
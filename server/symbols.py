@@ -0,0 +1,179 @@
+# symbols.py
+import bisect
+import csv
+import os
+import re
+import threading
+import time
+
+from config import Config
+
+NASDAQ_TRADED_URL = "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqtraded.txt"
+
+# Listing exchange codes used in nasdaqtraded.txt
+EXCHANGES = {
+    "A": "NYSE American",
+    "N": "NYSE",
+    "P": "NYSE ARCA",
+    "Q": "NASDAQ",
+    "V": "IEX",
+    "Z": "Cboe BZX"
+}
+
+_WORD_RE = re.compile(r"[a-z0-9&']+")
+
+
+def _deletions(symbol):
+    """All strings formed by dropping one character (used for typo-tolerant ticker lookups)."""
+    return {symbol[:i] + symbol[i + 1:] for i in range(len(symbol))}
+
+
+class SymbolIndex:
+    """
+    In-memory symbol/company-name index.
+
+    Ranking: exact ticker, ticker prefix (shortest first), company-name prefix,
+    company-name word prefix, then tickers one typo away from the query. Each
+    result carries the tier it matched in ("match"), so callers can treat
+    typo-only matches as suggestions rather than hits.
+    """
+
+    def __init__(self, rows):
+        self.entries = []
+        self.by_symbol = {}
+        for symbol, name, exchange in rows:
+            symbol = symbol.strip().upper()
+            if not symbol or symbol in self.by_symbol:
+                continue
+            self.by_symbol[symbol] = len(self.entries)
+            self.entries.append({"symbol": symbol, "name": name.strip(), "exchange": exchange.strip()})
+
+        self._symbols = sorted((e["symbol"], i) for i, e in enumerate(self.entries))
+        self._symbol_keys = [s for s, _ in self._symbols]
+        self._names = sorted((e["name"].lower(), i) for i, e in enumerate(self.entries))
+        self._name_keys = [n for n, _ in self._names]
+        words = set()
+        for i, e in enumerate(self.entries):
+            for word in _WORD_RE.findall(e["name"].lower()):
+                words.add((word, i))
+        self._words = sorted(words)
+        self._word_keys = [w for w, _ in self._words]
+        self._fuzzy = {}
+        for i, e in enumerate(self.entries):
+            for variant in _deletions(e["symbol"]) | {e["symbol"]}:
+                self._fuzzy.setdefault(variant, []).append(i)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _prefix_scan(keys, pairs, prefix, cap):
+        start = bisect.bisect_left(keys, prefix)
+        matches = []
+        for key, idx in pairs[start:start + cap]:
+            if not key.startswith(prefix):
+                break
+            matches.append(idx)
+        return matches
+
+    def search(self, query, limit=5, scan_cap=200):
+        """
+        Return up to `limit` entries ({"symbol", "name", "exchange", "match"}) best
+        matching the query; match is exact, prefix, name, word or fuzzy.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        upper, lower = query.upper(), query.lower()
+        results = []
+        seen = set()
+
+        def take(indices, match):
+            for idx in indices:
+                if idx not in seen:
+                    seen.add(idx)
+                    results.append(dict(self.entries[idx], match=match))
+            return len(results) >= limit
+
+        exact = self.by_symbol.get(upper)
+        if exact is not None and take([exact], "exact"):
+            return results[:limit]
+
+        prefix = self._prefix_scan(self._symbol_keys, self._symbols, upper, scan_cap)
+        prefix.sort(key=lambda idx: (len(self.entries[idx]["symbol"]), self.entries[idx]["symbol"]))
+        if take(prefix, "prefix"):
+            return results[:limit]
+
+        if take(self._prefix_scan(self._name_keys, self._names, lower, scan_cap), "name"):
+            return results[:limit]
+
+        if " " not in lower and take(self._prefix_scan(self._word_keys, self._words, lower, scan_cap), "word"):
+            return results[:limit]
+
+        fuzzy = set()
+        for variant in _deletions(upper) | {upper}:
+            fuzzy.update(self._fuzzy.get(variant, ()))
+        take(sorted(fuzzy, key=lambda idx: self.entries[idx]["symbol"]), "fuzzy")
+        return results[:limit]
+
+
+def load_symbol_index(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        rows = [(row["symbol"], row.get("name", ""), row.get("exchange", "")) for row in reader]
+    return SymbolIndex(rows)
+
+
+_index = None
+_index_mtime = None
+_index_checked = 0.0
+_index_lock = threading.Lock()
+
+
+def get_symbol_index():
+    """
+    Return the process-wide index, loading it on first use and reloading it when
+    the listing file has been replaced (checked at most every SYMBOL_INDEX_RECHECK seconds).
+    """
+    global _index, _index_mtime, _index_checked
+    now = time.monotonic()
+    if _index is not None and now - _index_checked < Config.SYMBOL_INDEX_RECHECK:
+        return _index
+    with _index_lock:
+        path = Config.SYMBOL_LISTING_PATH
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        if _index is None or (mtime is not None and mtime != _index_mtime):
+            _index = load_symbol_index(path) if mtime is not None else SymbolIndex([])
+            _index_mtime = mtime
+        _index_checked = now
+        return _index
+
+
+def parse_nasdaq_traded(text):
+    """Parse nasdaqtraded.txt into (symbol, name, exchange) rows, skipping test issues."""
+    lines = text.splitlines()
+    reader = csv.DictReader((line for line in lines if not line.startswith("File Creation Time")), delimiter="|")
+    rows = []
+    for row in reader:
+        symbol = (row.get("Symbol") or "").strip()
+        if not symbol or row.get("Test Issue") == "Y" or "$" in symbol:
+            continue
+        # Yahoo/finviz spell share classes with a dash (BRK-B rather than BRK.B)
+        symbol = symbol.replace(".", "-")
+        name = (row.get("Security Name") or "").split(" - ")[0].strip()
+        exchange = EXCHANGES.get(row.get("Listing Exchange", ""), row.get("Listing Exchange", ""))
+        rows.append((symbol, name, exchange))
+    return rows
+
+
+def write_symbol_listing(rows, path):
+    """Atomically replace the listing file so running workers never read a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["symbol", "name", "exchange"])
+        writer.writerows(sorted(rows))
+    os.replace(tmp_path, path)
@@ -0,0 +1,7 @@
+# conftest.py
+import os
+import sys
+
+# Modules live flat in server/ and read required settings at import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STOCKR_ALPHA_ID", "test")
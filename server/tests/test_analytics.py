@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+from analytics import (TRADING_DAYS, daily_returns, return_metrics, pairwise_covariance, historical_var,
+                       compute_risk, compute_analytics)
+from valuation import ledger_frame
+
+
+def test_return_metrics_twr_and_drawdown():
+    dates = pd.bdate_range("2024-01-01", periods=5)
+    returns = pd.Series([np.nan, 0.10, -0.20, 0.05, np.nan], index=dates)
+    metrics = return_metrics(returns)
+    assert metrics["observations"] == 3
+    assert metrics["twr"] == pytest.approx(1.1 * 0.8 * 1.05 - 1)
+    assert metrics["max_drawdown"] == pytest.approx(-0.20)
+    assert metrics["drawdown_peak"] == "2024-01-02"
+    assert metrics["drawdown_trough"] == "2024-01-03"
+    # Under a year of returns: no annualized figure
+    assert metrics["annualized_return"] is None
+    assert metrics["volatility"] == pytest.approx(np.std([0.10, -0.20, 0.05], ddof=1) * np.sqrt(TRADING_DAYS))
+
+
+def test_return_metrics_annualizes_a_full_year():
+    dates = pd.bdate_range("2023-01-02", periods=2 * TRADING_DAYS)
+    returns = pd.Series(0.001, index=dates)
+    metrics = return_metrics(returns)
+    assert metrics["annualized_return"] == pytest.approx(1.001 ** TRADING_DAYS - 1)
+
+
+def test_return_metrics_beta():
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range("2024-01-01", periods=300)
+    benchmark = pd.Series(rng.normal(0, 0.01, len(dates)), index=dates)
+    returns = 1.5 * benchmark + rng.normal(0, 0.001, len(dates))
+    metrics = return_metrics(returns, benchmark)
+    assert metrics["beta"] == pytest.approx(np.polyfit(benchmark, returns, 1)[0], rel=1e-9)
+    assert metrics["benchmark_return"] == pytest.approx(np.prod(1 + benchmark.to_numpy()) - 1)
+
+
+def test_return_metrics_needs_two_returns():
+    metrics = return_metrics(pd.Series([np.nan, 0.01], index=pd.bdate_range("2024-01-01", periods=2)))
+    assert metrics["observations"] == 1
+    assert metrics["twr"] is None
+
+
+def test_daily_returns_exclude_cash_flows():
+    ledger = ledger_frame([
+        ("AAA", datetime(2024, 1, 1), 10, 100.0, "buy"),
+        ("AAA", datetime(2024, 1, 3), 10, 110.0, "buy"),
+        ("AAA", datetime(2024, 1, 4), 5, 121.0, "sell"),
+    ])
+    dates = pd.bdate_range("2024-01-01", "2024-01-05")
+    closes = pd.DataFrame({"AAA": [100.0, 110.0, 110.0, 121.0, 121.0]}, index=dates)
+    returns, values = daily_returns(ledger, closes, dates)
+    assert values.tolist() == [1000.0, 1100.0, 2200.0, 1815.0, 1815.0]
+    assert np.isnan(returns.iloc[0])
+    # Buying or selling at the close is not a gain or a loss
+    assert returns.iloc[1:].tolist() == pytest.approx([0.10, 0.0, 0.10, 0.0])
+
+
+def test_pairwise_covariance_matches_pandas():
+    rng = np.random.default_rng(11)
+    returns = rng.normal(0, 0.02, (120, 4))
+    returns[:30, 2] = np.nan
+    returns[rng.random((120, 4)) < 0.05] = np.nan
+    frame = pd.DataFrame(returns)
+    covariance, correlation = pairwise_covariance(returns)
+    np.testing.assert_allclose(covariance, frame.cov().to_numpy(), rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(correlation, frame.corr().to_numpy(), rtol=1e-9, atol=1e-12)
+
+
+def test_pairwise_covariance_undefined_pairs_are_nan():
+    returns = np.array([[0.01, np.nan], [0.02, np.nan], [0.03, 0.01]])
+    covariance, correlation = pairwise_covariance(returns)
+    assert np.isnan(covariance[0, 1]) and np.isnan(covariance[1, 1])
+    assert np.isnan(correlation[0, 1])
+
+
+def test_historical_var():
+    returns = np.array([-0.05, -0.02, 0.0, 0.01, 0.03, np.nan])
+    var = historical_var(returns, (0.95, 0.99))
+    assert var[0.95] == pytest.approx(-np.percentile(returns[:-1], 5))
+    assert var[0.99] == pytest.approx(-np.percentile(returns[:-1], 1))
+    # Gains only: no loss to report
+    assert historical_var(np.array([0.01, 0.02]))[0.95] == 0.0
+    assert historical_var(np.array([np.nan])) == {0.95: None, 0.99: None}
+
+
+def test_compute_risk_uses_one_sample(monkeypatch):
+    today = datetime.now().date()
+    dates = pd.bdate_range(today - timedelta(days=120), today - timedelta(days=1))
+    rng = np.random.default_rng(5)
+    closes = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0, 0.01, (len(dates), 3)), axis=0),
+                          index=dates.date, columns=["AAA", "BBB", "CCC"])
+    closes.iloc[:40, 2] = np.nan  # listed later
+    closes.iloc[60, 1] = np.nan   # missing close
+    monkeypatch.setattr(analytics, "fetch_price_matrix", lambda tickers, start, end: closes.reindex(columns=tickers))
+
+    report = compute_risk((("AAA", 10.0), ("BBB", 5.0), ("CCC", 3.0), ("ZZZ", 1.0)), "3m")
+    assert report["excluded"] == ["ZZZ"]
+    assert report["tickers"] == ["AAA", "BBB", "CCC"]
+
+    # The window plus the last close before it, restricted to days every ticker closed
+    start = pd.Timestamp(report["start"]).date()
+    base = max(day for day in closes.index if day < start)
+    complete = closes[closes.index >= base].dropna()
+    returns = complete.pct_change().dropna().to_numpy()
+    assert report["observations"] == len(returns)
+
+    weights = np.array([report["weights"][t] for t in report["tickers"]])
+    expected_vol = np.sqrt(weights @ np.cov(returns, rowvar=False) @ weights * TRADING_DAYS)
+    assert report["volatility"] == pytest.approx(expected_vol, rel=1e-4)
+    assert sum(report["variance_contributions"].values()) == pytest.approx(1.0, abs=1e-5)
+    assert report["var"]["95"]["return"] == pytest.approx(-np.percentile(returns @ weights, 5), abs=1e-4)
+
+
+def test_compute_analytics_keeps_the_first_day_of_the_window(monkeypatch):
+    today = datetime.now().date()
+    days = pd.bdate_range(today - timedelta(days=60), today - timedelta(days=1))
+    closes = pd.DataFrame({"AAA": np.linspace(100.0, 130.0, len(days)),
+                           "^GSPC": np.linspace(4000.0, 4200.0, len(days))}, index=days.date)
+    ledger = [("AAA", datetime.combine(days[0].date(), datetime.min.time()), 10, 100.0, "buy")]
+    monkeypatch.setattr(analytics, "load_ledger", lambda portfolio_id: ledger)
+    monkeypatch.setattr(analytics, "fetch_price_matrix", lambda tickers, start, end: closes.reindex(columns=tickers))
+    monkeypatch.setattr(analytics.Config, "ANALYTICS_BENCHMARK", "^GSPC")
+
+    report = compute_analytics("p1", "1m")
+    window = days[days >= pd.Timestamp(report["start"])]
+    assert report["metrics"]["observations"] == len(window)
+    start_value = closes["AAA"][days[days < window[0]][-1].date()]
+    assert report["metrics"]["twr"] == pytest.approx(closes["AAA"].iloc[-1] / start_value - 1)
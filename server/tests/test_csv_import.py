@@ -0,0 +1,79 @@
+import io
+from datetime import date, datetime
+
+from csv_import import build_column_plan, infer_date_format, iter_csv_transactions, decode_lines, RowFingerprinter
+
+
+def test_column_plan_maps_known_headers():
+    headers = ["Date", "Symbol", "Action", "Quantity", "Price", "Notes"]
+    plan = build_column_plan(headers, "generic")
+    assert sorted(plan["fields"]) == sorted([
+        ("date", 0), ("ticker", 1), ("transaction_type", 2), ("shares", 3), ("price", 4)
+    ])
+    assert plan["ticker_fallback"] == []
+
+
+def test_column_plan_falls_back_to_description_columns():
+    headers = ["Trade Date", "Symbol / Description", "Type", "Units", "Unit Price"]
+    plan = build_column_plan(headers, "generic")
+    assert not any(target == "ticker" for target, _ in plan["fields"])
+    assert plan["ticker_fallback"] == [1]
+
+
+def test_column_plan_questrade_profile():
+    headers = ["Trade Date", "Action", "Symbol", "Quantity", "Price", "CurrencyCode_Group_Account"]
+    plan = dict((target, i) for target, i in build_column_plan(headers, "questrade")["fields"])
+    assert plan["transaction_type"] == 1
+    assert plan["date"] == 0
+
+
+def test_infer_date_format_uses_the_whole_sample():
+    # 03/04 is ambiguous; 25/04 rules out month-first
+    assert infer_date_format(["03/04/2024", "25/04/2024"]) == "%d/%m/%Y"
+    assert infer_date_format(["03/04/2024", "12/25/2024"]) == "%m/%d/%Y"
+    assert infer_date_format(["2024-01-31", "", "  "]) == "%Y-%m-%d"
+    assert infer_date_format(["not a date"]) is None
+
+
+def test_iter_csv_transactions_maps_and_filters_rows():
+    data = (
+        "\ufeffDate,Symbol,Action,Quantity,Price\n"
+        "03/04/2024,AAPL,Buy,10,150.5\n"
+        "25/04/2024,MSFT,Sold,-2,300\n"
+        "26/04/2024,,Buy,1,10\n"
+        "27/04/2024,TSLA,Buy,0,10\n"
+    ).encode()
+    rows = list(iter_csv_transactions(decode_lines(io.BytesIO(data))))
+    assert rows == [
+        {"date": date(2024, 4, 3), "ticker": "AAPL", "transaction_type": "buy", "shares": 10.0, "price": 150.5},
+        {"date": date(2024, 4, 25), "ticker": "MSFT", "transaction_type": "sell", "shares": 2.0, "price": 300.0},
+    ]
+
+
+def test_iter_csv_transactions_infers_from_sample_only():
+    # The format is settled from the first row; later rows in another format still parse
+    lines = ["Date,Ticker,Shares,Price\n", "2024-01-05,AAPL,1,10\n", "01/02/2024,AAPL,1,10\n"]
+    rows = list(iter_csv_transactions(lines, sample_size=1))
+    assert [row["date"] for row in rows] == [date(2024, 1, 5), date(2024, 1, 2)]
+    assert all(row["transaction_type"] == "buy" for row in rows)
+
+
+def dated_row(created_at=datetime(2024, 1, 5)):
+    return {"ticker": "AAPL", "shares": 1.0, "price": 10.0, "transaction_type": "buy", "created_at": created_at}
+
+
+def test_fingerprints_recognise_reuploads_but_keep_repeated_fills():
+    first = RowFingerprinter()
+    fills = [first(dated_row())["fingerprint"], first(dated_row())["fingerprint"]]
+    assert fills[0] != fills[1]
+    again = RowFingerprinter(scope="another-job")
+    assert [again(dated_row())["fingerprint"], again(dated_row())["fingerprint"]] == fills
+
+
+def test_undated_rows_are_not_deduplicated_across_uploads():
+    # They are stamped with the insert time, so a later upload is a new trade
+    assert RowFingerprinter()(dated_row(None))["fingerprint"] is None
+    job = RowFingerprinter(scope="job-1")(dated_row(None))["fingerprint"]
+    assert job is not None
+    assert RowFingerprinter(scope="job-1")(dated_row(None))["fingerprint"] == job
+    assert RowFingerprinter(scope="job-2")(dated_row(None))["fingerprint"] != job
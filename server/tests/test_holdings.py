@@ -0,0 +1,13 @@
+from helpers import _stored_amount, replay_holding
+
+
+def test_stored_amount_rounds_like_numeric_12_2():
+    assert _stored_amount(10.005) == 10.01
+    assert _stored_amount(0.125) == 0.13
+    assert _stored_amount(3) == 3.0
+
+
+def test_incremental_book_value_matches_the_replay():
+    # The buy is stored as 100 @ 10.01; the holding must be valued the same way
+    shares, price = _stored_amount(100), _stored_amount(10.005)
+    assert replay_holding([(shares, price, "buy")])[2] == shares * price == 1001.0
@@ -0,0 +1,90 @@
+import sys
+import types
+
+import requests
+
+import http_client
+from config import Config
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def get(self, url, **kwargs):
+        return FakeResponse(self.statuses.pop(0))
+
+
+def test_retries_take_a_limiter_token_per_attempt(monkeypatch):
+    taken = []
+    monkeypatch.setattr(http_client, "get_session", lambda: FakeSession([503, 503, 200]))
+    monkeypatch.setattr(http_client, "acquire", taken.append)
+    monkeypatch.setattr(Config, "HTTP_BACKOFF", 0)
+
+    response = http_client.get("https://www.alphavantage.co/query", retries=2, limiter="alphavantage")
+
+    assert response.status_code == 200
+    assert taken == ["alphavantage"] * 3
+
+
+def test_no_limiter_takes_no_token(monkeypatch):
+    taken = []
+    monkeypatch.setattr(http_client, "get_session", lambda: FakeSession([200]))
+    monkeypatch.setattr(http_client, "acquire", taken.append)
+
+    assert http_client.get("https://example.com").status_code == 200
+    assert taken == []
+
+
+def test_library_session_applies_timeouts_retries_and_metrics(monkeypatch):
+    statuses = [502, 200]
+    calls = []
+
+    def fake_request(self, method, url, *args, **kwargs):
+        calls.append(kwargs["timeout"])
+        return FakeResponse(statuses.pop(0))
+
+    monkeypatch.setattr(requests.Session, "request", fake_request)
+    monkeypatch.setattr(Config, "HTTP_BACKOFF", 0)
+    before = http_client.host_metrics().get("query1.finance.yahoo.com", {"requests": 0})["requests"]
+
+    response = http_client.LibrarySession().get("https://query1.finance.yahoo.com/v8/finance/chart/AAPL")
+
+    assert response.status_code == 200
+    assert calls == [(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)] * 2
+    assert http_client.host_metrics()["query1.finance.yahoo.com"]["requests"] == before + 2
+
+
+def test_library_session_keeps_caller_timeouts_and_does_not_retry_posts(monkeypatch):
+    calls = []
+
+    def fake_request(self, method, url, *args, **kwargs):
+        calls.append((method, kwargs["timeout"]))
+        return FakeResponse(503)
+
+    monkeypatch.setattr(requests.Session, "request", fake_request)
+    monkeypatch.setattr(Config, "HTTP_BACKOFF", 0)
+    session = http_client.LibrarySession()
+    assert session.get("https://finviz.com/news.ashx", timeout=10).status_code == 503
+    assert session.post("https://example.com/form").status_code == 503
+    assert calls[0] == ("GET", 10) and len(calls) == 2 + Config.HTTP_RETRIES
+
+
+def test_route_finviz_replaces_the_module_session(monkeypatch):
+    package, util = types.ModuleType("finvizfinance"), types.ModuleType("finvizfinance.util")
+    util.session = requests.Session()
+    package.util = util
+    monkeypatch.setitem(sys.modules, "finvizfinance", package)
+    monkeypatch.setitem(sys.modules, "finvizfinance.util", util)
+
+    http_client.route_finviz()
+
+    assert util.session.get.__self__ is http_client.library_session()
@@ -0,0 +1,50 @@
+from datetime import date, datetime
+
+from ledger_index import LedgerIndex
+from helpers import replay_holding
+
+ROWS = [
+    ("AAPL", datetime(2024, 1, 2, 10, 0), 10, 100.0, "buy"),
+    ("MSFT", datetime(2024, 1, 2, 11, 0), 5, 300.0, "buy"),
+    ("AAPL", datetime(2024, 1, 3, 9, 30), 10, 120.0, "buy"),
+    ("AAPL", datetime(2024, 1, 3, 15, 0), 5, 130.0, "sell"),
+    ("MSFT", datetime(2024, 1, 4, 10, 0), 50, 310.0, "sell"),  # oversell, ignored
+    ("MSFT", datetime(2024, 1, 5, 10, 0), 5, 320.0, "sell"),
+]
+
+
+def as_dict(holdings):
+    return {h["ticker"]: (h["shares"], h["average_cost"], h["book_value"]) for h in holdings}
+
+
+def test_before_the_first_trade_holds_nothing():
+    index = LedgerIndex(ROWS)
+    assert index.holdings_as_of(date(2024, 1, 1)) == []
+    assert index.holdings_as_of(datetime(2024, 1, 2, 9, 59)) == []
+
+
+def test_a_date_includes_the_whole_day():
+    index = LedgerIndex(ROWS)
+    holdings = as_dict(index.holdings_as_of(date(2024, 1, 3)))
+    assert holdings["AAPL"] == (15.0, 110.0, 1650.0)
+    # Mid-day datetimes only see earlier transactions
+    assert as_dict(index.holdings_as_of(datetime(2024, 1, 3, 12, 0)))["AAPL"] == (20.0, 110.0, 2200.0)
+
+
+def test_exact_timestamp_is_included():
+    index = LedgerIndex(ROWS)
+    assert "MSFT" in as_dict(index.holdings_as_of(datetime(2024, 1, 2, 11, 0)))
+
+
+def test_oversell_is_ignored_and_closed_positions_are_dropped():
+    index = LedgerIndex(ROWS)
+    assert as_dict(index.holdings_as_of(date(2024, 1, 4)))["MSFT"] == (5.0, 300.0, 1500.0)
+    assert "MSFT" not in as_dict(index.holdings_as_of(date(2024, 1, 5)))
+
+
+def test_matches_a_full_replay():
+    index = LedgerIndex(ROWS)
+    assert len(index) == len(ROWS)
+    for ticker, (shares, average_cost, book_value) in as_dict(index.holdings_as_of(date(2030, 1, 1))).items():
+        ledger = [(s, p, kind) for t, _, s, p, kind in ROWS if t == ticker]
+        assert replay_holding(ledger) == (shares, average_cost, book_value)
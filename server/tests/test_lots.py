@@ -0,0 +1,106 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from lots import compute_lots, METHODS
+from helpers import replay_holding
+
+
+def random_ledger(seed, tickers=("AAA", "BBB"), size=200):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(size):
+        kind = "buy" if rng.random() < 0.55 else "sell"
+        rows.append((i, rng.choice(tickers), start + timedelta(hours=i),
+                     rng.randint(1, 40), round(rng.uniform(5, 500), 2), kind))
+    return rows
+
+
+def naive_relief(rows, pick):
+    """Walk the lots one share block at a time; pick chooses the lot a sell draws from."""
+    lots = {}
+    realized = {}
+    for txn_id, ticker, _, shares, price, kind in rows:
+        open_lots = lots.setdefault(ticker, [])
+        if kind == "buy":
+            open_lots.append([shares, price])
+        elif sum(lot[0] for lot in open_lots) >= shares:
+            to_fill, cost = shares, 0.0
+            while to_fill > 1e-9:
+                lot = open_lots[pick]
+                take = min(lot[0], to_fill)
+                cost += take * lot[1]
+                lot[0] -= take
+                to_fill -= take
+                if lot[0] <= 1e-9:
+                    open_lots.pop(pick)
+            realized[txn_id] = shares * price - cost
+    return realized, lots
+
+
+@pytest.mark.parametrize("method, pick", [("fifo", 0), ("lifo", -1)])
+def test_lot_methods_match_a_naive_walk(method, pick):
+    for seed in range(20):
+        rows = random_ledger(seed)
+        report = compute_lots(rows, method)
+        expected, lots = naive_relief(rows, pick)
+        assert report["realized_by_transaction"].keys() == expected.keys()
+        for txn_id, pnl in expected.items():
+            assert report["realized_by_transaction"][txn_id] == pytest.approx(pnl, abs=1e-6)
+        for ticker, open_lots in lots.items():
+            reported = [(lot["shares"], lot["cost_per_share"]) for lot in report["open_lots"] if lot["ticker"] == ticker]
+            assert reported == pytest.approx([(s, p) for s, p in open_lots if s > 1e-9])
+
+
+def test_average_matches_the_holdings_replay():
+    for seed in range(20):
+        rows = random_ledger(seed)
+        report = compute_lots(rows, "average")
+        for ticker in ("AAA", "BBB"):
+            shares, average_cost, book_value = replay_holding(
+                [(s, p, kind) for _, t, _, s, p, kind in rows if t == ticker])
+            lots = [lot for lot in report["open_lots"] if lot["ticker"] == ticker]
+            if shares > 0:
+                assert len(lots) == 1
+                assert lots[0]["shares"] == pytest.approx(shares)
+                assert lots[0]["cost_basis"] == pytest.approx(book_value)
+                assert lots[0]["cost_per_share"] == pytest.approx(average_cost)
+            else:
+                assert lots == []
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_costs_reconcile(method):
+    # Every bought dollar ends up either in a sell's cost basis or in an open lot
+    for seed in range(20):
+        rows = random_ledger(seed)
+        report = compute_lots(rows, method)
+        ignored = {sell["transaction_id"] for sell in report["ignored_sells"]}
+        bought = sum(s * p for _, _, _, s, p, kind in rows if kind == "buy")
+        relieved = sum(sell["cost_basis"] for sell in report["realized"])
+        still_open = sum(lot["cost_basis"] for lot in report["open_lots"])
+        assert relieved + still_open == pytest.approx(bought)
+        sold = sum(s for txn_id, _, _, s, _, kind in rows if kind == "sell" and txn_id not in ignored)
+        held = sum(lot["shares"] for lot in report["open_lots"])
+        assert sold + held == pytest.approx(sum(s for _, _, _, s, _, kind in rows if kind == "buy"))
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_oversells_are_ignored(method):
+    start = datetime(2024, 1, 1)
+    rows = [
+        (1, "AAA", start, 10, 10.0, "buy"),
+        (2, "AAA", start + timedelta(days=1), 15, 12.0, "sell"),
+        (3, "AAA", start + timedelta(days=2), 4, 12.0, "sell"),
+    ]
+    report = compute_lots(rows, method)
+    assert [sell["transaction_id"] for sell in report["ignored_sells"]] == [2]
+    assert report["realized_by_transaction"] == {3: pytest.approx(8.0)}
+    assert sum(lot["shares"] for lot in report["open_lots"]) == pytest.approx(6)
+
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        compute_lots([], "hifo")
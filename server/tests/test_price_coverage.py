@@ -0,0 +1,77 @@
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from helpers import _uncovered_ranges, _chunk_coverage, _complete_through
+
+Coverage = namedtuple("Coverage", ["start_date", "end_date"])
+
+
+def test_no_coverage_downloads_the_request():
+    assert _uncovered_ranges(None, date(2024, 1, 1), date(2024, 1, 31)) == [(date(2024, 1, 1), date(2024, 1, 31))]
+
+
+def test_request_inside_coverage_downloads_nothing():
+    coverage = Coverage(date(2024, 1, 1), date(2024, 12, 31))
+    assert _uncovered_ranges(coverage, date(2024, 3, 1), date(2024, 4, 1)) == []
+
+
+def test_overlapping_request_downloads_only_the_new_days():
+    coverage = Coverage(date(2024, 1, 1), date(2024, 1, 31))
+    assert _uncovered_ranges(coverage, date(2024, 1, 15), date(2024, 2, 15)) == [(date(2024, 2, 1), date(2024, 2, 15))]
+    assert _uncovered_ranges(coverage, date(2023, 12, 15), date(2024, 1, 15)) == [(date(2023, 12, 15), date(2023, 12, 31))]
+
+
+def test_request_after_coverage_fills_the_hole():
+    # January covered, June requested: February-May must be fetched too,
+    # because the stored window is widened to January-June
+    coverage = Coverage(date(2024, 1, 1), date(2024, 1, 31))
+    assert _uncovered_ranges(coverage, date(2024, 6, 1), date(2024, 6, 30)) == [(date(2024, 2, 1), date(2024, 6, 30))]
+
+
+def test_request_before_coverage_fills_the_hole():
+    coverage = Coverage(date(2024, 6, 1), date(2024, 6, 30))
+    assert _uncovered_ranges(coverage, date(2024, 1, 1), date(2024, 1, 31)) == [(date(2024, 1, 1), date(2024, 5, 31))]
+
+
+def test_request_spanning_coverage_downloads_both_sides():
+    coverage = Coverage(date(2024, 3, 1), date(2024, 3, 31))
+    assert _uncovered_ranges(coverage, date(2024, 2, 1), date(2024, 4, 30)) == [
+        (date(2024, 2, 1), date(2024, 2, 29)),
+        (date(2024, 4, 1), date(2024, 4, 30))
+    ]
+
+
+def test_chunk_coverage_stops_at_the_newest_bar():
+    closes = pd.DataFrame({"AAA": [10.0, 11.0], "BBB": [5.0, np.nan]},
+                          index=[date(2024, 3, 4), date(2024, 3, 5)])
+    coverage = _chunk_coverage(closes, ["AAA", "BBB", "CCC"], date(2024, 3, 1), date(2024, 3, 6), date(2024, 3, 6))
+    assert coverage == {
+        "AAA": (date(2024, 3, 1), date(2024, 3, 5)),
+        "BBB": (date(2024, 3, 1), date(2024, 3, 4)),
+        "CCC": None
+    }
+
+
+def test_chunk_coverage_backfill_covers_the_whole_gap():
+    closes = pd.DataFrame({"AAA": [10.0]}, index=[date(2024, 1, 2)])
+    coverage = _chunk_coverage(closes, ["AAA"], date(2024, 1, 1), date(2024, 1, 7), date(2024, 6, 30))
+    assert coverage == {"AAA": (date(2024, 1, 1), date(2024, 1, 7))}
+
+
+def test_chunk_coverage_closed_market_covers_the_gap():
+    coverage = _chunk_coverage(pd.DataFrame(), ["AAA"], date(2024, 7, 4), date(2024, 7, 4), date(2024, 7, 4))
+    assert coverage == {"AAA": (date(2024, 7, 4), date(2024, 7, 4))}
+
+
+def test_snapshots_stop_at_the_last_complete_day():
+    ends = {"AAA": date(2024, 3, 8), "BBB": date(2024, 3, 6)}
+    assert _complete_through(ends, date(2024, 3, 8), grace_days=7) == date(2024, 3, 6)
+    assert _complete_through({}, date(2024, 3, 8), grace_days=7) == date(2024, 3, 8)
+
+
+def test_snapshots_skip_tickers_no_longer_quoted():
+    ends = {"AAA": date(2024, 3, 8), "GONE": date(2024, 1, 31)}
+    assert _complete_through(ends, date(2024, 3, 8), grace_days=7) == date(2024, 3, 8)
@@ -0,0 +1,68 @@
+import numpy as np
+
+from series import lttb_indices, downsample_series
+
+
+def reference_lttb(x, y, threshold):
+    """Straightforward per-bucket LTTB with the same bucket boundaries."""
+    n = len(x)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    edges[-1] = n - 1
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - next_x) * (y[j] - y[a]) - (x[a] - x[j]) * (next_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return np.array(selected)
+
+
+def test_matches_reference_implementation():
+    rng = np.random.default_rng(7)
+    for n, threshold in [(10, 4), (101, 10), (1000, 37), (5000, 500)]:
+        x = np.arange(n, dtype=float)
+        y = np.cumsum(rng.normal(size=n))
+        np.testing.assert_array_equal(lttb_indices(x, y, threshold), reference_lttb(x, y, threshold))
+
+
+def test_keeps_endpoints_and_order():
+    x = np.arange(200, dtype=float)
+    y = np.sin(x / 10)
+    keep = lttb_indices(x, y, 20)
+    assert len(keep) == 20
+    assert keep[0] == 0 and keep[-1] == 199
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_small_series_and_thresholds_keep_everything():
+    x = np.arange(5, dtype=float)
+    np.testing.assert_array_equal(lttb_indices(x, x, 5), np.arange(5))
+    np.testing.assert_array_equal(lttb_indices(x, x, 2), np.arange(5))
+
+
+def test_keeps_a_spike():
+    x = np.arange(100, dtype=float)
+    y = np.zeros(100)
+    y[42] = 50.0
+    assert 42 in lttb_indices(x, y, 10)
+
+
+def test_downsample_series_slices_before_reducing():
+    dates = [f"2024-01-{day:02d}" for day in range(1, 32)]
+    values = [str(day) for day in range(1, 32)]
+    kept_dates, kept_values = downsample_series(dates, values, points=5, start="2024-01-10", end="2024-01-20")
+    assert kept_dates[0] == "2024-01-10" and kept_dates[-1] == "2024-01-20"
+    assert len(kept_dates) == 5
+    assert kept_values == [d[-2:].lstrip("0") for d in kept_dates]
+    assert downsample_series(dates, values, start="2024-01-30") == (dates[29:], values[29:])
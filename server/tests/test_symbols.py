@@ -0,0 +1,61 @@
+from symbols import SymbolIndex, parse_nasdaq_traded
+
+ROWS = [
+    ("AAPL", "Apple Inc.", "NASDAQ"),
+    ("AMD", "Advanced Micro Devices, Inc.", "NASDAQ"),
+    ("AMT", "American Tower Corporation", "NYSE"),
+    ("AMZN", "Amazon.com, Inc.", "NASDAQ"),
+    ("GE", "GE Aerospace", "NYSE"),
+    ("GM", "General Motors Company", "NYSE"),
+    ("MSFT", "Microsoft Corporation", "NASDAQ"),
+]
+
+
+def symbols(results):
+    return [r["symbol"] for r in results]
+
+
+def test_exact_ticker_ranks_first():
+    results = SymbolIndex(ROWS).search("amd")
+    assert results[0]["symbol"] == "AMD"
+    assert results[0]["match"] == "exact"
+
+
+def test_ticker_prefix_prefers_shorter_symbols():
+    assert symbols(SymbolIndex(ROWS).search("AM", limit=3)) == ["AMD", "AMT", "AMZN"]
+
+
+def test_company_name_and_word_prefix():
+    index = SymbolIndex(ROWS)
+    assert index.search("micro")[0]["symbol"] == "MSFT"
+    assert index.search("micro")[0]["match"] == "name"
+    assert index.search("motors")[0]["symbol"] == "GM"
+    assert index.search("motors")[0]["match"] == "word"
+
+
+def test_unlisted_ticker_only_gets_fuzzy_suggestions():
+    # GME is not listed: GE and GM are one deletion away but are not hits
+    results = SymbolIndex(ROWS).search("GME")
+    assert symbols(results) == ["GE", "GM"]
+    assert all(r["match"] == "fuzzy" for r in results)
+
+
+def test_blank_query_and_duplicate_rows():
+    index = SymbolIndex(ROWS + [("aapl", "Duplicate", "NYSE")])
+    assert len(index) == len(ROWS)
+    assert index.search("  ") == []
+
+
+def test_parse_nasdaq_traded_skips_test_issues_and_normalizes_classes():
+    text = "\n".join([
+        "Nasdaq Traded|Symbol|Security Name|Listing Exchange|Market Category|ETF|Round Lot Size|Test Issue|Financial Status|CQS Symbol|NASDAQ Symbol|NextShares",
+        "Y|AAPL|Apple Inc. - Common Stock|Q|Q|N|100|N|N||AAPL|N",
+        "Y|BRK.B|Berkshire Hathaway Inc. - Class B|N| |N|100|N||BRK.B|BRK.B|N",
+        "Y|ZVZZT|NASDAQ TEST STOCK|Q|G|N|100|Y|N||ZVZZT|N",
+        "Y|ABR$D|Arbor Realty Trust - Preferred|N| |N|100|N||ABRpD|ABR$D|N",
+        "File Creation Time: 0101202400:00|||||||||||",
+    ])
+    assert parse_nasdaq_traded(text) == [
+        ("AAPL", "Apple Inc.", "NASDAQ"),
+        ("BRK-B", "Berkshire Hathaway Inc.", "NYSE"),
+    ]
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+import pytest
+
+from helpers import encode_transaction_cursor, decode_transaction_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 3, 5, 14, 30, 15, 123456)
+    cursor = encode_transaction_cursor(created_at, "3f2b8c1e-0000-4000-8000-000000000001")
+    assert "=" not in cursor and "|" not in cursor
+    assert decode_transaction_cursor(cursor) == (created_at, "3f2b8c1e-0000-4000-8000-000000000001")
+
+
+def test_cursor_keeps_separators_in_the_id():
+    created_at = datetime(2024, 1, 1)
+    assert decode_transaction_cursor(encode_transaction_cursor(created_at, "a|b")) == (created_at, "a|b")
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "bm8tc2VwYXJhdG9y", "bm90LWEtZGF0ZXxpZA", "__8"])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_transaction_cursor(cursor)
@@ -0,0 +1,148 @@
+# valuation.py
+from collections import defaultdict
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Sampling frequency of the portfolio history for each supported interval
+INTERVALS = {
+    "day": "B",     # business days
+    "week": "7D",   # every 7 days from the first transaction
+    "month": "MS"   # first day of each month
+}
+
+LEDGER_COLUMNS = ["ticker", "created_at", "shares", "price", "transaction_type"]
+
+
+def ledger_frame(rows):
+    """
+    Build a ledger DataFrame from (ticker, created_at, shares, price, transaction_type)
+    rows, sorted by date, with a signed share delta per transaction
+    (+ for buys, - for sells, 0 for anything else).
+    """
+    ledger = pd.DataFrame(list(rows), columns=LEDGER_COLUMNS)
+    if ledger.empty:
+        return ledger.assign(date=pd.Series(dtype="datetime64[ns]"), signed_shares=pd.Series(dtype=float))
+    ledger["date"] = pd.to_datetime(ledger["created_at"]).dt.normalize()
+    ledger["shares"] = ledger["shares"].astype(float)
+    ledger["price"] = ledger["price"].astype(float)
+    kind = ledger["transaction_type"].str.lower()
+    sign = np.select([kind == "buy", kind == "sell"], [1.0, -1.0], default=0.0)
+    ledger["signed_shares"] = ledger["shares"] * sign
+    return ledger.sort_values("created_at", kind="mergesort").reset_index(drop=True)
+
+
+def sample_dates(start_date, end_date, interval="week"):
+    """Valuation dates from start_date (inclusive) up to end_date (exclusive)."""
+    if interval not in INTERVALS:
+        raise ValueError(f"Invalid interval '{interval}'. Use one of: {', '.join(INTERVALS)}")
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) - pd.Timedelta(days=1)
+    if end < start:
+        return pd.DatetimeIndex([])
+    dates = pd.date_range(start, end, freq=INTERVALS[interval])
+    if len(dates) == 0 or dates[0] != start:
+        dates = dates.insert(0, start)
+    return dates
+
+
+def holdings_matrix(ledger, dates, tickers):
+    """Shares held per ticker as of each date: a cumsum over the sorted ledger, looked up as-of."""
+    daily = ledger.groupby(["date", "ticker"])["signed_shares"].sum().unstack()
+    cumulative = daily.reindex(columns=tickers).fillna(0).cumsum()
+    return cumulative.reindex(dates, method="ffill").fillna(0)
+
+
+def prices_asof(closes, ledger, dates, tickers):
+    """
+    Price per ticker as of each date: the last close on or before the date, falling
+    back to the last transaction price on or before the date when no close exists.
+    """
+    if closes is None or closes.empty:
+        market = pd.DataFrame(np.nan, index=dates, columns=tickers)
+    else:
+        closes = closes.copy()
+        closes.index = pd.to_datetime(closes.index)
+        market = closes.sort_index().reindex(columns=tickers).ffill().reindex(dates, method="ffill")
+    last_trade = ledger.groupby(["date", "ticker"])["price"].last().unstack()
+    fallback = last_trade.reindex(columns=tickers).ffill().reindex(dates, method="ffill")
+    return market.fillna(fallback)
+
+
+def value_history(ledger, closes, dates):
+    """
+    Value the portfolio on each date.
+
+    Args:
+        ledger (DataFrame): Output of ledger_frame()
+        closes (DataFrame): Daily closes, date x ticker
+        dates (DatetimeIndex): Valuation dates
+
+    Returns:
+        tuple: (values Series indexed by date, holdings DataFrame, prices DataFrame)
+    """
+    tickers = sorted(ledger["ticker"].unique())
+    holdings = holdings_matrix(ledger, dates, tickers)
+    prices = prices_asof(closes, ledger, dates, tickers)
+    shares = np.clip(holdings.to_numpy(dtype=float), 0, None)
+    px = np.nan_to_num(prices.to_numpy(dtype=float))
+    values = np.einsum("ij,ij->i", shares, px)
+    return pd.Series(values, index=dates), holdings, prices
+
+
+def book_value_history(ledger, dates, tickers):
+    """
+    Average-cost book value per ticker as of each date, following the same rules
+    as recalc_portfolio (sells reduce cost at the running average; oversells are ignored).
+    """
+    shares = defaultdict(float)
+    cost = defaultdict(float)
+    steps = []
+    kinds = ledger["transaction_type"].str.lower().to_numpy()
+    for day, ticker, qty, price, kind in zip(ledger["date"], ledger["ticker"], ledger["shares"], ledger["price"], kinds):
+        if kind == "buy":
+            shares[ticker] += qty
+            cost[ticker] += qty * price
+        elif kind == "sell" and shares[ticker] >= qty:
+            avg_cost = cost[ticker] / shares[ticker] if shares[ticker] > 0 else 0
+            shares[ticker] -= qty
+            cost[ticker] -= qty * avg_cost
+        steps.append((day, ticker, max(0.0, cost[ticker])))
+    if not steps:
+        return pd.DataFrame(0.0, index=dates, columns=tickers)
+    book = pd.DataFrame(steps, columns=["date", "ticker", "book_value"])
+    book = book.groupby(["date", "ticker"])["book_value"].last().unstack()
+    return book.reindex(columns=tickers).ffill().reindex(dates, method="ffill").fillna(0)
+
+
+def daily_snapshots(ledger, closes, dates):
+    """
+    Per-day valuation rows for the given dates: total market value, book value
+    and a per-ticker breakdown of open positions.
+    """
+    values, holdings, prices = value_history(ledger, closes, dates)
+    tickers = list(holdings.columns)
+    book = book_value_history(ledger, dates, tickers)
+    shares = np.clip(holdings.to_numpy(dtype=float), 0, None)
+    px = np.nan_to_num(prices.to_numpy(dtype=float))
+    market = shares * px
+    book_totals = book.to_numpy(dtype=float).sum(axis=1)
+
+    snapshots = []
+    for i, day in enumerate(dates):
+        open_positions = np.nonzero(shares[i] > 0)[0]
+        snapshots.append({
+            "date": day.date(),
+            "market_value": round(float(values.iloc[i]), 2),
+            "book_value": round(float(book_totals[i]), 2),
+            "breakdown": {
+                tickers[j]: {
+                    "shares": float(shares[i, j]),
+                    "price": round(float(px[i, j]), 4),
+                    "market_value": round(float(market[i, j]), 2)
+                } for j in open_positions
+            }
+        })
+    return snapshots